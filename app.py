@@ -1,20 +1,44 @@
 import os
 import json
+import math
+import heapq
+import hmac
+import hashlib
 import bcrypt
 import jwt
 import logging
 from logging.handlers import RotatingFileHandler
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, send_from_directory, render_template
+from flask import Flask, Response, request, jsonify, send_from_directory, render_template, redirect, stream_with_context
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room
 from dotenv import load_dotenv
-from models import db, get_nairobi_time, PortalCredentials, AdminCredentials, SystemSettings, SocialLink, Staff, Customer, Product, Order, CapitalLedger, TermsAndConditions, Notification, BackupHistory, AuditLog, OTPVerification, Cart
-from utils import normalize_phone_number, generate_order_id, validate_image_url, extract_tracking_link, calculate_delivery_fee, generate_otp
+from models import db, get_nairobi_time, PortalCredentials, AdminCredentials, SystemSettings, SocialLink, Staff, Customer, Product, Order, ArchivedOrder, CapitalLedger, ImageCheck, TermsAndConditions, Notification, BackupHistory, AuditLog, OTPVerification, Cart
+from utils import normalize_phone_number, extract_tracking_link, calculate_delivery_fee, generate_otp, encode_cursor, decode_cursor, parse_date_param
 from email_service import EmailService
 from pdf_service import PDFService
 from payment_service import PaymentService
+from order_id_service import OrderIdService
+from task_dispatcher import TaskDispatcher
+from pricing_service import PricingService
+from combo_service import ComboResolver
+from inventory_service import InventoryService
+from cart_service import CartService
+from delivery_service import DeliveryService
+from archive_service import OrderArchiveService
+from rollup_service import RollupService
+from sales_service import SalesService
+from order_cube import OrderCube
+from staff_stats_service import StaffStatsService
+from report_service import ReportService
+from export_service import stream_csv, stream_xlsx, format_items
+from payload_cache import PayloadCache
+from search_service import ProductSearchIndex
+from import_service import ProductImportService
+from image_service import ImageValidator, ImageVariantService, VARIANT_SIZES, VARIANT_FORMATS, url_key
 from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload
 import pytz
 
 load_dotenv()
@@ -30,6 +54,9 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Under `python app.py`, report workers re-import this script as __mp_main__; they must not set up the server
+SPAWNED_WORKER = __name__ == '__mp_main__'
+
 app = Flask(__name__, static_folder='static', template_folder='templates')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
@@ -39,19 +66,50 @@ CORS(app)
 socketio = SocketIO(app, cors_allowed_origins="*")
 db.init_app(app)
 
+JWT_SECRET = os.getenv('JWT_SECRET', 'jwt-secret-key')
+ORDER_ACCESS_SECRET = os.getenv('ORDER_ACCESS_SECRET', JWT_SECRET)
+
 email_service = EmailService()
 pdf_service = PDFService(os.getenv('PDF_STORAGE_BUCKET', './backups'))
 payment_service = PaymentService()
+order_id_service = OrderIdService(os.getenv('ORDER_ID_SECRET', JWT_SECRET), int(os.getenv('ORDER_ID_BLOCK_SIZE', '50')))
+task_dispatcher = TaskDispatcher(app, int(os.getenv('TASK_DISPATCHER_WORKERS', '4')))
+combo_resolver = ComboResolver()
+pricing_service = PricingService(combo_resolver)
+inventory_service = InventoryService(combo_resolver, int(os.getenv('INVENTORY_RESERVATION_TTL', '600')))
+cart_service = CartService()
+delivery_service = DeliveryService()
+archive_service = OrderArchiveService(int(os.getenv('ORDER_ARCHIVE_AFTER_DAYS', '30')))
+rollup_service = RollupService()
+sales_service = SalesService()
+order_cube = OrderCube()
+staff_stats_service = StaffStatsService(int(os.getenv('STAFF_STATS_TTL', '30')))
+report_service = ReportService(os.path.join(pdf_service.storage_bucket, 'reports'))
+catalog_cache = PayloadCache('catalog', int(os.getenv('CATALOG_CACHE_MAX_AGE', '60')))
+settings_cache = PayloadCache('settings', int(os.getenv('CATALOG_CACHE_MAX_AGE', '60')))
+search_index = ProductSearchIndex(int(os.getenv('SEARCH_INDEX_MAX_AGE', '300')))
+image_validator = ImageValidator(max_workers=int(os.getenv('IMAGE_CHECK_WORKERS', '8')), ttl=int(os.getenv('IMAGE_CHECK_TTL', '600')))
+image_variants = ImageVariantService(
+    os.getenv('IMAGE_CACHE_DIR', './image_cache'),
+    int(os.getenv('IMAGE_VARIANT_WORKERS', '2')),
+    int(os.getenv('IMAGE_RENDER_WORKERS', '1'))
+)
+product_import_service = ProductImportService(image_validator)
 
-JWT_SECRET = os.getenv('JWT_SECRET', 'jwt-secret-key')
-
-with app.app_context():
-    db.create_all()
-    settings = SystemSettings.query.first()
-    if not settings:
-        settings = SystemSettings()
-        db.session.add(settings)
-        db.session.commit()
+if not SPAWNED_WORKER:
+    with app.app_context():
+        db.create_all()
+        # The unique cart index cannot be built over duplicate lines from older releases
+        cart_service.collapse_duplicates()
+        # create_all() skips tables that already exist, so add any newly declared indexes
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=db.engine, checkfirst=True)
+        settings = SystemSettings.query.first()
+        if not settings:
+            settings = SystemSettings()
+            db.session.add(settings)
+            db.session.commit()
 
 def create_token(user_id, user_type):
     payload = {
@@ -61,6 +119,10 @@ def create_token(user_id, user_type):
     }
     return jwt.encode(payload, JWT_SECRET, algorithm='HS256')
 
+def order_access_token(order_id):
+    """Per-order secret returned to whoever placed the order; proves ownership when following its events"""
+    return hmac.new(ORDER_ACCESS_SECRET.encode(), order_id.encode(), hashlib.sha256).hexdigest()[:32]
+
 def verify_token(token):
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
@@ -76,6 +138,23 @@ def verify_token(token):
         logger.error(f"Token verification failed: Unexpected error - {str(e)}")
         return None
 
+def order_viewer_payload():
+    """
+    Token payload for an admin or an approved, active rider, else None.
+    Order listings carry customer contact details, so nobody else may read them.
+    """
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    if not payload:
+        return None
+    if payload.get('user_type') == 'admin':
+        return payload
+    if payload.get('user_type') == 'staff':
+        staff = Staff.query.get(payload['user_id'])
+        if staff and staff.is_approved and staff.is_active:
+            return payload
+    return None
+
 def hash_password(password):
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
@@ -229,30 +308,46 @@ def admin_reset_password():
         db.session.rollback()
         return jsonify({'success': False, 'message': 'An error occurred. Please try again.'}), 500
 
+def cached_json_response(cache, loader):
+    """Serve a PayloadCache entry in the best pre-compressed encoding the client accepts, with ETag/304 support"""
+    payload = cache.get(loader)
+    body, etag, encoding = payload.variant(request.accept_encodings)
+    
+    response = app.response_class(body, mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+def load_public_settings():
+    settings = SystemSettings.query.first()
+    return {
+        'allow_email_signin': settings.allow_email_signin,
+        'allow_pay_on_delivery': settings.allow_pay_on_delivery,
+        'splash_enabled': settings.splash_enabled,
+        'adverts_enabled': settings.adverts_enabled,
+        'advert_frequency': settings.advert_frequency,
+        'min_delivery_fee': settings.min_delivery_fee,
+        'delivery_per_km_rate': settings.delivery_per_km_rate,
+        'convenience_fee': settings.convenience_fee,
+        'transaction_fee_percentage': settings.transaction_fee_percentage,
+        'username_change_limit': settings.username_change_limit,
+        'username_change_window_days': settings.username_change_window_days,
+        'terms_mandatory': settings.terms_mandatory,
+        'customer_care_number': settings.customer_care_number,
+        'backup_interval': settings.backup_interval,
+        'backup_retention': settings.backup_retention,
+        'timezone': settings.timezone
+    }
+
 @app.route('/api/admin/settings', methods=['GET', 'PUT'])
 def admin_settings():
-    settings = SystemSettings.query.first()
-    
     if request.method == 'GET':
-        return jsonify({
-            'allow_email_signin': settings.allow_email_signin,
-            'allow_pay_on_delivery': settings.allow_pay_on_delivery,
-            'splash_enabled': settings.splash_enabled,
-            'adverts_enabled': settings.adverts_enabled,
-            'advert_frequency': settings.advert_frequency,
-            'min_delivery_fee': settings.min_delivery_fee,
-            'delivery_per_km_rate': settings.delivery_per_km_rate,
-            'convenience_fee': settings.convenience_fee,
-            'transaction_fee_percentage': settings.transaction_fee_percentage,
-            'username_change_limit': settings.username_change_limit,
-            'username_change_window_days': settings.username_change_window_days,
-            'terms_mandatory': settings.terms_mandatory,
-            'customer_care_number': settings.customer_care_number,
-            'backup_interval': settings.backup_interval,
-            'backup_retention': settings.backup_retention,
-            'timezone': settings.timezone
-        })
+        return cached_json_response(settings_cache, load_public_settings)
     
+    settings = SystemSettings.query.first()
     data = request.json
     for key, value in data.items():
         if hasattr(settings, key):
@@ -262,31 +357,78 @@ def admin_settings():
                 setattr(settings, key, value)
     
     db.session.commit()
+    pricing_service.invalidate()
+    settings_cache.invalidate()
     return jsonify({'success': True})
 
+def serialize_product(p):
+    return {
+        'id': p.id,
+        'image_url': p.image_url,
+        'name': p.name,
+        'description': p.description,
+        'price_now': p.price_now,
+        'price_old': p.price_old,
+        'stock': p.stock,
+        'category': p.category,
+        'is_combo': p.is_combo,
+        'combo_items': p.combo_items,
+        # A combo is only available while all of its components are
+        'is_available': combo_resolver.is_available(p.id) if p.is_combo else p.is_available,
+        'image_variants': image_variants.variant_urls(p.id, p.image_url)
+    }
+
+def load_catalog():
+    return [serialize_product(p) for p in Product.query.filter_by(is_active=True).order_by(Product.id).all()]
+
+def emit_product_event(action, product, image_changed=False):
+    """
+    Invalidate product caches and broadcast the change with the product fields so clients can apply it without refetching.
+    image_changed=True starts generating the variants of a new image URL.
+    """
+    combo_resolver.invalidate()
+    pricing_service.invalidate()
+    catalog_cache.invalidate()
+    if product.is_active:
+        search_index.upsert(serialize_product(product))
+        if image_changed:
+            image_variants.warm(product.image_url)
+    else:
+        search_index.remove(product.id)
+    socketio.emit('product_update', {
+        'action': action,
+        'product_id': product.id,
+        'product': serialize_product(product) if product.is_active else None
+    })
+    
+    # Combos containing the product may have changed availability with it
+    dependent_ids = combo_resolver.dependents(product.id)
+    if dependent_ids:
+        for combo in Product.query.filter(Product.id.in_(dependent_ids), Product.is_active == True).all():
+            combo_data = serialize_product(combo)
+            search_index.upsert(combo_data)
+            socketio.emit('product_update', {'action': 'update', 'product_id': combo.id, 'product': combo_data})
+
+def check_product_image(product, known):
+    """
+    Check a just-saved product's image URL on the dispatcher unless it is already
+    known to be valid, so saving never waits on a HEAD request. A broken URL is
+    recorded in image_checks and listed by /api/admin/images/broken.
+    """
+    if not known:
+        task_dispatcher.submit(image_validator.sweep, [product.id], refresh=False)
+
 @app.route('/api/products', methods=['GET', 'POST'])
 def products():
     if request.method == 'GET':
-        products = Product.query.filter_by(is_active=True).all()
-        return jsonify([{
-            'id': p.id,
-            'image_url': p.image_url,
-            'name': p.name,
-            'description': p.description,
-            'price_now': p.price_now,
-            'price_old': p.price_old,
-            'stock': p.stock,
-            'category': p.category,
-            'is_combo': p.is_combo,
-            'combo_items': p.combo_items,
-            'is_available': p.is_available
-        } for p in products])
+        return cached_json_response(catalog_cache, load_catalog)
     
     data = request.json
     
-    is_valid, message = validate_image_url(data['image_url'])
-    if not is_valid:
-        return jsonify({'success': False, 'message': message}), 400
+    # Only a known-bad URL is refused here; an unchecked one is checked after saving (see check_product_image)
+    known = image_validator.cached(data['image_url'])
+    if known and not known[0]:
+        return jsonify({'success': False, 'message': known[1]}), 400
     
     product = Product(
         image_url=data['image_url'],
@@ -303,10 +445,93 @@ def products():
     db.session.add(product)
     db.session.commit()
     
-    socketio.emit('product_update', {'action': 'add', 'product_id': product.id})
+    emit_product_event('add', product, image_changed=True)
+    check_product_image(product, known)
     
     return jsonify({'success': True, 'id': product.id})
 
+@app.route('/api/admin/products/import', methods=['POST'])
+def import_products():
+    """Create and update products from an uploaded CSV or XLSX sheet (?dry_run=1 validates only)"""
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    
+    if not payload or payload.get('user_type') != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({'success': False, 'message': 'No file uploaded'}), 400
+    
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true')
+    skip_invalid = request.args.get('skip_invalid', '').lower() in ('1', 'true')
+    try:
+        result = product_import_service.run(upload.stream, upload.filename, dry_run=dry_run, skip_invalid=skip_invalid)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if result['product_ids']:
+        combo_resolver.invalidate()
+        pricing_service.invalidate()
+        catalog_cache.invalidate()
+        search_index.rebuild(load_catalog())
+        for (image_url,) in db.session.query(Product.image_url).filter(Product.id.in_(result['product_ids'])).distinct():
+            image_variants.warm(image_url)
+        # One event for the whole import; clients refetch the catalog instead of receiving every product
+        socketio.emit('product_update', {'action': 'bulk', 'product_ids': result['product_ids']})
+    
+    if result['error_count'] and not skip_invalid:
+        return jsonify({'success': False, 'message': f"{result['error_count']} rows have errors; nothing was imported", **result}), 400
+    return jsonify({'success': True, **result})
+
+IMAGE_VARIANT_MAX_AGE = 365 * 24 * 3600
+
+@app.route('/api/images/<int:product_id>/<variant>.<fmt>', methods=['GET'])
+def product_image(product_id, variant, fmt):
+    """Resized product image; redirects to the original URL until the variants have been generated"""
+    if variant not in VARIANT_SIZES or fmt not in VARIANT_FORMATS:
+        return jsonify({'success': False, 'message': 'Unknown image variant'}), 404
+    
+    product = Product.query.get_or_404(product_id)
+    name = image_variants.cached_variant(product.image_url, variant, fmt)
+    if name is None:
+        # Never wait on the download and resize; failures are logged by the variant service
+        image_variants.warm(product.image_url)
+        return redirect(product.image_url)
+    
+    # A matching version pins the source URL, so the response can never change
+    if request.args.get('v') == url_key(product.image_url):
+        response = send_from_directory(image_variants.storage_dir, name, max_age=IMAGE_VARIANT_MAX_AGE)
+        response.headers['Cache-Control'] = f'public, max-age={IMAGE_VARIANT_MAX_AGE}, immutable'
+    else:
+        response = send_from_directory(image_variants.storage_dir, name, max_age=300)
+    return response
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+@app.route('/api/products/search', methods=['GET'])
+def search_products():
+    """Ranked product search with prefix and typo-tolerant matching and category facet counts"""
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', SEARCH_PAGE_SIZE)), 1), SEARCH_MAX_PAGE_SIZE)
+        min_price = float(request.args['min_price']) if request.args.get('min_price') else None
+        max_price = float(request.args['max_price']) if request.args.get('max_price') else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid search parameter'}), 400
+    
+    search_index.ensure_loaded(load_catalog)
+    result = search_index.search(
+        request.args.get('q', ''),
+        category=request.args.get('category') or None,
+        min_price=min_price,
+        max_price=max_price,
+        page=page,
+        per_page=per_page
+    )
+    return jsonify({'success': True, **result})
+
 @app.route('/api/products/<int:product_id>', methods=['PUT', 'DELETE'])
 def product_detail(product_id):
     product = Product.query.get_or_404(product_id)
@@ -314,22 +539,24 @@ def product_detail(product_id):
     if request.method == 'DELETE':
         product.is_active = False
         db.session.commit()
-        socketio.emit('product_update', {'action': 'delete', 'product_id': product_id})
+        emit_product_event('delete', product)
         return jsonify({'success': True})
     
     data = request.json
     
-    if 'image_url' in data and data['image_url'] != product.image_url:
-        is_valid, message = validate_image_url(data['image_url'])
-        if not is_valid:
-            return jsonify({'success': False, 'message': message}), 400
+    image_changed = 'image_url' in data and data['image_url'] != product.image_url
+    known = image_validator.cached(data['image_url']) if image_changed else None
+    if known and not known[0]:
+        return jsonify({'success': False, 'message': known[1]}), 400
     
     for key, value in data.items():
         if hasattr(product, key):
             setattr(product, key, value)
     
     db.session.commit()
-    socketio.emit('product_update', {'action': 'update', 'product_id': product_id})
+    emit_product_event('update', product, image_changed)
+    if image_changed:
+        check_product_image(product, known)
     
     return jsonify({'success': True})
 
@@ -356,6 +583,8 @@ def capital():
         purpose=data['purpose']
     )
     db.session.add(entry)
+    db.session.flush()
+    rollup_service.record_capital(entry, entry.amount, count_delta=1)
     db.session.commit()
     
     return jsonify({'success': True, 'id': entry.id})
@@ -365,10 +594,13 @@ def capital_entry(entry_id):
     entry = CapitalLedger.query.get_or_404(entry_id)
     data = request.json
     
+    previous_amount = entry.amount
     entry.amount = data.get('amount', entry.amount)
     entry.purpose = data.get('purpose', entry.purpose)
     entry.is_edited = True
     
+    if entry.amount != previous_amount:
+        rollup_service.record_capital(entry, entry.amount - previous_amount)
     db.session.commit()
     return jsonify({'success': True})
 
@@ -521,28 +753,193 @@ def staff_profile():
     
     return jsonify({'success': True})
 
+ORDERS_PAGE_SIZE = 50
+ORDERS_MAX_PAGE_SIZE = 200
+ORDERS_EXPORT_BATCH_SIZE = 1000
+PAYMENT_METHODS = ('Pay Now', 'Pay on Delivery')
+# updated_at is stamped before commit, so a slow transaction can land behind a cursor clients already passed
+ORDER_CHANGES_OVERLAP = timedelta(seconds=int(os.getenv('ORDER_CHANGES_OVERLAP_SECONDS', '10')))
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', stream_csv),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', stream_xlsx)
+}
+
+def serialize_order(o):
+    return {
+        'id': o.id,
+        'order_id': o.order_id,
+        'customer_name': o.customer_name,
+        'customer_phone': o.customer_phone,
+        'customer_email': o.customer_email,
+        'items': o.items,
+        'product_total': o.product_total,
+        'delivery_fee': o.delivery_fee,
+        'total_amount': o.total_amount,
+        'payment_method': o.payment_method,
+        'payment_status': o.payment_status,
+        'delivery_address': o.delivery_address,
+        'staff_id': o.staff_id,
+        'staff_name': o.staff.full_name if o.staff else 'Unassigned',
+        'status': o.status,
+        'is_archived': o.is_archived,
+        'created_at': o.created_at.isoformat(),
+        'updated_at': o.updated_at.isoformat() if o.updated_at else None
+    }
+
+def filter_orders_query(query, args, model=Order):
+    """
+    Apply the order listing filters (status, payment_status, staff_id, is_archived, date range) to Order or ArchivedOrder.
+    Raises ValueError for a staff_id or date that cannot be parsed.
+    """
+    if args.get('status'):
+        query = query.filter(model.status == args['status'])
+    
+    if args.get('payment_status'):
+        query = query.filter(model.payment_status == args['payment_status'])
+    
+    staff_id = args.get('staff_id')
+    if staff_id == 'unassigned':
+        query = query.filter(model.staff_id.is_(None))
+    elif staff_id:
+        query = query.filter(model.staff_id == int(staff_id))
+    
+    is_archived = args.get('is_archived')
+    if is_archived is not None and is_archived != '':
+        query = query.filter(model.is_archived == (is_archived.lower() in ('1', 'true', 'yes')))
+    
+    date_from = parse_date_param(args.get('date_from'))
+    if args.get('date_from') and not date_from:
+        raise ValueError('Invalid date_from')
+    if date_from:
+        query = query.filter(model.created_at >= date_from)
+    
+    date_to = parse_date_param(args.get('date_to'), end_of_day=True)
+    if args.get('date_to') and not date_to:
+        raise ValueError('Invalid date_to')
+    if date_to:
+        query = query.filter(model.created_at <= date_to)
+    
+    return query
+
+def fetch_orders_page(model, args, position, limit):
+    """Up to `limit` orders from one table, newest first, strictly after the (created_at, id) keyset position"""
+    query = filter_orders_query(model.query, args, model)
+    
+    if position:
+        created_at, last_id = position
+        query = query.filter(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < last_id)
+        ))
+    
+    return query.options(joinedload(model.staff)).order_by(
+        model.created_at.desc(), model.id.desc()
+    ).limit(limit).all()
+
+def order_rooms(order):
+    rooms = ['admin', 'staff', f'order:{order.order_id}']
+    if order.customer_id:
+        rooms.append(f'customer:{order.customer_id}')
+    return rooms
+
+def emit_order_event(event, order, status=None, **extra):
+    """Send an order change, with the full order payload, only to the rooms allowed to see it"""
+    payload = {'order_id': order.order_id, 'order': serialize_order(order), **extra}
+    if status:
+        payload['status'] = status
+    socketio.emit(event, payload, to=order_rooms(order))
+    order_cube.upsert(order)
+    # Staff stats count deliveries and paid revenue, so both kinds of change make them stale
+    if event in ('order_update', 'payment_update'):
+        staff_stats_service.invalidate()
+
+def dispatch_stk_push(order_pk):
+    """Background task: request the M-Pesa STK push for a new order and report the outcome over the socket"""
+    order = Order.query.get(order_pk)
+    if not order:
+        return
+    
+    success, response, message = payment_service.initiate_stk_push(
+        order.customer_phone,
+        order.total_amount,
+        order.order_id
+    )
+    
+    if success:
+        order.payhero_reference = response.get('reference')
+        db.session.commit()
+    
+    emit_order_event('stk_push', order, success=success, message=message)
+
+def dispatch_order_received(order_pk):
+    """Background task: store the 'Order Received' notification and email the customer"""
+    order = Order.query.get(order_pk)
+    if not order:
+        return
+    
+    notif = Notification(
+        user_type='customer',
+        user_id=order.customer_id or 0,
+        title='Order Received',
+        message=f'Your order {order.order_id} has been received and is pending delivery.',
+        related_order_id=order.order_id
+    )
+    db.session.add(notif)
+    db.session.commit()
+    
+    if order.customer_email:
+        email_service.send_order_notification(
+            order.customer_email,
+            order.customer_name,
+            order.order_id,
+            'received'
+        )
+
+def orders_high_water_cursor():
+    """Cursor for the most recently created or modified order, or None if there are no orders"""
+    latest = db.session.query(Order.updated_at, Order.id).order_by(
+        Order.updated_at.desc(), Order.id.desc()
+    ).first()
+    return encode_cursor(latest.updated_at, latest.id) if latest else None
+
 @app.route('/api/orders', methods=['GET', 'POST'])
 def orders():
     if request.method == 'GET':
-        orders_list = Order.query.order_by(Order.created_at.desc()).all()
-        return jsonify([{
-            'id': o.id,
-            'order_id': o.order_id,
-            'customer_name': o.customer_name,
-            'customer_phone': o.customer_phone,
-            'customer_email': o.customer_email,
-            'items': o.items,
-            'product_total': o.product_total,
-            'delivery_fee': o.delivery_fee,
-            'total_amount': o.total_amount,
-            'payment_method': o.payment_method,
-            'payment_status': o.payment_status,
-            'delivery_address': o.delivery_address,
-            'staff_id': o.staff_id,
-            'staff_name': o.staff.full_name if o.staff else 'Unassigned',
-            'status': o.status,
-            'created_at': o.created_at.isoformat()
-        } for o in orders_list])
+        if not order_viewer_payload():
+            return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+        
+        # Taken before the page is read so changes made while it loads are replayed by the feed
+        changes_cursor = orders_high_water_cursor()
+        
+        position = None
+        cursor = request.args.get('cursor')
+        if cursor:
+            position = decode_cursor(cursor)
+            if not position:
+                return jsonify({'success': False, 'message': 'Invalid cursor'}), 400
+        
+        try:
+            limit = min(max(int(request.args.get('limit', ORDERS_PAGE_SIZE)), 1), ORDERS_MAX_PAGE_SIZE)
+            orders_list = fetch_orders_page(Order, request.args, position, limit + 1)
+            
+            # Cold storage is only read when the requested date range reaches past the archive cutoff
+            if archive_service.needs_cold_storage(parse_date_param(request.args.get('date_from'))):
+                orders_list += fetch_orders_page(ArchivedOrder, request.args, position, limit + 1)
+                orders_list.sort(key=lambda o: (o.created_at, o.id), reverse=True)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid filter value'}), 400
+        
+        has_more = len(orders_list) > limit
+        orders_list = orders_list[:limit]
+        next_cursor = encode_cursor(orders_list[-1].created_at, orders_list[-1].id) if has_more else None
+        
+        return jsonify({
+            'success': True,
+            'orders': [serialize_order(o) for o in orders_list],
+            'next_cursor': next_cursor,
+            'changes_cursor': changes_cursor
+        })
     
     data = request.json
     
@@ -550,84 +947,344 @@ def orders():
     if not normalized_phone:
         return jsonify({'success': False, 'message': 'Invalid phone number'}), 400
     
-    settings = SystemSettings.query.first()
+    if data.get('payment_method') not in PAYMENT_METHODS:
+        return jsonify({'success': False, 'message': f"Payment method must be one of: {', '.join(PAYMENT_METHODS)}"}), 400
+    if data['payment_method'] == 'Pay on Delivery' and not pricing_service.get_settings()['allow_pay_on_delivery']:
+        return jsonify({'success': False, 'message': 'Pay on Delivery is not available right now'}), 400
+    
+    delivery_fee, _ = quote_delivery_fee(data.get('delivery_latitude'), data.get('delivery_longitude'))
+    success, quote, message = pricing_service.quote(data.get('items'), delivery_fee)
+    if not success:
+        return jsonify({'success': False, 'message': message}), 400
     
     order = Order(
-        order_id=generate_order_id(),
+        order_id=order_id_service.next_order_id(),
         customer_id=data.get('customer_id'),
         customer_name=data['customer_name'],
         customer_phone=normalized_phone,
         customer_email=data.get('customer_email'),
-        items=data['items'],
-        product_total=data['product_total'],
-        delivery_fee=data.get('delivery_fee', settings.min_delivery_fee),
-        convenience_fee=data.get('convenience_fee', 0),
-        transaction_fee=data.get('transaction_fee', 0),
-        total_amount=data['total_amount'],
+        items=quote['items'],
+        product_total=quote['product_total'],
+        delivery_fee=quote['delivery_fee'],
+        convenience_fee=quote['convenience_fee'],
+        transaction_fee=quote['transaction_fee'],
+        total_amount=quote['total_amount'],
         payment_method=data['payment_method'],
+        payment_status='Pending Payment',
         delivery_address=data['delivery_address'],
         delivery_latitude=data.get('delivery_latitude'),
         delivery_longitude=data.get('delivery_longitude'),
         location_method=data.get('location_method')
     )
     
-    if data['payment_method'] == 'Pay Now':
-        success, response, message = payment_service.initiate_stk_push(
-            normalized_phone,
-            data['total_amount'],
-            order.order_id
-        )
-        
-        if success:
-            order.payment_status = 'Pending Payment'
-            order.payhero_reference = response.get('reference')
-        else:
-            order.payment_status = 'Pending Payment'
-    else:
-        order.payment_status = 'Pending Payment'
+    # Stock is taken after the order ID is allocated, since that commits on its own connection
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token) if token else None
+    holder = f"customer:{payload['user_id']}" if payload and payload.get('user_type') == 'customer' else None
+    in_stock, message, depleted_ids = inventory_service.consume(quote['items'], holder)
+    if not in_stock:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': message}), 409
     
     db.session.add(order)
+    db.session.flush()
+    db.session.add_all(sales_service.build_items(order))
     db.session.commit()
     
-    if data.get('customer_email'):
-        email_service.send_order_notification(
-            data['customer_email'],
-            data['customer_name'],
-            order.order_id,
-            'received'
-        )
+    emit_order_event('new_order', order)
+    for product in Product.query.filter(Product.id.in_(depleted_ids)).all() if depleted_ids else []:
+        emit_product_event('update', product)
+    
+    # Provider calls run on the dispatcher; the customer hears back via the stk_push event
+    if order.payment_method == 'Pay Now':
+        task_dispatcher.submit(dispatch_stk_push, order.id)
+    task_dispatcher.submit(dispatch_order_received, order.id)
+    
+    return jsonify({
+        'success': True,
+        'order_id': order.order_id,
+        'order_token': order_access_token(order.order_id),
+        'total_amount': order.total_amount
+    })
+
+@app.route('/api/checkout/reservations', methods=['POST', 'DELETE'])
+def checkout_reservations():
+    """Hold stock for the customer's cart while they check out (POST), or give it back (DELETE)"""
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    
+    if not payload or payload.get('user_type') != 'customer':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    holder = f"customer:{payload['user_id']}"
+    if request.method == 'DELETE':
+        inventory_service.release(holder)
+        db.session.commit()
+        return jsonify({'success': True})
+    
+    success, quote, message = pricing_service.quote((request.json or {}).get('items'))
+    if not success:
+        return jsonify({'success': False, 'message': message}), 400
+    
+    reserved, message, expires_at = inventory_service.reserve(holder, quote['items'])
+    if not reserved:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': message}), 409
     
-    notif = Notification(
-        user_type='customer',
-        user_id=data.get('customer_id', 0),
-        title='Order Received',
-        message=f'Your order {order.order_id} has been received and is pending delivery.',
-        related_order_id=order.order_id
-    )
-    db.session.add(notif)
     db.session.commit()
+    return jsonify({'success': True, 'expires_at': expires_at.isoformat()})
+
+def parse_coordinate(value):
+    try:
+        return float(value) if value is not None and value != '' else None
+    except (TypeError, ValueError):
+        return None
+
+def quote_delivery_fee(latitude, longitude):
+    """Delivery fee for a destination using the cached fee settings; the minimum fee when the location is unknown"""
+    settings = pricing_service.get_settings()
+    return delivery_service.quote_fee(
+        parse_coordinate(latitude),
+        parse_coordinate(longitude),
+        settings['min_delivery_fee'],
+        settings['delivery_per_km_rate']
+    )
+
+@app.route('/api/pricing/quote', methods=['POST'])
+def pricing_quote():
+    data = request.json or {}
+    delivery_fee, _ = quote_delivery_fee(data.get('delivery_latitude'), data.get('delivery_longitude'))
+    success, quote, message = pricing_service.quote(data.get('items'), delivery_fee)
+    if not success:
+        return jsonify({'success': False, 'message': message}), 400
+    return jsonify({'success': True, 'quote': quote})
+
+@app.route('/api/delivery/quote', methods=['POST'])
+def delivery_quote():
+    data = request.json or {}
+    delivery_fee, distance_km = quote_delivery_fee(data.get('latitude'), data.get('longitude'))
+    return jsonify({'success': True, 'delivery_fee': delivery_fee, 'distance_km': distance_km})
+
+DELIVERY_QUOTE_BATCH_MAX = 1000
+PRICING_QUOTE_BATCH_MAX = 100
+
+@app.route('/api/delivery/quote/batch', methods=['POST'])
+def delivery_quote_batch():
+    """
+    Price many destinations in one vectorized pass: either `points` ([{latitude, longitude}], e.g. a zone grid)
+    or `order_ids` (re-price existing orders from their stored coordinates; admin only).
+    At most DELIVERY_QUOTE_BATCH_MAX entries per call.
+    """
+    data = request.json or {}
     
-    socketio.emit('new_order', {'order_id': order.order_id})
+    if data.get('order_ids'):
+        # Stored order coordinates are customer locations, so only admins may re-price orders
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        payload = verify_token(token)
+        if not payload or payload.get('user_type') != 'admin':
+            return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+        
+        order_ids = data['order_ids']
+        if not isinstance(order_ids, list) or len(order_ids) > DELIVERY_QUOTE_BATCH_MAX:
+            return jsonify({'success': False, 'message': f'order_ids must be a list of at most {DELIVERY_QUOTE_BATCH_MAX} IDs'}), 400
+        try:
+            order_ids = [int(order_id) for order_id in order_ids]
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'order_ids must be integers'}), 400
+        
+        rows = db.session.query(Order.id, Order.order_id, Order.delivery_latitude, Order.delivery_longitude, Order.delivery_fee).filter(
+            Order.id.in_(order_ids)
+        ).all()
+        points = [{'id': r.id, 'order_id': r.order_id, 'latitude': r.delivery_latitude, 'longitude': r.delivery_longitude, 'current_fee': r.delivery_fee} for r in rows]
+    else:
+        points = data.get('points') or []
+        if not isinstance(points, list) or len(points) > DELIVERY_QUOTE_BATCH_MAX:
+            return jsonify({'success': False, 'message': f'points must be a list of at most {DELIVERY_QUOTE_BATCH_MAX} locations'}), 400
+        if not all(isinstance(p, dict) for p in points):
+            return jsonify({'success': False, 'message': 'Each point must be an object with latitude and longitude'}), 400
+    
+    latitudes = [parse_coordinate(p.get('latitude')) for p in points]
+    longitudes = [parse_coordinate(p.get('longitude')) for p in points]
+    latitudes = [float('nan') if v is None else v for v in latitudes]
+    longitudes = [float('nan') if v is None else v for v in longitudes]
+    
+    settings = pricing_service.get_settings()
+    fees, distances, _ = delivery_service.quote_fees(
+        latitudes, longitudes, settings['min_delivery_fee'], settings['delivery_per_km_rate']
+    )
     
-    return jsonify({'success': True, 'order_id': order.order_id})
+    return jsonify({
+        'success': True,
+        'quotes': [{
+            **point,
+            'delivery_fee': float(fee),
+            'distance_km': None if math.isnan(distance) else round(float(distance), 3)
+        } for point, fee, distance in zip(points, fees, distances)]
+    })
 
-@app.route('/api/orders/<int:order_id>/claim', methods=['POST'])
-def claim_order(order_id):
+@app.route('/api/pricing/quote/batch', methods=['POST'])
+def pricing_quote_batch():
+    """Price several carts in one call; each entry is {'items': [...]}. At most PRICING_QUOTE_BATCH_MAX carts per call."""
+    data = request.json or {}
+    carts = data.get('carts') or []
+    
+    if not isinstance(carts, list) or len(carts) > PRICING_QUOTE_BATCH_MAX:
+        return jsonify({'success': False, 'message': f'carts must be a list of at most {PRICING_QUOTE_BATCH_MAX} carts'}), 400
+    if not all(isinstance(cart, dict) for cart in carts):
+        return jsonify({'success': False, 'message': "Each cart must be an object with 'items'"}), 400
+    
+    results = []
+    for cart in carts:
+        success, quote, message = pricing_service.quote(cart.get('items'))
+        results.append({'success': True, 'quote': quote} if success else {'success': False, 'message': message})
+    
+    return jsonify({'success': True, 'quotes': results})
+
+def export_order_rows(model, args):
+    """Filtered orders from one table as plain rows, newest first, fetched from a server-side cursor in batches"""
+    query = db.session.query(
+        model.created_at, model.id, model.order_id, model.customer_name, model.customer_phone,
+        model.customer_email, model.items, model.product_total, model.delivery_fee,
+        model.convenience_fee, model.transaction_fee, model.total_amount, model.payment_method,
+        model.payment_status, model.status, Staff.full_name.label('staff_name'),
+        model.delivery_address, model.delivered_at, model.is_archived
+    ).outerjoin(Staff, Staff.id == model.staff_id)
+    
+    return filter_orders_query(query, args, model).order_by(
+        model.created_at.desc(), model.id.desc()
+    ).yield_per(ORDERS_EXPORT_BATCH_SIZE)
+
+def order_export_row(row):
+    return [
+        row.order_id,
+        row.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        row.customer_name,
+        row.customer_phone,
+        row.customer_email or '',
+        format_items(row.items),
+        row.product_total,
+        row.delivery_fee,
+        row.convenience_fee or 0.0,
+        row.transaction_fee or 0.0,
+        row.total_amount,
+        row.payment_method,
+        row.payment_status,
+        row.status,
+        row.staff_name or 'Unassigned',
+        row.delivery_address,
+        row.delivered_at.strftime('%Y-%m-%d %H:%M:%S') if row.delivered_at else '',
+        'Yes' if row.is_archived else 'No'
+    ]
+
+@app.route('/api/orders/export', methods=['GET'])
+def export_orders():
     token = request.headers.get('Authorization', '').replace('Bearer ', '')
     payload = verify_token(token)
     
-    if not payload or payload.get('user_type') != 'staff':
+    if not payload or payload.get('user_type') != 'admin':
         return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
-    order = Order.query.get_or_404(order_id)
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': 'Format must be csv or xlsx'}), 400
+    mimetype, stream = EXPORT_FORMATS[export_format]
     
-    if order.staff_id:
-        return jsonify({'success': False, 'message': 'Order already claimed'}), 400
+    # Same filters as the listing; an export without a start date covers archived orders too
+    date_from = parse_date_param(request.args.get('date_from'))
+    try:
+        sources = [export_order_rows(Order, request.args)]
+        if date_from is None or archive_service.needs_cold_storage(date_from):
+            sources.append(export_order_rows(ArchivedOrder, request.args))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid filter value'}), 400
+    
+    rows = heapq.merge(*sources, key=lambda row: (row.created_at, row.id), reverse=True)
+    filename = f"orders_{get_nairobi_time().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    
+    return Response(
+        stream_with_context(stream(order_export_row(row) for row in rows)),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'Cache-Control': 'no-store',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@app.route('/api/orders/changes', methods=['GET'])
+def order_changes():
+    """
+    Change feed: orders created or modified after the (updated_at, id) cursor in `since`.
+    Orders stamped within ORDER_CHANGES_OVERLAP before the cursor are sent again, so
+    changes that committed after a later one are not skipped; clients merge by id.
+    Without `since` only the current high-water cursor is returned. Admins and approved riders only.
+    """
+    if not order_viewer_payload():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
-    order.staff_id = payload['user_id']
-    order.status = 'Out for Delivery'
-    db.session.commit()
+    since = request.args.get('since')
     
+    if not since:
+        response = jsonify({'success': True, 'orders': [], 'cursor': orders_high_water_cursor(), 'has_more': False})
+    else:
+        position = decode_cursor(since)
+        if not position:
+            return jsonify({'success': False, 'message': 'Invalid cursor'}), 400
+        
+        try:
+            limit = min(max(int(request.args.get('limit', ORDERS_MAX_PAGE_SIZE)), 1), ORDERS_MAX_PAGE_SIZE)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid limit'}), 400
+        
+        updated_at, last_id = position
+        changed = Order.query.options(joinedload(Order.staff)).filter(or_(
+            Order.updated_at > updated_at,
+            and_(Order.updated_at == updated_at, Order.id > last_id)
+        )).order_by(Order.updated_at.asc(), Order.id.asc()).limit(limit + 1).all()
+        
+        has_more = len(changed) > limit
+        changed = changed[:limit]
+        cursor = encode_cursor(changed[-1].updated_at, changed[-1].id) if changed else since
+        
+        # The overlap is re-read on every poll but never moves the cursor, so it cannot page forever
+        overlap = Order.query.options(joinedload(Order.staff)).filter(
+            Order.updated_at > updated_at - ORDER_CHANGES_OVERLAP,
+            or_(Order.updated_at < updated_at, and_(Order.updated_at == updated_at, Order.id <= last_id))
+        ).order_by(Order.updated_at.asc(), Order.id.asc()).all()
+        
+        response = jsonify({
+            'success': True,
+            'orders': [serialize_order(o) for o in overlap + changed],
+            'cursor': cursor,
+            'has_more': has_more
+        })
+    
+    response.add_etag()
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def try_claim_order(order_id, staff_id):
+    """
+    Assign an unclaimed order to a rider with a single conditional UPDATE.
+    Returns True only for the rider whose UPDATE matched the row.
+    """
+    claimed = Order.query.filter(
+        Order.id == order_id,
+        Order.staff_id.is_(None),
+        Order.is_archived == False
+    ).update({
+        Order.staff_id: staff_id,
+        Order.status: 'Out for Delivery',
+        Order.updated_at: get_nairobi_time()
+    }, synchronize_session=False)
+    
+    if claimed == 1:
+        order = db.session.get(Order, order_id, populate_existing=True)
+        rollup_service.move_staff(order, None)
+    db.session.commit()
+    return claimed == 1
+
+def notify_order_claimed(order):
     if order.customer_email:
         email_service.send_order_notification(
             order.customer_email,
@@ -636,10 +1293,57 @@ def claim_order(order_id):
             'on_the_way'
         )
     
-    socketio.emit('order_update', {'order_id': order.order_id, 'status': 'claimed'})
+    emit_order_event('order_update', order, 'claimed')
+
+@app.route('/api/orders/<int:order_id>/claim', methods=['POST'])
+def claim_order(order_id):
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    
+    if not payload or payload.get('user_type') != 'staff':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    if not try_claim_order(order_id, payload['user_id']):
+        Order.query.get_or_404(order_id)
+        return jsonify({'success': False, 'message': 'Order already claimed'}), 400
+    
+    order = Order.query.get(order_id)
+    notify_order_claimed(order)
     
     return jsonify({'success': True})
 
+@app.route('/api/orders/claim-next', methods=['POST'])
+def claim_next_order():
+    """
+    Hand the oldest unclaimed pending order to the calling rider.
+    Rows locked by concurrent claimers are skipped (FOR UPDATE SKIP LOCKED), so
+    many riders can claim at once without queueing behind each other.
+    """
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    
+    if not payload or payload.get('user_type') != 'staff':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    for _ in range(3):
+        candidate = db.session.query(Order.id).filter(
+            Order.staff_id.is_(None),
+            Order.is_archived == False,
+            Order.status == 'Pending'
+        ).order_by(Order.created_at.asc(), Order.id.asc()).limit(1).with_for_update(skip_locked=True).first()
+        
+        if not candidate:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': 'No orders available'}), 404
+        
+        # The conditional UPDATE still guards databases that ignore SKIP LOCKED
+        if try_claim_order(candidate.id, payload['user_id']):
+            order = Order.query.get(candidate.id)
+            notify_order_claimed(order)
+            return jsonify({'success': True, 'order': serialize_order(order)})
+    
+    return jsonify({'success': False, 'message': 'Orders are being claimed, please retry'}), 409
+
 @app.route('/api/orders/<int:order_id>/unclaim', methods=['POST'])
 def unclaim_order(order_id):
     token = request.headers.get('Authorization', '').replace('Bearer ', '')
@@ -655,15 +1359,21 @@ def unclaim_order(order_id):
     
     order.staff_id = None
     order.status = 'Pending'
+    db.session.flush()
+    # Payment status as of the row lock the flush took, so a concurrent payment lands in one bucket
+    db.session.refresh(order)
+    rollup_service.move_staff(order, payload['user_id'])
     db.session.commit()
     
-    socketio.emit('order_update', {'order_id': order.order_id, 'status': 'unclaimed'})
+    emit_order_event('order_update', order, 'unclaimed')
     
     return jsonify({'success': True})
 
 @app.route('/api/orders/<int:order_id>/payment', methods=['POST'])
 def request_payment(order_id):
     order = Order.query.get_or_404(order_id)
+    if order.payment_status == 'Payment Complete':
+        return jsonify({'success': False, 'message': 'Order is already paid'}), 400
     
     data = request.json or {}
     phone = data.get('phone', order.customer_phone)
@@ -679,21 +1389,54 @@ def request_payment(order_id):
     )
     
     if success:
-        order.payment_status = 'Pending Payment'
+        # Conditional, so a callback that completed the payment meanwhile is not undone
+        set_payment_status(order, 'Pending Payment')
         order.payhero_reference = response.get('reference')
         db.session.commit()
         return jsonify({'success': True, 'message': message})
     
     return jsonify({'success': False, 'message': message}), 400
 
+def set_payment_status(order, payment_status, payment_method=None):
+    """
+    Move an order to a new payment status with a conditional UPDATE, so that
+    repeated or concurrent callbacks count a completed payment in the sales
+    rollups exactly once. An order already in `payment_status` is left as it
+    is, payment method included. The caller commits.
+    """
+    previous = order.payment_status
+    if previous == payment_status:
+        return False
+    
+    changed = Order.query.filter(
+        Order.id == order.id,
+        Order.payment_status == previous if previous is not None else Order.payment_status.is_(None)
+    ).update({Order.payment_status: payment_status, Order.updated_at: get_nairobi_time()}, synchronize_session=False)
+    
+    if not changed:
+        return False
+    
+    # Re-read under the row lock so the rollup bucket uses the committed rider and method
+    db.session.refresh(order)
+    if previous == 'Payment Complete':
+        rollup_service.record_payment(order, sign=-1)
+        sales_service.set_paid(order.id, False)
+    
+    if payment_method:
+        order.payment_method = payment_method
+    
+    if payment_status == 'Payment Complete':
+        rollup_service.record_payment(order)
+        sales_service.set_paid(order.id, True)
+    return True
+
 @app.route('/api/orders/<int:order_id>/mark-paid', methods=['POST'])
 def mark_paid(order_id):
     order = Order.query.get_or_404(order_id)
-    order.payment_status = 'Payment Complete'
-    order.payment_method = 'Cash'
+    set_payment_status(order, 'Payment Complete', payment_method='Cash')
     db.session.commit()
     
-    socketio.emit('order_update', {'order_id': order.order_id, 'status': 'paid'})
+    emit_order_event('order_update', order, 'paid')
     
     return jsonify({'success': True})
 
@@ -718,7 +1461,7 @@ def deliver_order(order_id):
             'delivered'
         )
     
-    socketio.emit('order_update', {'order_id': order.order_id, 'status': 'delivered'})
+    emit_order_event('order_update', order, 'delivered')
     
     return jsonify({'success': True})
 
@@ -789,34 +1532,21 @@ def customer_cart():
     customer_id = payload['user_id']
     
     if request.method == 'GET':
-        cart_items = Cart.query.filter_by(customer_id=customer_id).all()
-        return jsonify([{
-            'id': c.id,
-            'product_id': c.product_id,
-            'quantity': c.quantity,
-            'product': {
-                'name': c.product.name,
-                'price_now': c.product.price_now,
-                'image_url': c.product.image_url
-            }
-        } for c in cart_items])
+        return jsonify(cart_service.items(customer_id))
     
     if request.method == 'POST':
-        data = request.json
-        cart_item = Cart.query.filter_by(
-            customer_id=customer_id,
-            product_id=data['product_id']
-        ).first()
+        data = request.json or {}
+        try:
+            product_id = int(data['product_id'])
+            quantity = int(data.get('quantity', 1))
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'product_id and an integer quantity are required'}), 400
+        if quantity <= 0:
+            return jsonify({'success': False, 'message': 'Quantity must be positive'}), 400
         
-        if cart_item:
-            cart_item.quantity += data.get('quantity', 1)
-        else:
-            cart_item = Cart(
-                customer_id=customer_id,
-                product_id=data['product_id'],
-                quantity=data.get('quantity', 1)
-            )
-            db.session.add(cart_item)
+        success, message = cart_service.add(customer_id, product_id, quantity)
+        if not success:
+            return jsonify({'success': False, 'message': message}), 404
         
         db.session.commit()
         return jsonify({'success': True})
@@ -833,10 +1563,37 @@ def customer_cart():
         return jsonify({'success': False}), 404
     
     if request.method == 'DELETE':
-        Cart.query.filter_by(customer_id=customer_id).delete()
+        cart_service.clear(customer_id)
         db.session.commit()
         return jsonify({'success': True})
 
+@app.route('/api/customer/cart/sync', methods=['POST'])
+def customer_cart_sync():
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    
+    if not payload or payload.get('user_type') != 'customer':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    data = request.json or {}
+    mode = data.get('mode', 'merge')
+    if mode not in ('merge', 'replace'):
+        return jsonify({'success': False, 'message': "mode must be 'merge' or 'replace'"}), 400
+    
+    items, error = cart_service.parse_items(data.get('items', {}))
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+    
+    customer_id = payload['user_id']
+    dropped = cart_service.sync(customer_id, items, mode)
+    db.session.commit()
+    
+    return jsonify({
+        'success': True,
+        'items': cart_service.items(customer_id),
+        'dropped_product_ids': dropped
+    })
+
 @app.route('/api/customer/send-otp', methods=['POST'])
 def customer_send_otp():
     logger.info("=" * 80)
@@ -1158,6 +1915,106 @@ def customer_orders():
         } for o in orders]
     })
 
+def order_summary_rows(model, customer_id, position, limit):
+    """Summary columns only (no items JSON) for a customer's orders, newest first after the keyset position"""
+    query = db.session.query(
+        model.id,
+        model.order_id,
+        model.total_amount,
+        model.payment_method,
+        model.payment_status,
+        model.status,
+        model.created_at,
+        model.delivered_at
+    ).filter(model.customer_id == customer_id)
+    
+    if position:
+        created_at, last_id = position
+        query = query.filter(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < last_id)
+        ))
+    
+    return query.order_by(model.created_at.desc(), model.id.desc()).limit(limit).all()
+
+@app.route('/api/customer/orders/history', methods=['GET'])
+def customer_order_history():
+    """Paginated order history across active and archived orders, as compact summaries"""
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    
+    if not payload or payload.get('user_type') != 'customer':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    position = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        position = decode_cursor(cursor)
+        if not position:
+            return jsonify({'success': False, 'message': 'Invalid cursor'}), 400
+    
+    try:
+        limit = min(max(int(request.args.get('limit', ORDERS_PAGE_SIZE)), 1), ORDERS_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid limit'}), 400
+    
+    customer_id = payload['user_id']
+    rows = order_summary_rows(Order, customer_id, position, limit + 1)
+    rows += order_summary_rows(ArchivedOrder, customer_id, position, limit + 1)
+    rows.sort(key=lambda r: (r.created_at, r.id), reverse=True)
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    return jsonify({
+        'success': True,
+        'orders': [{
+            'id': r.id,
+            'order_id': r.order_id,
+            'total_amount': r.total_amount,
+            'payment_method': r.payment_method,
+            'payment_status': r.payment_status,
+            'status': r.status,
+            'created_at': r.created_at.isoformat(),
+            'delivered_at': r.delivered_at.isoformat() if r.delivered_at else None
+        } for r in rows],
+        'next_cursor': encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+    })
+
+@app.route('/api/customer/orders/<string:order_id>', methods=['GET'])
+def customer_order_detail(order_id):
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    
+    if not payload or payload.get('user_type') != 'customer':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    order = Order.query.filter_by(order_id=order_id, customer_id=payload['user_id']).first()
+    if not order:
+        order = ArchivedOrder.query.filter_by(order_id=order_id, customer_id=payload['user_id']).first()
+    if not order:
+        return jsonify({'success': False, 'message': 'Order not found'}), 404
+    
+    return jsonify({
+        'success': True,
+        'order': {
+            'id': order.id,
+            'order_id': order.order_id,
+            'items': order.items,
+            'product_total': order.product_total,
+            'delivery_fee': order.delivery_fee,
+            'convenience_fee': order.convenience_fee,
+            'transaction_fee': order.transaction_fee,
+            'total_amount': order.total_amount,
+            'payment_method': order.payment_method,
+            'payment_status': order.payment_status,
+            'status': order.status,
+            'delivery_address': order.delivery_address,
+            'created_at': order.created_at.isoformat(),
+            'delivered_at': order.delivered_at.isoformat() if order.delivered_at else None
+        }
+    })
+
 @app.route('/api/terms', methods=['GET', 'POST'])
 def terms():
     if request.method == 'GET':
@@ -1202,26 +2059,246 @@ def terms():
 
 @app.route('/api/analytics/dashboard', methods=['GET'])
 def analytics_dashboard():
-    confirmed_orders = Order.query.filter_by(payment_status='Payment Complete').all()
+    date_from = parse_date_param(request.args.get('date_from'))
+    date_to = parse_date_param(request.args.get('date_to'))
+    
+    totals = rollup_service.totals(
+        date_from.date() if date_from else None,
+        date_to.date() if date_to else None
+    )
+    
+    return jsonify({
+        'product_sales': totals['product_sales'],
+        'delivery_fees': totals['delivery_fees'],
+        'total_revenue': totals['total_revenue'],
+        'total_capital': totals['total_capital'],
+        'total_profit': totals['total_revenue'] - totals['total_capital'],
+        'total_orders': totals['total_orders']
+    })
+
+@app.route('/api/analytics/product-sales', methods=['GET'])
+def analytics_product_sales():
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    
+    if not payload or payload.get('user_type') != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    date_from = parse_date_param(request.args.get('date_from'))
+    date_to = parse_date_param(request.args.get('date_to'), end_of_day=True)
+    
+    try:
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid limit'}), 400
+    
+    return jsonify({
+        'success': True,
+        'products': combo_resolver.with_margins(sales_service.product_sales(date_from, date_to, request.args.get('category'), limit)),
+        'categories': sales_service.category_sales(date_from, date_to)
+    })
+
+@app.route('/api/admin/inventory', methods=['GET'])
+def admin_inventory():
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    
+    if not payload or payload.get('user_type') != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    return jsonify({'success': True, 'inventory': inventory_service.levels()})
+
+@app.route('/api/admin/inventory/<int:product_id>', methods=['PUT', 'DELETE'])
+def admin_inventory_item(product_id):
+    """Set a product's stock ({"on_hand": n}) or adjust it ({"adjust": +n/-n}); DELETE stops tracking it"""
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    
+    if not payload or payload.get('user_type') != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    product = Product.query.get_or_404(product_id)
+    
+    if request.method == 'DELETE':
+        inventory_service.untrack(product_id)
+        db.session.commit()
+        return jsonify({'success': True})
+    
+    data = request.json or {}
+    try:
+        on_hand = int(data['on_hand']) if data.get('on_hand') is not None else None
+        adjust = int(data['adjust']) if on_hand is None else None
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Provide on_hand or adjust as a whole number'}), 400
+    
+    success, message, availability_changed = inventory_service.set_stock(product_id, on_hand=on_hand, adjust=adjust)
+    if not success:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': message}), 400
+    
+    db.session.commit()
+    if availability_changed:
+        db.session.refresh(product)
+        emit_product_event('update', product)
+    return jsonify({'success': True, 'is_available': product.is_available})
+
+@app.route('/api/admin/combos', methods=['GET'])
+def admin_combos():
+    """Every active combo with its derived availability, cost of goods, margin and base components"""
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    
+    if not payload or payload.get('user_type') != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    combos = []
+    for combo in Product.query.filter_by(is_active=True, is_combo=True).order_by(Product.id).all():
+        resolved = combo_resolver.resolve(combo.id)
+        combos.append({
+            'id': combo.id,
+            'name': combo.name,
+            'price_now': combo.price_now,
+            'is_available': resolved['is_available'],
+            'cost_of_goods': resolved['cost_of_goods'],
+            'margin': resolved['margin'],
+            'margin_percentage': resolved['margin_percentage'],
+            'components': [{'product_id': pid, 'quantity': quantity} for pid, quantity in resolved['expanded'].items()],
+            'missing_components': resolved['missing_components']
+        })
+    
+    return jsonify({'success': True, 'combos': combos})
+
+@app.route('/api/analytics/charts', methods=['GET'])
+def analytics_charts():
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
     
-    product_sales = sum(o.product_total for o in confirmed_orders)
-    delivery_fees = sum(o.delivery_fee for o in confirmed_orders)
-    total_revenue = sum(o.total_amount for o in confirmed_orders)
+    if not payload or payload.get('user_type') != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
-    capital_entries = CapitalLedger.query.all()
-    total_capital = sum(e.amount for e in capital_entries)
+    date_from = parse_date_param(request.args.get('date_from'))
+    date_to = parse_date_param(request.args.get('date_to'), end_of_day=True)
     
-    total_profit = total_revenue - total_capital
+    try:
+        series = order_cube.series(request.args.get('bucket', 'day'), date_from, date_to)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
     return jsonify({
-        'product_sales': product_sales,
-        'delivery_fees': delivery_fees,
-        'total_revenue': total_revenue,
-        'total_capital': total_capital,
-        'total_profit': total_profit,
-        'total_orders': len(confirmed_orders)
+        'success': True,
+        'series': series,
+        'payment_methods': order_cube.breakdown('payment_method', date_from, date_to),
+        'payment_statuses': order_cube.breakdown('payment_status', date_from, date_to),
+        'statuses': order_cube.breakdown('status', date_from, date_to),
+        'staff': order_cube.breakdown('staff_id', date_from, date_to),
+        'order_value_percentiles': order_cube.percentiles('total_amount', date_from=date_from, date_to=date_to)
     })
 
+@app.route('/api/staff/performance', methods=['GET'])
+def staff_performance():
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    
+    if not payload or payload.get('user_type') not in ('admin', 'staff'):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    date_from = parse_date_param(request.args.get('date_from'))
+    date_to = parse_date_param(request.args.get('date_to'), end_of_day=True)
+    
+    # Staff only ever see their own figures
+    if payload['user_type'] == 'staff':
+        return jsonify({
+            'success': True,
+            'me': staff_stats_service.for_staff(payload['user_id'], date_from, date_to)
+        })
+    
+    return jsonify({
+        'success': True,
+        'staff': staff_stats_service.performance(date_from, date_to)
+    })
+
+def business_report_data(date_from, date_to):
+    """Everything generate_business_report needs for a period, from aggregate queries only"""
+    totals = rollup_service.totals(
+        date_from.date() if date_from else None,
+        date_to.date() if date_to else None
+    )
+    
+    capital_query = CapitalLedger.query
+    if date_from:
+        capital_query = capital_query.filter(CapitalLedger.created_at >= date_from)
+    if date_to:
+        capital_query = capital_query.filter(CapitalLedger.created_at <= date_to)
+    capital_entries = capital_query.order_by(CapitalLedger.created_at.desc()).limit(10).all()
+    
+    if date_from or date_to:
+        period = f"{date_from.date().isoformat() if date_from else 'Start'} to {date_to.date().isoformat() if date_to else 'Today'}"
+    else:
+        period = 'All Time'
+    
+    return {
+        **totals,
+        'total_profit': totals['total_revenue'] - totals['total_capital'],
+        'capital_entries': [{
+            'date': e.created_at.strftime('%Y-%m-%d'),
+            'purpose': e.purpose,
+            'amount': e.amount
+        } for e in capital_entries],
+        'top_products': sales_service.top_products(date_from, date_to),
+        'staff_performance': [{
+            'name': entry['name'],
+            'deliveries': entry['deliveries'],
+            'revenue': entry['revenue']
+        } for entry in staff_stats_service.performance(date_from, date_to)],
+        'period': period
+    }
+
+@app.route('/api/reports/business', methods=['POST'])
+def create_business_report():
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    
+    if not payload or payload.get('user_type') != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    data = request.json or {}
+    date_from = parse_date_param(data.get('date_from'))
+    date_to = parse_date_param(data.get('date_to'), end_of_day=True)
+    
+    report_id, status = report_service.request(business_report_data(date_from, date_to))
+    return jsonify({
+        'success': True,
+        'report_id': report_id,
+        'status': status,
+        'url': f'/api/reports/business/{report_id}'
+    }), 200 if status == 'ready' else 202
+
+@app.route('/api/reports/business/<report_id>', methods=['GET'])
+def get_business_report(report_id):
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    
+    if not payload or payload.get('user_type') != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    if not report_id.isalnum():
+        return jsonify({'success': False, 'message': 'Report not found'}), 404
+    
+    status = report_service.status(report_id)
+    if status == 'ready':
+        return send_from_directory(
+            report_service.storage_dir,
+            os.path.basename(report_service.path(report_id)),
+            mimetype='application/pdf',
+            as_attachment=True,
+            download_name=f'business_report_{report_id}.pdf'
+        )
+    if status == 'pending':
+        return jsonify({'success': True, 'status': 'pending'}), 202
+    if status == 'failed':
+        return jsonify({'success': False, 'status': 'failed', 'message': 'Report generation failed'}), 500
+    return jsonify({'success': False, 'message': 'Report not found'}), 404
+
 @app.route('/api/callbacks/payhero/stk', methods=['POST'])
 def payhero_callback():
     data = request.json
@@ -1238,7 +2315,7 @@ def payhero_callback():
             logger.info(f"Found order {order.order_id}, current payment_status: {order.payment_status}")
             
             if success:
-                order.payment_status = 'Payment Complete'
+                set_payment_status(order, 'Payment Complete')
                 logger.info(f"Setting order {order.order_id} payment_status to 'Payment Complete'")
                 
                 if order.customer_id:
@@ -1252,7 +2329,7 @@ def payhero_callback():
                     db.session.add(notif)
                     logger.info(f"Created success notification for customer {order.customer_id}")
             else:
-                order.payment_status = 'Payment Failed'
+                set_payment_status(order, 'Payment Failed')
                 logger.info(f"Setting order {order.order_id} payment_status to 'Payment Failed'")
                 
                 if order.customer_id:
@@ -1269,10 +2346,7 @@ def payhero_callback():
             db.session.commit()
             logger.info(f"Order {order.order_id} payment status committed to database: {order.payment_status}")
             
-            socketio.emit('payment_update', {
-                'order_id': order.order_id,
-                'status': order.payment_status
-            })
+            emit_order_event('payment_update', order, order.payment_status)
         else:
             logger.error(f"Order not found for reference: {reference}")
     else:
@@ -1397,6 +2471,115 @@ def social_link_detail(link_id):
     db.session.commit()
     return jsonify({'success': True})
 
+@app.route('/api/admin/orders/archive', methods=['POST'])
+def archive_orders():
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    
+    if not payload or payload.get('user_type') != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    moved = archive_service.archive_delivered_orders()
+    return jsonify({'success': True, 'archived': moved})
+
+@app.route('/api/admin/rollups/rebuild', methods=['POST'])
+def rebuild_rollups():
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    
+    if not payload or payload.get('user_type') != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    sales_rows, capital_rows = rollup_service.rebuild()
+    return jsonify({'success': True, 'sales_rows': sales_rows, 'capital_rows': capital_rows})
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recompute the daily sales and capital rollups from scratch"""
+    sales_rows, capital_rows = rollup_service.rebuild()
+    print(f"Rebuilt {sales_rows} sales rollup rows and {capital_rows} capital rollup rows")
+
+@app.route('/api/admin/order-items/backfill', methods=['POST'])
+def backfill_order_items():
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    
+    if not payload or payload.get('user_type') != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    filled = sales_service.backfill()
+    return jsonify({'success': True, 'orders': filled})
+
+@app.cli.command('backfill-order-items')
+def backfill_order_items_command():
+    """Write order_items rows for orders placed before the table existed"""
+    filled = sales_service.backfill()
+    print(f"Backfilled line items for {filled} orders")
+
+@app.cli.command('warm-image-variants')
+def warm_image_variants_command():
+    """Generate resized variants for every active product image"""
+    urls = [url for (url,) in db.session.query(Product.image_url).filter(Product.is_active == True).distinct()]
+    futures = [image_variants.warm(url) for url in urls]
+    failed = sum(1 for future in futures if future.exception() is not None)
+    print(f"Generated variants for {len(urls) - failed} images, {failed} failed")
+
+IMAGE_VALIDATE_MAX_URLS = 200
+
+@app.route('/api/admin/images/validate', methods=['POST'])
+def validate_images():
+    """Check a batch of image URLs concurrently, e.g. before a bulk product edit"""
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    
+    if not payload or payload.get('user_type') != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    urls = (request.json or {}).get('urls')
+    if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+        return jsonify({'success': False, 'message': 'urls must be a list of strings'}), 400
+    if len(urls) > IMAGE_VALIDATE_MAX_URLS:
+        return jsonify({'success': False, 'message': f'At most {IMAGE_VALIDATE_MAX_URLS} URLs per request'}), 400
+    
+    results = image_validator.validate_many(urls)
+    return jsonify({
+        'success': True,
+        'results': {url: {'valid': is_valid, 'message': message} for url, (is_valid, message) in results.items()}
+    })
+
+@app.route('/api/admin/images/broken', methods=['GET'])
+def broken_images():
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    
+    if not payload or payload.get('user_type') != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    rows = db.session.query(ImageCheck, Product.name).join(Product, Product.id == ImageCheck.product_id).filter(
+        ImageCheck.is_broken == True
+    ).order_by(ImageCheck.broken_since).all()
+    return jsonify({
+        'success': True,
+        'images': [{
+            'product_id': check.product_id,
+            'product_name': name,
+            'image_url': check.image_url,
+            'message': check.message,
+            'broken_since': check.broken_since.isoformat() if check.broken_since else None,
+            'checked_at': check.checked_at.isoformat()
+        } for check, name in rows]
+    })
+
+@app.route('/api/admin/images/sweep', methods=['POST'])
+def sweep_images():
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token)
+    
+    if not payload or payload.get('user_type') != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    return jsonify({'success': True, **image_validator.sweep()})
+
 @app.route('/api/backup/history', methods=['GET'])
 def backup_history():
     history = BackupHistory.query.order_by(BackupHistory.created_at.desc()).limit(20).all()
@@ -1407,13 +2590,109 @@ def backup_history():
         'created_at': h.created_at.isoformat()
     } for h in history])
 
+def run_order_archival():
+    with app.app_context():
+        try:
+            moved = archive_service.archive_delivered_orders()
+            logger.info(f"Scheduled order archival moved {moved} orders")
+        except Exception as e:
+            logger.exception(f"Scheduled order archival failed: {str(e)}")
+            db.session.rollback()
+
+def run_image_sweep():
+    with app.app_context():
+        try:
+            image_validator.sweep()
+        except Exception as e:
+            logger.exception(f"Scheduled image sweep failed: {str(e)}")
+            db.session.rollback()
+
+def run_reservation_sweep():
+    with app.app_context():
+        try:
+            inventory_service.sweep()
+        except Exception as e:
+            logger.exception(f"Reservation sweep failed: {str(e)}")
+            db.session.rollback()
+
+scheduler = BackgroundScheduler(timezone=pytz.timezone('Africa/Nairobi'))
+scheduler.add_job(run_order_archival, 'interval', hours=int(os.getenv('ORDER_ARCHIVE_INTERVAL_HOURS', '6')), id='order_archival')
+scheduler.add_job(run_reservation_sweep, 'interval', minutes=1, id='reservation_sweep')
+scheduler.add_job(run_image_sweep, 'interval', minutes=int(os.getenv('IMAGE_SWEEP_INTERVAL_MINUTES', '60')), id='image_sweep')
+
+def start_scheduler():
+    """Run the periodic jobs once, in the process that serves requests"""
+    if SPAWNED_WORKER or scheduler.running:
+        return
+    scheduler.start()
+
+# Imported by gunicorn (app:app); `python app.py` starts it below instead
+if __name__ != '__main__':
+    start_scheduler()
+
 @socketio.on('connect')
-def handle_connect():
-    emit('connected', {'message': 'Connected to SAFARI BYTES'})
+def handle_connect(auth=None):
+    # Only from the auth payload: a query-string token would end up in access logs
+    token = (auth or {}).get('token')
+    payload = verify_token(token) if token else None
+    rooms = []
+    
+    if payload:
+        user_type = payload.get('user_type')
+        if user_type == 'admin':
+            rooms.append('admin')
+        elif user_type == 'staff':
+            staff = Staff.query.get(payload['user_id'])
+            if staff and staff.is_approved and staff.is_active:
+                rooms.append('staff')
+        elif user_type == 'customer':
+            rooms.append(f"customer:{payload['user_id']}")
+    
+    for room in rooms:
+        join_room(room)
+    
+    emit('connected', {'message': 'Connected to SAFARI BYTES', 'rooms': rooms})
+
+@socketio.on('subscribe_order')
+def handle_subscribe_order(data):
+    """
+    Let one order's events (which carry the customer's contact details) reach a socket
+    that proves it may see them: the `order_token` returned when the order was placed,
+    the owning customer's token, or an admin or approved rider token.
+    """
+    data = data or {}
+    order_id = data.get('order_id')
+    order = Order.query.filter_by(order_id=order_id).first() if isinstance(order_id, str) else None
+    
+    if not order:
+        return {'success': False, 'message': 'Order not found'}
+    
+    order_token = data.get('order_token')
+    allowed = isinstance(order_token, str) and hmac.compare_digest(order_token, order_access_token(order.order_id))
+    
+    if not allowed and data.get('token'):
+        payload = verify_token(data['token'])
+        user_type = payload.get('user_type') if payload else None
+        if user_type == 'admin':
+            allowed = True
+        elif user_type == 'staff':
+            staff = Staff.query.get(payload['user_id'])
+            allowed = bool(staff and staff.is_approved and staff.is_active)
+        elif user_type == 'customer':
+            allowed = order.customer_id is not None and payload['user_id'] == order.customer_id
+    
+    if not allowed:
+        return {'success': False, 'message': 'Unauthorized'}
+    
+    join_room(f'order:{order.order_id}')
+    return {'success': True}
 
 @socketio.on('disconnect')
 def handle_disconnect():
     pass
 
 if __name__ == '__main__':
+    # debug=True serves from a reloader child (WERKZEUG_RUN_MAIN); this first process only watches files
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_scheduler()
     socketio.run(app, host='0.0.0.0', port=5000, debug=True, allow_unsafe_werkzeug=True)
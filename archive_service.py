@@ -0,0 +1,61 @@
+import logging
+from datetime import timedelta
+from sqlalchemy import select, insert, literal
+from models import db, Order, ArchivedOrder, get_nairobi_time
+
+logger = logging.getLogger(__name__)
+
+
+class OrderArchiveService:
+    """
+    Moves delivered orders older than `archive_after_days` from the hot `orders`
+    table into `orders_archive`, in batches, so the live table and its indexes
+    only hold recent and in-flight orders.
+    """
+
+    def __init__(self, archive_after_days=30, batch_size=500):
+        self.archive_after_days = archive_after_days
+        self.batch_size = batch_size
+
+    def cutoff(self):
+        """Delivered orders older than this belong in cold storage"""
+        return get_nairobi_time() - timedelta(days=self.archive_after_days)
+
+    def needs_cold_storage(self, date_from):
+        """True when a listing starting at date_from may reach orders already archived"""
+        return date_from is not None and date_from < self.cutoff().replace(tzinfo=None)
+
+    def archive_delivered_orders(self):
+        """
+        Copy eligible orders into the archive and delete them from `orders`, one
+        committed batch at a time.
+
+        Returns:
+            Number of orders moved
+        """
+        cutoff = self.cutoff()
+        columns = [c.name for c in ArchivedOrder.__table__.columns if c.name != 'archived_at']
+        moved = 0
+
+        while True:
+            ids = [row.id for row in db.session.query(Order.id).filter(
+                Order.is_archived == True,
+                Order.delivered_at < cutoff
+            ).order_by(Order.id).limit(self.batch_size).with_for_update(skip_locked=True).all()]
+
+            if not ids:
+                break
+
+            source = select(
+                *[Order.__table__.c[name] for name in columns],
+                literal(get_nairobi_time(), db.DateTime).label('archived_at')
+            ).where(Order.id.in_(ids))
+
+            db.session.execute(insert(ArchivedOrder.__table__).from_select(columns + ['archived_at'], source))
+            Order.query.filter(Order.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+
+            moved += len(ids)
+            logger.info(f"Archived {len(ids)} delivered orders ({moved} so far)")
+
+        return moved
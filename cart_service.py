@@ -0,0 +1,164 @@
+import logging
+from sqlalchemy import func, case, delete
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, Cart, Product, get_nairobi_time
+
+logger = logging.getLogger(__name__)
+
+
+class CartService:
+    """
+    Server-side customer carts, one row per (customer, product).
+
+    The unique index on (customer_id, product_id) lets every write be a single
+    upsert, so concurrent adds for the same product cannot create duplicate
+    lines, and a whole browser cart is reconciled with one multi-row upsert
+    instead of a request per item.
+
+    Methods other than collapse_duplicates() run on the caller's session;
+    callers commit or roll back.
+    """
+
+    def __init__(self, max_lines=100):
+        self.max_lines = max_lines
+
+    def collapse_duplicates(self):
+        """
+        Fold duplicate (customer, product) lines left by the old read-then-write
+        adds into the oldest line, so the unique index can be built; commits.
+        """
+        groups = db.session.query(
+            Cart.customer_id, Cart.product_id, func.min(Cart.id), func.sum(Cart.quantity)
+        ).group_by(Cart.customer_id, Cart.product_id).having(func.count(Cart.id) > 1).all()
+
+        for customer_id, product_id, keep_id, quantity in groups:
+            db.session.query(Cart).filter(Cart.id == keep_id).update({'quantity': quantity})
+            db.session.query(Cart).filter(
+                Cart.customer_id == customer_id, Cart.product_id == product_id, Cart.id != keep_id
+            ).delete(synchronize_session=False)
+
+        db.session.commit()
+        if groups:
+            logger.info(f"Collapsed {len(groups)} duplicate cart lines")
+        return len(groups)
+
+    def items(self, customer_id):
+        """The customer's cart lines with their products, in one joined query"""
+        rows = db.session.query(
+            Cart.id, Cart.product_id, Cart.quantity, Product.name, Product.price_now, Product.image_url
+        ).join(Product, Product.id == Cart.product_id).filter(
+            Cart.customer_id == customer_id
+        ).order_by(Cart.id).all()
+        return [{
+            'id': cart_id,
+            'product_id': product_id,
+            'quantity': quantity,
+            'product': {
+                'name': name,
+                'price_now': price_now,
+                'image_url': image_url
+            }
+        } for cart_id, product_id, quantity, name, price_now, image_url in rows]
+
+    def _upsert(self, rows, set_):
+        table = Cart.__table__
+        insert = postgresql_insert if db.engine.dialect.name == 'postgresql' else sqlite_insert
+
+        stmt = insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.customer_id, table.c.product_id],
+            set_={**set_(table, stmt.excluded), 'updated_at': stmt.excluded.updated_at}
+        )
+        db.session.execute(stmt)
+
+    def _row(self, customer_id, product_id, quantity):
+        now = get_nairobi_time()
+        return {
+            'customer_id': customer_id,
+            'product_id': product_id,
+            'quantity': quantity,
+            'created_at': now,
+            'updated_at': now
+        }
+
+    def _active_ids(self, product_ids):
+        if not product_ids:
+            return set()
+        return {product_id for (product_id,) in db.session.query(Product.id).filter(
+            Product.id.in_(list(product_ids)), Product.is_active == True
+        )}
+
+    def add(self, customer_id, product_id, quantity=1):
+        """
+        Add `quantity` of a product to the cart, creating the line if needed.
+
+        Returns:
+            (success: bool, message: str)
+        """
+        if not self._active_ids([product_id]):
+            return False, "Product not found"
+        self._upsert([self._row(customer_id, product_id, quantity)],
+                     lambda table, excluded: {'quantity': table.c.quantity + excluded.quantity})
+        return True, "Added to cart"
+
+    def parse_items(self, raw_items):
+        """
+        Normalise a browser cart, either {product_id: quantity} or a list of
+        {'product_id', 'quantity'} dicts, into {product_id: quantity}.
+
+        Returns:
+            (items: dict or None, error: str or None)
+        """
+        if isinstance(raw_items, dict):
+            pairs = list(raw_items.items())
+        elif isinstance(raw_items, list):
+            pairs = [(item.get('product_id'), item.get('quantity')) for item in raw_items if isinstance(item, dict)]
+        else:
+            return None, "items must be an object or a list"
+
+        items = {}
+        for product_id, quantity in pairs:
+            try:
+                product_id, quantity = int(product_id), int(quantity)
+            except (TypeError, ValueError):
+                return None, "Each item needs an integer product_id and quantity"
+            if quantity > 0:
+                items[product_id] = items.get(product_id, 0) + quantity
+
+        if len(items) > self.max_lines:
+            return None, f"A cart can hold at most {self.max_lines} products"
+        return items, None
+
+    def sync(self, customer_id, items, mode='merge'):
+        """
+        Reconcile the stored cart with a browser cart of {product_id: quantity}.
+
+        'merge' keeps the larger quantity of each product and leaves lines the
+        browser does not have, so merging the same cart twice changes nothing.
+        'replace' makes the stored cart exactly `items`.
+
+        Returns:
+            list of product IDs that were dropped because they are no longer sold
+        """
+        active = self._active_ids(items)
+        rows = [self._row(customer_id, product_id, items[product_id]) for product_id in sorted(active)]
+
+        if rows:
+            if mode == 'replace':
+                set_ = lambda table, excluded: {'quantity': excluded.quantity}
+            else:
+                set_ = lambda table, excluded: {'quantity': case(
+                    (excluded.quantity > table.c.quantity, excluded.quantity), else_=table.c.quantity
+                )}
+            self._upsert(rows, set_)
+
+        if mode == 'replace':
+            db.session.execute(delete(Cart).where(
+                Cart.customer_id == customer_id, Cart.product_id.notin_(active)
+            ))
+
+        return sorted(set(items) - active)
+
+    def clear(self, customer_id):
+        db.session.execute(delete(Cart).where(Cart.customer_id == customer_id))
@@ -0,0 +1,161 @@
+import time
+import threading
+import logging
+from models import Product
+
+logger = logging.getLogger(__name__)
+
+
+def combo_components(combo_items):
+    """
+    Normalize Product.combo_items into (product_id, quantity) pairs.
+    Accepts a list of product IDs or of {'product_id': id, 'quantity': n} dicts.
+    """
+    components = []
+    for entry in combo_items or []:
+        if isinstance(entry, dict):
+            product_id = entry.get('product_id') or entry.get('id')
+            quantity = entry.get('quantity', 1)
+        else:
+            product_id, quantity = entry, 1
+        try:
+            components.append((int(product_id), int(quantity)))
+        except (TypeError, ValueError):
+            continue
+    return components
+
+
+class ComboResolver:
+    """
+    Resolves every active product, combos included, to its effective
+    availability, cost of goods and margin.
+
+    The component graph is loaded with one query and each combo is expanded
+    once into the base products it contains (nested combos are flattened).
+    A combo is available only if it and every component are active and
+    available, and its cost of goods is the sum of its components' costs.
+    Like PricingService, the result is reused until invalidate() is called
+    after a product write, with a max_age bounding staleness across workers.
+    """
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._version = 0
+        self._loaded_version = -1
+        self._loaded_at = 0
+        self._resolved = {}
+        self._dependents = {}
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._loaded_version == self._version and time.monotonic() - self._loaded_at < self.max_age:
+                return self._resolved
+            version = self._version
+
+        nodes = {}
+        for p in Product.query.filter_by(is_active=True).all():
+            nodes[p.id] = {
+                'price': p.price_now or 0.0,
+                'cost': p.cost_of_goods or 0.0,
+                'is_available': bool(p.is_available),
+                'components': combo_components(p.combo_items) if p.is_combo else []
+            }
+
+        resolved = {}
+        dependents = {}
+
+        def resolve(product_id, path):
+            if product_id in resolved:
+                return resolved[product_id]
+            node = nodes[product_id]
+            expanded, missing = {}, []
+            is_available = node['is_available']
+
+            if not node['components']:
+                expanded[product_id] = 1
+                cost = node['cost']
+            else:
+                cost = 0.0
+                for component_id, quantity in node['components']:
+                    dependents.setdefault(component_id, set()).add(product_id)
+                    if component_id not in nodes or component_id in path:
+                        if component_id in path:
+                            logger.warning(f"Combo {product_id} contains itself through product {component_id}")
+                        missing.append(component_id)
+                        is_available = False
+                        continue
+                    component = resolve(component_id, path | {component_id})
+                    is_available = is_available and component['is_available']
+                    cost += component['cost_of_goods'] * quantity
+                    missing += component['missing_components']
+                    for base_id, base_quantity in component['expanded'].items():
+                        expanded[base_id] = expanded.get(base_id, 0) + base_quantity * quantity
+
+            margin = node['price'] - cost
+            resolved[product_id] = {
+                'is_available': is_available,
+                'cost_of_goods': round(cost, 2),
+                'margin': round(margin, 2),
+                'margin_percentage': round(margin / node['price'] * 100, 1) if node['price'] else None,
+                'expanded': expanded,
+                'missing_components': missing
+            }
+            return resolved[product_id]
+
+        for product_id in nodes:
+            resolve(product_id, {product_id})
+
+        # Combos reach their components' dependents too, so a change deep in a nested combo reaches the top
+        for component_id in list(dependents):
+            pending = list(dependents[component_id])
+            while pending:
+                combo_id = pending.pop()
+                for parent_id in dependents.get(combo_id, ()):
+                    if parent_id not in dependents[component_id]:
+                        dependents[component_id].add(parent_id)
+                        pending.append(parent_id)
+
+        with self._lock:
+            self._resolved = resolved
+            self._dependents = dependents
+            self._loaded_version = version
+            self._loaded_at = time.monotonic()
+
+        logger.debug(f"Combo graph resolved: {len(resolved)} products, version {version}")
+        return resolved
+
+    def resolve(self, product_id):
+        """
+        Derived figures for an active product, or None if it is not active.
+
+        Returns:
+            {'is_available', 'cost_of_goods', 'margin', 'margin_percentage',
+             'expanded': {base_product_id: quantity}, 'missing_components': [product_id]}
+        """
+        return self._ensure_loaded().get(product_id)
+
+    def is_available(self, product_id):
+        resolved = self.resolve(product_id)
+        return bool(resolved and resolved['is_available'])
+
+    def dependents(self, product_id):
+        """IDs of the combos that contain `product_id`, directly or through another combo"""
+        self._ensure_loaded()
+        return set(self._dependents.get(product_id, ()))
+
+    def with_margins(self, sales_rows):
+        """Add cost_of_goods and gross_margin to SalesService.product_sales rows, at current costs"""
+        resolved = self._ensure_loaded()
+        for row in sales_rows:
+            entry = resolved.get(row['product_id'])
+            if entry is None:
+                row['cost_of_goods'] = row['gross_margin'] = None
+                continue
+            row['cost_of_goods'] = round(entry['cost_of_goods'] * row['units_sold'], 2)
+            row['gross_margin'] = round(row['revenue'] - row['cost_of_goods'], 2)
+        return sales_rows
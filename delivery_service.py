@@ -0,0 +1,94 @@
+import os
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def parse_origins(value):
+    """
+    Parse kitchen origins from "lat,lon;lat,lon"
+    Returns: (n, 2) float array of degrees (empty if unset or invalid)
+    """
+    origins = []
+    for pair in (value or '').split(';'):
+        if not pair.strip():
+            continue
+        try:
+            lat, lon = (float(part) for part in pair.split(','))
+        except ValueError:
+            logger.warning(f"Ignoring invalid kitchen origin: {pair}")
+            continue
+        origins.append((lat, lon))
+    return np.array(origins, dtype=float).reshape(-1, 2)
+
+
+class DeliveryService:
+    """
+    Distance-based delivery fee quoting.
+
+    Distances are great-circle (haversine) distances from the nearest kitchen
+    origin, scaled by a road factor, computed for whole batches of points at
+    once with NumPy broadcasting.
+    """
+
+    def __init__(self, origins=None, road_factor=None):
+        self.origins = parse_origins(origins if origins is not None else os.getenv('KITCHEN_LOCATIONS'))
+        self.road_factor = float(road_factor if road_factor is not None else os.getenv('DELIVERY_ROAD_FACTOR', '1.3'))
+        self._origins_rad = np.radians(self.origins)
+
+        logger.info(f"DeliveryService initialized with {len(self.origins)} kitchen origin(s), road factor {self.road_factor}")
+
+    @property
+    def is_configured(self):
+        return len(self.origins) > 0
+
+    def distances_km(self, latitudes, longitudes):
+        """
+        Road-adjusted distance from the nearest origin for each point.
+
+        Returns:
+            (distances: float array, origin_index: int array); NaN / -1 where a
+            point has no coordinates or no origins are configured
+        """
+        lat = np.radians(np.asarray(latitudes, dtype=float)).reshape(-1, 1)
+        lon = np.radians(np.asarray(longitudes, dtype=float)).reshape(-1, 1)
+
+        if not self.is_configured:
+            return np.full(lat.shape[0], np.nan), np.full(lat.shape[0], -1)
+
+        origin_lat = self._origins_rad[:, 0].reshape(1, -1)
+        origin_lon = self._origins_rad[:, 1].reshape(1, -1)
+
+        a = (np.sin((lat - origin_lat) / 2) ** 2
+             + np.cos(lat) * np.cos(origin_lat) * np.sin((lon - origin_lon) / 2) ** 2)
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0))) * self.road_factor
+
+        # A point without coordinates is NaN against every origin, so min() keeps it NaN
+        nearest = np.argmin(np.nan_to_num(distances, nan=np.inf), axis=1)
+        nearest_distance = distances.min(axis=1)
+        return nearest_distance, np.where(np.isnan(nearest_distance), -1, nearest)
+
+    def quote_fees(self, latitudes, longitudes, min_fee, per_km_rate):
+        """
+        Vectorized calculate_delivery_fee: max(distance * rate, min_fee), min_fee where distance is unknown
+
+        Returns:
+            (fees: float array, distances: float array, origin_index: int array)
+        """
+        distances, nearest = self.distances_km(latitudes, longitudes)
+        fees = np.where(np.isnan(distances), min_fee, np.maximum(np.nan_to_num(distances) * per_km_rate, min_fee))
+        return np.round(fees, 2), distances, nearest
+
+    def quote_fee(self, latitude, longitude, min_fee, per_km_rate):
+        """
+        Fee for a single destination
+        Returns: (fee: float, distance_km: float or None)
+        """
+        if latitude is None or longitude is None:
+            return round(float(min_fee), 2), None
+        fees, distances, _ = self.quote_fees([latitude], [longitude], min_fee, per_km_rate)
+        distance = None if np.isnan(distances[0]) else round(float(distances[0]), 3)
+        return float(fees[0]), distance
@@ -0,0 +1,80 @@
+import io
+import csv
+import tempfile
+import logging
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+logger = logging.getLogger(__name__)
+
+ORDER_EXPORT_HEADER = [
+    'Order ID', 'Created At', 'Customer Name', 'Customer Phone', 'Customer Email', 'Items',
+    'Product Total', 'Delivery Fee', 'Convenience Fee', 'Transaction Fee', 'Total Amount',
+    'Payment Method', 'Payment Status', 'Status', 'Staff', 'Delivery Address', 'Delivered At', 'Archived'
+]
+
+# Spreadsheet apps evaluate cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@')
+
+
+def format_items(items):
+    """Summarize an order's items JSON as 'Burger x2; Soda x1'"""
+    return '; '.join(f"{item.get('name', 'Item')} x{item.get('quantity', 1)}" for item in items or [])
+
+
+def _safe_text(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(rows, header=ORDER_EXPORT_HEADER, chunk_rows=500):
+    """
+    Yield CSV text in chunks of `chunk_rows` rows as `rows` is consumed, so the
+    first bytes go out while the query is still producing the rest
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+
+    count = 0
+    for row in rows:
+        writer.writerow([_safe_text(value) for value in row])
+        count += 1
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+    logger.info(f"Streamed {count} rows as CSV")
+
+
+def stream_xlsx(rows, header=ORDER_EXPORT_HEADER, sheet_title='Orders', chunk_size=64 * 1024):
+    """
+    Write rows to a write-only workbook (rows go to a temp file, not memory) and
+    yield the finished file in chunks. XLSX is a zip archive, so unlike CSV
+    nothing can be sent until the last row is written.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_title)
+    sheet.append(header)
+
+    count = 0
+    for row in rows:
+        sheet.append([
+            _safe_text(ILLEGAL_CHARACTERS_RE.sub('', value)) if isinstance(value, str) else value
+            for value in row
+        ])
+        count += 1
+
+    with tempfile.TemporaryFile() as output:
+        workbook.save(output)
+        output.seek(0)
+        while True:
+            chunk = output.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    logger.info(f"Streamed {count} rows as XLSX")
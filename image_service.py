@@ -0,0 +1,287 @@
+import os
+import time
+import hashlib
+import threading
+import logging
+import multiprocessing
+import requests
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from models import db, Product, ImageCheck, get_nairobi_time
+from utils import validate_image_url
+from image_worker import VARIANT_SIZES, VARIANT_FORMATS, render_variants, write_file
+
+logger = logging.getLogger(__name__)
+
+
+class ImageValidator:
+    """
+    Checks image URLs on a thread pool and remembers the answer per URL.
+
+    Valid results are kept for `ttl` seconds and failures for the shorter
+    `failure_ttl`, so a URL that was briefly down is retried soon. Concurrent
+    requests for the same URL share one HEAD request. `check` is the function
+    that does the actual request, validate_image_url unless replaced.
+    """
+
+    def __init__(self, check=validate_image_url, max_workers=8, ttl=600, failure_ttl=60, max_entries=5000):
+        self.check = check
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image-check')
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._pending = {}
+
+    def _store(self, url, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = (False, f"Failed to validate URL: {str(e)}")
+
+        expires_at = time.monotonic() + (self.ttl if result[0] else self.failure_ttl)
+        with self._lock:
+            if len(self._cache) >= self.max_entries:
+                self._cache.clear()
+            self._cache[url] = (expires_at, result)
+            self._pending.pop(url, None)
+
+    def submit(self, url, refresh=False):
+        """
+        Future resolving to (is_valid, message) for `url`, already resolved when a
+        fresh cached result exists. refresh=True ignores the cache.
+        """
+        with self._lock:
+            cached = self._cache.get(url)
+            if cached and not refresh and cached[0] > time.monotonic():
+                future = Future()
+                future.set_result(cached[1])
+                return future
+
+            future = self._pending.get(url)
+            if future is not None:
+                return future
+            future = self._pending[url] = self._executor.submit(self.check, url)
+
+        # Added outside the lock: the callback runs immediately if the check already finished
+        future.add_done_callback(lambda f: self._store(url, f))
+        return future
+
+    def cached(self, url):
+        """Fresh cached (is_valid, message) for `url`, or None; never makes a request"""
+        with self._lock:
+            cached = self._cache.get(url)
+        return cached[1] if cached and cached[0] > time.monotonic() else None
+
+    def validate(self, url):
+        """(is_valid, message) for one URL"""
+        return self.validate_many([url])[url]
+
+    def validate_many(self, urls, refresh=False):
+        """
+        Check several URLs at once.
+
+        Returns:
+            dict mapping each distinct URL to (is_valid, message)
+        """
+        futures = {url: self.submit(url, refresh) for url in dict.fromkeys(urls)}
+        results = {}
+        for url, future in futures.items():
+            try:
+                results[url] = future.result()
+            except Exception as e:
+                results[url] = (False, f"Failed to validate URL: {str(e)}")
+        return results
+
+    def invalidate(self, url=None):
+        with self._lock:
+            if url is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(url, None)
+
+    def sweep(self, product_ids=None, refresh=True):
+        """
+        Re-check every active product's image, or only those in `product_ids`,
+        and record the outcome in image_checks. refresh=False reuses fresh
+        cached results, as when checking a product that was just saved.
+
+        Returns:
+            dict with checked, broken and newly_broken counts
+        """
+        products = db.session.query(Product.id, Product.image_url).filter(Product.is_active == True)
+        checks = ImageCheck.query
+        if product_ids is not None:
+            products = products.filter(Product.id.in_(product_ids))
+            checks = checks.filter(ImageCheck.product_id.in_(product_ids))
+        products = products.all()
+
+        results = self.validate_many([image_url for _, image_url in products], refresh=refresh)
+        checks = {check.product_id: check for check in checks.all()}
+        now = get_nairobi_time()
+
+        broken = newly_broken = 0
+        for product_id, image_url in products:
+            is_valid, message = results[image_url]
+            check = checks.pop(product_id, None)
+            if check is None:
+                check = ImageCheck(product_id=product_id)
+                db.session.add(check)
+
+            if is_valid:
+                check.broken_since = None
+            else:
+                broken += 1
+                if not check.is_broken or check.image_url != image_url:
+                    newly_broken += 1
+                    check.broken_since = now
+                    logger.warning(f"Product {product_id} image is broken: {image_url} ({message})")
+
+            check.image_url = image_url
+            check.is_broken = not is_valid
+            check.message = None if is_valid else message[:500]
+            check.checked_at = now
+
+        # Products deactivated since the last sweep
+        for check in checks.values():
+            db.session.delete(check)
+
+        db.session.commit()
+        logger.info(f"Image sweep checked {len(products)} products: {broken} broken, {newly_broken} newly broken")
+        return {'checked': len(products), 'broken': broken, 'newly_broken': newly_broken}
+
+
+def url_key(url):
+    """Short stable key for a source image URL, used in variant URLs to bust caches when it changes"""
+    return hashlib.sha256(url.encode()).hexdigest()[:16]
+
+
+class ImageVariantService:
+    """
+    Fetches each product image once and stores resized WebP and JPEG variants.
+
+    Variants are content-addressed: they are named after a hash of the source
+    bytes, so products sharing an image share its files, and a small pointer
+    file per source URL records which content it resolved to. Everything lives
+    on disk, so all workers see the same cache.
+
+    Downloads run on a thread pool; decoding and resizing run in a separate
+    process (see image_worker), so they never hold up the server's event loop.
+    """
+
+    def __init__(self, storage_dir, max_workers=2, render_workers=1, max_bytes=10 * 1024 * 1024, timeout=10):
+        self.storage_dir = os.path.abspath(storage_dir)
+        self.render_workers = render_workers
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image-variants')
+        self._render_executor = None
+        self._lock = threading.Lock()
+        self._pending = {}
+        os.makedirs(os.path.join(self.storage_dir, 'urls'), exist_ok=True)
+
+    def _render_pool(self):
+        # Spawned for the same reason as ReportService's pool: workers must not inherit the eventlet-patched process
+        with self._lock:
+            if self._render_executor is None:
+                self._render_executor = ProcessPoolExecutor(
+                    max_workers=self.render_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._render_executor
+
+    def variant_urls(self, product_id, image_url):
+        """{'thumbnail': {'webp': url, 'jpeg': url}, 'card': ..., 'detail': ...} for the products API"""
+        version = url_key(image_url)
+        return {
+            variant: {fmt: f"/api/images/{product_id}/{variant}.{fmt}?v={version}" for fmt in VARIANT_FORMATS}
+            for variant in VARIANT_SIZES
+        }
+
+    def _pointer_path(self, image_url):
+        return os.path.join(self.storage_dir, 'urls', hashlib.sha256(image_url.encode()).hexdigest())
+
+    @staticmethod
+    def _variant_name(content_hash, variant, fmt):
+        return os.path.join(content_hash[:2], f"{content_hash}_{variant}.{fmt}")
+
+    def _variant_path(self, content_hash, variant, fmt):
+        return os.path.join(self.storage_dir, self._variant_name(content_hash, variant, fmt))
+
+    def _content_hash(self, image_url):
+        """Hash of the content `image_url` last resolved to, or None if it was never fetched"""
+        try:
+            with open(self._pointer_path(image_url)) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def cached_variant(self, image_url, variant, fmt):
+        """Path of the variant relative to storage_dir, or None if it has not been generated"""
+        content_hash = self._content_hash(image_url)
+        if content_hash is None:
+            return None
+
+        name = self._variant_name(content_hash, variant, fmt)
+        return name if os.path.exists(self._variant_path(content_hash, variant, fmt)) else None
+
+    def warm(self, image_url):
+        """
+        Start generating the variants of `image_url` in the background; returns a
+        Future resolving to the content hash. Already resolved, without fetching
+        the source again, when every variant is on disk.
+        """
+        content_hash = self._content_hash(image_url)
+        if content_hash and all(
+            os.path.exists(self._variant_path(content_hash, variant, fmt))
+            for variant in VARIANT_SIZES for fmt in VARIANT_FORMATS
+        ):
+            future = Future()
+            future.set_result(content_hash)
+            return future
+
+        with self._lock:
+            future = self._pending.get(image_url)
+            if future is not None:
+                return future
+            future = self._pending[image_url] = self._executor.submit(self._process, image_url)
+
+        future.add_done_callback(lambda f: self._forget(image_url, f))
+        return future
+
+    def _forget(self, image_url, future):
+        with self._lock:
+            self._pending.pop(image_url, None)
+        if future.exception() is not None:
+            logger.warning(f"Image variants failed for {image_url}: {future.exception()}")
+
+    def _fetch(self, image_url):
+        response = requests.get(image_url, timeout=self.timeout, stream=True)
+        try:
+            if response.status_code != 200:
+                raise ValueError(f"URL returned status code {response.status_code}")
+
+            data = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                data.extend(chunk)
+                if len(data) > self.max_bytes:
+                    raise ValueError(f"Image is larger than {self.max_bytes} bytes")
+            return bytes(data)
+        finally:
+            response.close()
+
+    def _process(self, image_url):
+        data = self._fetch(image_url)
+        content_hash = hashlib.sha256(data).hexdigest()
+
+        missing = [
+            (variant, fmt, self._variant_path(content_hash, variant, fmt))
+            for variant in VARIANT_SIZES for fmt in VARIANT_FORMATS
+            if not os.path.exists(self._variant_path(content_hash, variant, fmt))
+        ]
+        if missing:
+            self._render_pool().submit(render_variants, data, missing).result()
+            logger.info(f"Generated {len(missing)} image variants for {image_url} ({len(data)} bytes)")
+
+        write_file(self._pointer_path(image_url), content_hash.encode())
+        return content_hash
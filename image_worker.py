@@ -0,0 +1,50 @@
+import io
+import os
+import threading
+from PIL import Image, ImageOps
+
+# Longest edge in pixels; images smaller than this are not upscaled
+VARIANT_SIZES = {'thumbnail': 160, 'card': 480, 'detail': 1080}
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def write_file(path, data):
+    """Write `data` to `path` through a temporary file, so readers never see a partial image"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+    with open(partial, 'wb') as f:
+        f.write(data)
+    os.replace(partial, path)
+
+
+def render_variants(data, targets):
+    """
+    Process-pool entry point: decode a source image and write the requested
+    resized variants, given as (variant, fmt, path) tuples.
+
+    Kept apart from image_service so a worker imports only Pillow, and so the
+    CPU-bound resizing never runs on the server's event loop.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source)
+        has_alpha = source.mode in ('RGBA', 'LA') or (source.mode == 'P' and 'transparency' in source.info)
+        source = source.convert('RGBA' if has_alpha else 'RGB')
+
+        for variant, fmt, path in targets:
+            image = source.copy()
+            image.thumbnail((VARIANT_SIZES[variant], VARIANT_SIZES[variant]), Image.LANCZOS)
+            if fmt == 'jpeg' and has_alpha:
+                # JPEG has no alpha channel, so flatten onto white
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+
+            pil_format, options = VARIANT_FORMATS[fmt]
+            output = io.BytesIO()
+            image.save(output, pil_format, **options)
+            write_file(path, output.getvalue())
+
+    return len(targets)
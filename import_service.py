@@ -0,0 +1,181 @@
+import os
+import logging
+import pandas as pd
+from sqlalchemy import insert, update
+from models import db, Product, get_nairobi_time
+
+logger = logging.getLogger(__name__)
+
+IMPORT_COLUMNS = ['id', 'name', 'description', 'price_now', 'price_old', 'stock', 'category', 'cost_of_goods', 'image_url', 'is_available']
+MAX_LENGTHS = {'name': 255, 'category': 100, 'stock': 100, 'image_url': 500}
+TRUE_VALUES = ('1', 'true', 'yes', 'y')
+FALSE_VALUES = ('0', 'false', 'no', 'n')
+
+
+class ProductImportService:
+    """
+    Creates and updates products from a CSV or XLSX sheet in one transaction.
+
+    Rows with an `id` update that product; rows without one update the active
+    product with the same name (case-insensitive) or create a new product,
+    which needs price_now, category and image_url. Blank cells in an update
+    keep the current value. Validation runs column by
+    column over the whole sheet, image URLs that are new or changed are checked
+    concurrently, and the writes go out as batched executemany statements.
+    """
+
+    def __init__(self, image_validator, max_rows=5000, batch_size=500):
+        self.image_validator = image_validator
+        self.max_rows = max_rows
+        self.batch_size = batch_size
+
+    def read(self, stream, filename):
+        """Load the sheet as strings with normalized column names; raises ValueError if unreadable"""
+        extension = os.path.splitext(filename or '')[1].lower()
+        try:
+            if extension == '.csv':
+                frame = pd.read_csv(stream, dtype=str, keep_default_na=False)
+            elif extension == '.xlsx':
+                frame = pd.read_excel(stream, dtype=str, keep_default_na=False, engine='openpyxl')
+            else:
+                raise ValueError('File must be a .csv or .xlsx')
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(f'Could not read {extension or "file"}: {str(e)}')
+
+        frame.columns = [str(c).strip().lower().replace(' ', '_') for c in frame.columns]
+        if 'id' not in frame.columns and 'name' not in frame.columns:
+            raise ValueError('The sheet needs an id or name column')
+        if frame.empty:
+            raise ValueError('The file has no product rows')
+        if len(frame) > self.max_rows:
+            raise ValueError(f'At most {self.max_rows} rows per import')
+
+        for column in IMPORT_COLUMNS:
+            if column not in frame.columns:
+                frame[column] = ''
+        frame = frame[IMPORT_COLUMNS].fillna('').astype(str)
+        return frame.apply(lambda column: column.str.strip()).reset_index(drop=True)
+
+    def _validate(self, frame):
+        """Resolve each row's target product and collect {row_index: [messages]}"""
+        errors = {}
+
+        def flag(mask, message):
+            for index in frame.index[mask]:
+                errors.setdefault(index, []).append(message)
+
+        def numeric(column):
+            return pd.to_numeric(frame[column].str.replace(',', '', regex=False), errors='coerce')
+
+        price_now, price_old, cost = numeric('price_now'), numeric('price_old'), numeric('cost_of_goods')
+        product_id = pd.to_numeric(frame['id'], errors='coerce')
+        has = {column: frame[column] != '' for column in IMPORT_COLUMNS}
+
+        flag(~has['id'] & ~has['name'], 'name is required')
+        flag(has['price_now'] & (price_now.isna() | (price_now <= 0)), 'price_now must be a positive number')
+        flag(has['price_old'] & (price_old.isna() | (price_old <= 0)), 'price_old must be a positive number')
+        flag(has['cost_of_goods'] & (cost.isna() | (cost < 0)), 'cost_of_goods must be zero or more')
+        flag(has['id'] & (product_id.isna() | (product_id % 1 != 0)), 'id must be a whole number')
+        flag(has['is_available'] & ~frame['is_available'].str.lower().isin(TRUE_VALUES + FALSE_VALUES), 'is_available must be yes or no')
+        bad_url = has['image_url'] & ~frame['image_url'].str.match(r'https?://')
+        flag(bad_url, 'image_url must start with http:// or https://')
+        for column, limit in MAX_LENGTHS.items():
+            flag(frame[column].str.len() > limit, f'{column} is longer than {limit} characters')
+
+        existing = db.session.query(Product.id, Product.name, Product.image_url).filter(Product.is_active == True).order_by(Product.id).all()
+        image_urls = {p.id: p.image_url for p in existing}
+        by_name = {}
+        for p in existing:
+            by_name.setdefault(p.name.strip().lower(), p.id)
+
+        flag(has['id'] & product_id.notna() & ~product_id.isin(list(image_urls)), 'no active product with this id')
+        target = product_id.where(has['id'], frame['name'].str.lower().map(by_name))
+        is_new = target.isna()
+        for column in ('price_now', 'category', 'image_url'):
+            flag(is_new & ~has[column], f'{column} is required for new products')
+
+        key = ('id:' + target.astype(str)).where(~is_new, 'new:' + frame['name'].str.lower())
+        flag(key.duplicated(keep=False), 'product appears more than once in the file')
+
+        # Only URLs that differ from what the product already has need a network check
+        changed = has['image_url'] & ~bad_url & (is_new | (frame['image_url'] != target.map(image_urls)))
+        urls = frame.loc[changed, 'image_url'].unique().tolist()
+        results = self.image_validator.validate_many(urls) if urls else {}
+        for url, (is_valid, message) in results.items():
+            if not is_valid:
+                flag(changed & (frame['image_url'] == url), f'image_url: {message}')
+
+        parsed = {'price_now': price_now, 'price_old': price_old, 'cost_of_goods': cost}
+        return target, parsed, errors
+
+    def _records(self, frame, target, parsed, rows):
+        now = get_nairobi_time()
+        inserts, updates = [], []
+
+        for index in rows:
+            row = frame.loc[index]
+            values = {column: row[column] for column in ('name', 'description', 'stock', 'category', 'image_url') if row[column] != ''}
+            for column, series in parsed.items():
+                if row[column] != '':
+                    values[column] = float(series[index])
+            if row['is_available'] != '':
+                values['is_available'] = row['is_available'].lower() in TRUE_VALUES
+            values['updated_at'] = now
+
+            if pd.isna(target[index]):
+                inserts.append({
+                    'description': '', 'price_old': None, 'stock': None, 'cost_of_goods': 0.0, 'is_available': True,
+                    **values, 'is_combo': False, 'is_active': True, 'created_at': now
+                })
+            else:
+                updates.append({'id': int(target[index]), **values})
+
+        return inserts, updates
+
+    def run(self, stream, filename, dry_run=False, skip_invalid=False):
+        """
+        Validate a sheet and, unless dry_run or it has errors, apply it.
+        skip_invalid=True imports the valid rows even when others fail; dry_run
+        reports the counts the import would produce without writing.
+
+        Returns:
+            dict with created, updated, skipped, errors [{'row', 'errors'}] (first 100),
+            error_count and product_ids (created and updated)
+        """
+        frame = self.read(stream, filename)
+        target, parsed, errors = self._validate(frame)
+
+        valid_rows = [index for index in frame.index if index not in errors]
+        inserts, updates = self._records(frame, target, parsed, valid_rows)
+        result = {
+            'created': len(inserts),
+            'updated': len(updates),
+            'skipped': len(errors),
+            'error_count': len(errors),
+            # Row numbers as shown in a spreadsheet, after the header row
+            'errors': [{'row': index + 2, 'errors': messages} for index, messages in sorted(errors.items())[:100]],
+            'product_ids': []
+        }
+        if errors and not skip_invalid:
+            result['created'] = result['updated'] = 0
+            result['skipped'] = len(frame)
+            return result
+        if dry_run:
+            return result
+
+        for start in range(0, len(updates), self.batch_size):
+            db.session.execute(update(Product), updates[start:start + self.batch_size])
+
+        created_ids = []
+        for start in range(0, len(inserts), self.batch_size):
+            created_ids += db.session.scalars(
+                insert(Product).returning(Product.id, sort_by_parameter_order=True),
+                inserts[start:start + self.batch_size]
+            ).all()
+
+        db.session.commit()
+        result['product_ids'] = created_ids + [row['id'] for row in updates]
+        logger.info(f"Product import from {filename}: {len(inserts)} created, {len(updates)} updated, {len(errors)} skipped")
+        return result
@@ -0,0 +1,219 @@
+import logging
+from datetime import timedelta
+from sqlalchemy import update, delete
+from models import db, Product, Inventory, InventoryReservation, get_nairobi_time
+
+logger = logging.getLogger(__name__)
+
+
+class InventoryService:
+    """
+    Numeric stock for tracked products, kept correct under concurrent checkouts.
+
+    Every change is a single conditional UPDATE per product (e.g. "take 2 if at
+    least 2 are free"), so no row is read and then written back, and an order's
+    products are updated in ID order so concurrent orders lock rows in the same
+    order. Combos draw down the stock of their base products.
+
+    Reservations hold stock for a customer while they are in checkout. Each
+    holder has one set of reservations, replaced on every reserve() and claimed
+    by the order or by the sweeper with DELETE ... RETURNING, so a reservation
+    is released exactly once.
+
+    Methods run on the caller's session; callers commit or roll back.
+    """
+
+    def __init__(self, combo_resolver, reservation_ttl=600):
+        self.combo_resolver = combo_resolver
+        self.reservation_ttl = reservation_ttl
+
+    def _tracked_quantities(self, items):
+        """{base_product_id: quantity} for the tracked products in quote lines, combos expanded"""
+        quantities = {}
+        for item in items:
+            resolved = self.combo_resolver.resolve(item['product_id'])
+            expanded = resolved['expanded'] if resolved else {item['product_id']: 1}
+            for product_id, quantity in expanded.items():
+                quantities[product_id] = quantities.get(product_id, 0) + quantity * item['quantity']
+
+        if not quantities:
+            return {}
+        tracked = db.session.query(Inventory.product_id).filter(Inventory.product_id.in_(list(quantities))).all()
+        return {product_id: quantities[product_id] for (product_id,) in tracked}
+
+    def _shortage_message(self, product_id):
+        row = db.session.query(Product.name, Inventory.on_hand - Inventory.reserved).join(
+            Inventory, Inventory.product_id == Product.id
+        ).filter(Product.id == product_id).first()
+        if not row:
+            return f"Product {product_id} is out of stock"
+        name, free = row
+        return f"Only {max(free, 0)} of {name} left" if free > 0 else f"{name} is out of stock"
+
+    def _claim(self, condition):
+        """Delete matching reservations and return {product_id: quantity} they held"""
+        held = {}
+        for product_id, quantity in db.session.execute(
+            delete(InventoryReservation).where(condition).returning(
+                InventoryReservation.product_id, InventoryReservation.quantity
+            )
+        ):
+            held[product_id] = held.get(product_id, 0) + quantity
+        return held
+
+    def _unreserve(self, held):
+        for product_id in sorted(held):
+            db.session.execute(
+                update(Inventory).where(Inventory.product_id == product_id).values(
+                    reserved=Inventory.reserved - held[product_id]
+                )
+            )
+
+    def reserve(self, holder, items):
+        """
+        Hold stock for quote lines, replacing the holder's previous reservations.
+
+        Returns:
+            (success: bool, message: str, expires_at: datetime or None)
+        """
+        self._unreserve(self._claim(InventoryReservation.holder == holder))
+
+        quantities = self._tracked_quantities(items)
+        expires_at = get_nairobi_time().replace(tzinfo=None) + timedelta(seconds=self.reservation_ttl)
+        for product_id in sorted(quantities):
+            quantity = quantities[product_id]
+            result = db.session.execute(
+                update(Inventory).where(
+                    Inventory.product_id == product_id,
+                    Inventory.on_hand - Inventory.reserved >= quantity
+                ).values(reserved=Inventory.reserved + quantity)
+            )
+            if result.rowcount == 0:
+                return False, self._shortage_message(product_id), None
+            db.session.add(InventoryReservation(holder=holder, product_id=product_id, quantity=quantity, expires_at=expires_at))
+
+        return True, "Reserved", expires_at
+
+    def release(self, holder):
+        """Give back everything the holder has reserved"""
+        self._unreserve(self._claim(InventoryReservation.holder == holder))
+
+    def consume(self, items, holder=None):
+        """
+        Take stock for an order's quote lines, using the holder's reservations first.
+
+        Returns:
+            (success: bool, message: str, depleted_product_ids: list) where depleted
+            products were switched to unavailable because they ran out
+        """
+        held = self._claim(InventoryReservation.holder == holder) if holder else {}
+        quantities = self._tracked_quantities(items)
+
+        depleted = []
+        for product_id in sorted(quantities):
+            quantity = quantities[product_id]
+            own = held.pop(product_id, 0)
+            remaining = db.session.execute(
+                update(Inventory).where(
+                    Inventory.product_id == product_id,
+                    Inventory.on_hand - (Inventory.reserved - own) >= quantity
+                ).values(
+                    on_hand=Inventory.on_hand - quantity,
+                    reserved=Inventory.reserved - own
+                ).returning(Inventory.on_hand)
+            ).scalar_one_or_none()
+            if remaining is None:
+                return False, self._shortage_message(product_id), []
+            if remaining == 0:
+                depleted.append(product_id)
+
+        # Reservations for products no longer in the order
+        self._unreserve(held)
+        return True, "Stock taken", self._set_available(depleted, False)
+
+    def _set_available(self, product_ids, available):
+        """
+        Flip is_available for products that ran out (False) or were restocked after
+        running out (True). Returns the IDs whose availability changed.
+        """
+        if not product_ids:
+            return []
+
+        query = update(Product).where(Product.id.in_(product_ids), Product.is_available == (not available))
+        if available:
+            # Only undo what running out did, never a manual switch-off
+            query = query.where(Product.id.in_(
+                db.session.query(Inventory.product_id).filter(Inventory.auto_disabled == True)
+            ))
+        changed = db.session.execute(query.values(is_available=available).returning(Product.id)).scalars().all()
+
+        if changed:
+            db.session.execute(
+                update(Inventory).where(Inventory.product_id.in_(changed)).values(auto_disabled=not available)
+            )
+        return changed
+
+    def set_stock(self, product_id, on_hand=None, adjust=None):
+        """
+        Start tracking a product or change its count, either to an absolute `on_hand`
+        or by `adjust` (e.g. +24 for a delivery). The count never drops below what
+        checkout reservations hold.
+
+        Returns:
+            (success: bool, message: str, availability_changed: bool)
+        """
+        inventory = db.session.get(Inventory, product_id)
+        if inventory is None:
+            inventory = Inventory(product_id=product_id, on_hand=0, reserved=0, auto_disabled=False)
+            db.session.add(inventory)
+            db.session.flush()
+
+        if on_hand is not None:
+            if on_hand < 0:
+                return False, "Stock cannot go below zero", False
+            new_on_hand = on_hand
+        else:
+            new_on_hand = Inventory.on_hand + adjust
+
+        # Stock held by checkout reservations cannot be counted away
+        result = db.session.execute(
+            update(Inventory).where(
+                Inventory.product_id == product_id, Inventory.reserved <= new_on_hand
+            ).values(on_hand=new_on_hand).returning(Inventory.on_hand)
+        ).scalar_one_or_none()
+        if result is None:
+            reserved = db.session.query(Inventory.reserved).filter(Inventory.product_id == product_id).scalar()
+            if reserved:
+                return False, f"Stock cannot go below the {reserved} held by checkouts in progress", False
+            return False, "Stock cannot go below zero", False
+
+        changed = self._set_available([product_id], result > 0)
+        return True, "Stock updated", bool(changed)
+
+    def untrack(self, product_id):
+        """Stop limiting a product; its reservations are dropped"""
+        self._claim(InventoryReservation.product_id == product_id)
+        db.session.execute(delete(Inventory).where(Inventory.product_id == product_id))
+
+    def levels(self):
+        """[{'product_id', 'name', 'on_hand', 'reserved', 'free', 'is_available'}] for every tracked product"""
+        rows = db.session.query(
+            Inventory.product_id, Product.name, Inventory.on_hand, Inventory.reserved, Product.is_available
+        ).join(Product, Product.id == Inventory.product_id).order_by(Product.name).all()
+        return [{
+            'product_id': product_id,
+            'name': name,
+            'on_hand': on_hand,
+            'reserved': reserved,
+            'free': max(on_hand - reserved, 0),
+            'is_available': is_available
+        } for product_id, name, on_hand, reserved, is_available in rows]
+
+    def sweep(self):
+        """Release reservations past their expiry; commits. Returns how many products got stock back."""
+        held = self._claim(InventoryReservation.expires_at < get_nairobi_time().replace(tzinfo=None))
+        self._unreserve(held)
+        db.session.commit()
+        if held:
+            logger.info(f"Released expired reservations for {len(held)} products")
+        return len(held)
@@ -138,6 +138,129 @@ class Order(db.Model):
     customer = db.relationship('Customer', backref='orders')
     staff = db.relationship('Staff', backref='orders')
 
+    __table_args__ = (
+        db.Index('ix_orders_created_at_id', 'created_at', 'id'),
+        db.Index('ix_orders_status_created_at_id', 'status', 'created_at', 'id'),
+        db.Index('ix_orders_payment_status_created_at_id', 'payment_status', 'created_at', 'id'),
+        db.Index('ix_orders_staff_id_created_at_id', 'staff_id', 'created_at', 'id'),
+        db.Index('ix_orders_is_archived_created_at_id', 'is_archived', 'created_at', 'id'),
+        db.Index('ix_orders_updated_at_id', 'updated_at', 'id'),
+        db.Index('ix_orders_is_archived_delivered_at', 'is_archived', 'delivered_at'),
+        db.Index('ix_orders_customer_id_created_at_id', 'customer_id', 'created_at', 'id'),
+        db.Index('ix_orders_staff_id_delivered_at', 'staff_id', 'delivered_at'),
+    )
+
+class ArchivedOrder(db.Model):
+    """Cold storage for delivered orders moved out of `orders` by the archival job"""
+    __tablename__ = 'orders_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    order_id = db.Column(db.String(50), unique=True, nullable=False)
+    customer_id = db.Column(db.Integer, nullable=True)
+    customer_name = db.Column(db.String(255), nullable=False)
+    customer_phone = db.Column(db.String(20), nullable=False)
+    customer_email = db.Column(db.String(255), nullable=True)
+    items = db.Column(db.JSON, nullable=False)
+    product_total = db.Column(db.Float, nullable=False)
+    delivery_fee = db.Column(db.Float, nullable=False)
+    convenience_fee = db.Column(db.Float, default=0.0)
+    transaction_fee = db.Column(db.Float, default=0.0)
+    total_amount = db.Column(db.Float, nullable=False)
+    payment_method = db.Column(db.String(50), nullable=False)
+    payment_status = db.Column(db.String(50), nullable=True)
+    delivery_address = db.Column(db.Text, nullable=False)
+    delivery_latitude = db.Column(db.Float, nullable=True)
+    delivery_longitude = db.Column(db.Float, nullable=True)
+    location_method = db.Column(db.String(20), nullable=True)
+    staff_id = db.Column(db.Integer, nullable=True)
+    status = db.Column(db.String(50), nullable=True)
+    payhero_reference = db.Column(db.String(255), nullable=True)
+    is_archived = db.Column(db.Boolean, default=True)
+    delivered_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)
+    archived_at = db.Column(db.DateTime, default=get_nairobi_time)
+    
+    staff = db.relationship('Staff', primaryjoin='foreign(ArchivedOrder.staff_id) == Staff.id', viewonly=True)
+
+    __table_args__ = (
+        db.Index('ix_orders_archive_created_at_id', 'created_at', 'id'),
+        db.Index('ix_orders_archive_payment_status_created_at_id', 'payment_status', 'created_at', 'id'),
+        db.Index('ix_orders_archive_staff_id_created_at_id', 'staff_id', 'created_at', 'id'),
+        db.Index('ix_orders_archive_customer_id_created_at_id', 'customer_id', 'created_at', 'id'),
+        db.Index('ix_orders_archive_staff_id_delivered_at', 'staff_id', 'delivered_at'),
+    )
+
+class OrderItem(db.Model):
+    """
+    One product line of an order, normalized from Order.items for sales reporting.
+    order_pk has no foreign key because the order row may move to orders_archive.
+    """
+    __tablename__ = 'order_items'
+    id = db.Column(db.Integer, primary_key=True)
+    order_pk = db.Column(db.Integer, nullable=False)
+    order_id = db.Column(db.String(50), nullable=False)
+    product_id = db.Column(db.Integer, nullable=True)
+    product_name = db.Column(db.String(255), nullable=False)
+    category = db.Column(db.String(100), nullable=True)
+    unit_price = db.Column(db.Float, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    line_total = db.Column(db.Float, nullable=False)
+    is_paid = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_order_items_order_pk', 'order_pk'),
+        db.Index('ix_order_items_is_paid_created_at_product_id', 'is_paid', 'created_at', 'product_id'),
+        db.Index('ix_order_items_is_paid_category_created_at', 'is_paid', 'category', 'created_at'),
+    )
+
+class Inventory(db.Model):
+    """
+    Stock count for a product whose inventory is tracked; products without a row are not limited.
+    reserved is the part of on_hand held by checkout reservations.
+    """
+    __tablename__ = 'inventory'
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    on_hand = db.Column(db.Integer, nullable=False, default=0)
+    reserved = db.Column(db.Integer, nullable=False, default=0)
+    # Set when running out made the product unavailable, so restocking can make it available again
+    auto_disabled = db.Column(db.Boolean, nullable=False, default=False)
+    updated_at = db.Column(db.DateTime, default=get_nairobi_time, onupdate=get_nairobi_time)
+
+    __table_args__ = (
+        db.CheckConstraint('on_hand >= 0', name='ck_inventory_on_hand_non_negative'),
+        db.CheckConstraint('reserved >= 0', name='ck_inventory_reserved_non_negative'),
+        db.CheckConstraint('reserved <= on_hand', name='ck_inventory_reserved_within_on_hand'),
+    )
+
+class InventoryReservation(db.Model):
+    __tablename__ = 'inventory_reservations'
+    id = db.Column(db.Integer, primary_key=True)
+    holder = db.Column(db.String(64), nullable=False)
+    product_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_inventory_reservations_holder', 'holder'),
+        db.Index('ix_inventory_reservations_expires_at', 'expires_at'),
+    )
+
+class ImageCheck(db.Model):
+    """Result of the latest background check of an active product's image URL"""
+    __tablename__ = 'image_checks'
+    product_id = db.Column(db.Integer, primary_key=True)
+    image_url = db.Column(db.String(500), nullable=False)
+    is_broken = db.Column(db.Boolean, nullable=False, default=False)
+    message = db.Column(db.String(500), nullable=True)
+    broken_since = db.Column(db.DateTime, nullable=True)
+    checked_at = db.Column(db.DateTime, nullable=False, default=get_nairobi_time)
+
+class OrderIdSequence(db.Model):
+    __tablename__ = 'order_id_sequences'
+    day = db.Column(db.Date, primary_key=True)
+    next_value = db.Column(db.Integer, nullable=False, default=0)
+
 class CapitalLedger(db.Model):
     __tablename__ = 'capital_ledger'
     id = db.Column(db.Integer, primary_key=True)
@@ -147,6 +270,24 @@ class CapitalLedger(db.Model):
     created_at = db.Column(db.DateTime, default=get_nairobi_time)
     updated_at = db.Column(db.DateTime, default=get_nairobi_time, onupdate=get_nairobi_time)
 
+class DailySalesRollup(db.Model):
+    """Completed-payment totals per order day, staff member (0 = unassigned) and payment method"""
+    __tablename__ = 'daily_sales_rollups'
+    day = db.Column(db.Date, primary_key=True)
+    staff_id = db.Column(db.Integer, primary_key=True, default=0)
+    payment_method = db.Column(db.String(50), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    product_sales = db.Column(db.Float, nullable=False, default=0.0)
+    delivery_fees = db.Column(db.Float, nullable=False, default=0.0)
+    total_revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+class DailyCapitalRollup(db.Model):
+    """Capital ledger totals per entry day"""
+    __tablename__ = 'daily_capital_rollups'
+    day = db.Column(db.Date, primary_key=True)
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0.0)
+
 class TermsAndConditions(db.Model):
     __tablename__ = 'terms_and_conditions'
     id = db.Column(db.Integer, primary_key=True)
@@ -207,3 +348,7 @@ class Cart(db.Model):
     
     customer = db.relationship('Customer', backref='cart_items')
     product = db.relationship('Product', backref='cart_items')
+
+    __table_args__ = (
+        db.Index('ix_carts_customer_id_product_id', 'customer_id', 'product_id', unique=True),
+    )
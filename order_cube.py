@@ -0,0 +1,229 @@
+import time
+import threading
+import logging
+from datetime import datetime, timedelta
+import numpy as np
+import pytz
+from models import db, Order, ArchivedOrder
+
+logger = logging.getLogger(__name__)
+
+NAIROBI = pytz.timezone('Africa/Nairobi')
+EPOCH = datetime(1970, 1, 1)
+
+# Bucket widths in seconds; weeks start on Monday (the epoch was a Thursday)
+BUCKETS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+WEEK_OFFSET = 3 * 86400
+DEFAULT_SPANS = {'hour': timedelta(hours=48), 'day': timedelta(days=30), 'week': timedelta(weeks=12)}
+MAX_BUCKETS = 2000
+
+BREAKDOWNS = ('status', 'payment_status', 'payment_method', 'staff_id')
+PERCENTILE_FIELDS = ('total_amount', 'product_total', 'delivery_fee')
+
+
+def _local_seconds(value):
+    """Seconds since the epoch of a Nairobi wall-clock time, so buckets fall on local days"""
+    if value.tzinfo is not None:
+        value = value.astimezone(NAIROBI).replace(tzinfo=None)
+    return int((value - EPOCH).total_seconds())
+
+
+def _from_local_seconds(seconds):
+    return EPOCH + timedelta(seconds=int(seconds))
+
+
+class OrderCube:
+    """
+    Columnar, in-memory copy of every order (active and archived) for dashboard charts.
+
+    Each order field the charts need is a NumPy column, with strings dictionary-encoded
+    into small integer codes. Time series, breakdowns and percentiles are then
+    vectorized masks and bincounts instead of SQL queries or raw orders shipped to
+    the browser. Columns are loaded once, kept current by upsert() on order events,
+    and reloaded after max_age to pick up changes made by other workers.
+    """
+
+    def __init__(self, max_age=900):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._reset(0)
+
+    def _reset(self, capacity):
+        self._size = 0
+        self._rows = {}
+        self._codes = {field: {} for field in ('status', 'payment_status', 'payment_method')}
+        self._labels = {field: [] for field in self._codes}
+        self._created = np.zeros(capacity, dtype=np.int64)
+        self._total = np.zeros(capacity, dtype=np.float64)
+        self._products = np.zeros(capacity, dtype=np.float64)
+        self._delivery = np.zeros(capacity, dtype=np.float64)
+        self._staff = np.zeros(capacity, dtype=np.int32)
+        self._status = np.zeros(capacity, dtype=np.int16)
+        self._payment_status = np.zeros(capacity, dtype=np.int16)
+        self._payment_method = np.zeros(capacity, dtype=np.int16)
+
+    def _code(self, field, value):
+        value = value or 'Unknown'
+        codes = self._codes[field]
+        if value not in codes:
+            codes[value] = len(codes)
+            self._labels[field].append(value)
+        return codes[value]
+
+    def _grow(self, needed):
+        capacity = len(self._created)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        for name in ('_created', '_total', '_products', '_delivery', '_staff', '_status', '_payment_status', '_payment_method'):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            setattr(self, name, grown)
+
+    def _write(self, row, order_pk, created_at, total, products, delivery, staff_id, status, payment_status, payment_method):
+        self._rows[order_pk] = row
+        self._created[row] = _local_seconds(created_at)
+        self._total[row] = total or 0.0
+        self._products[row] = products or 0.0
+        self._delivery[row] = delivery or 0.0
+        self._staff[row] = staff_id or 0
+        self._status[row] = self._code('status', status)
+        self._payment_status[row] = self._code('payment_status', payment_status)
+        self._payment_method[row] = self._code('payment_method', payment_method)
+
+    def load(self):
+        """(Re)build every column from orders and orders_archive with plain column queries"""
+        started = time.monotonic()
+        rows = []
+        for model in (Order, ArchivedOrder):
+            rows.extend(db.session.query(
+                model.id, model.created_at, model.total_amount, model.product_total, model.delivery_fee,
+                model.staff_id, model.status, model.payment_status, model.payment_method
+            ).all())
+
+        with self._lock:
+            self._reset(max(len(rows), 1024))
+            for row in rows:
+                self._write(self._size, *row)
+                self._size += 1
+            self._loaded_at = time.monotonic()
+
+        logger.info(f"Order cube loaded {len(rows)} orders in {(time.monotonic() - started) * 1000:.1f} ms")
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age:
+            self.load()
+
+    def upsert(self, order):
+        """Apply a new or changed order; a no-op until the cube has been loaded"""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            row = self._rows.get(order.id)
+            if row is None:
+                row = self._size
+                self._grow(row + 1)
+                self._size += 1
+            self._write(
+                row, order.id, order.created_at, order.total_amount, order.product_total, order.delivery_fee,
+                order.staff_id, order.status, order.payment_status, order.payment_method
+            )
+
+    def _mask(self, start, end):
+        created = self._created[:self._size]
+        return (created >= start) & (created < end)
+
+    def _paid(self):
+        code = self._codes['payment_status'].get('Payment Complete', -1)
+        return self._payment_status[:self._size] == code
+
+    def series(self, bucket='day', date_from=None, date_to=None):
+        """
+        Orders, paid orders and paid revenue per hour, day or week between two
+        Nairobi wall-clock datetimes (the last `DEFAULT_SPANS[bucket]` by default).
+
+        Returns:
+            dict with bucket, labels (ISO bucket starts) and parallel orders/paid_orders/revenue lists
+        """
+        if bucket not in BUCKETS:
+            raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+        width = BUCKETS[bucket]
+        offset = WEEK_OFFSET if bucket == 'week' else 0
+
+        end = _local_seconds(date_to) if date_to else _local_seconds(datetime.now(NAIROBI))
+        start = _local_seconds(date_from) if date_from else end - int(DEFAULT_SPANS[bucket].total_seconds())
+        first = (start + offset) // width
+        count = (end + offset) // width - first + 1
+        if count <= 0:
+            return {'bucket': bucket, 'labels': [], 'orders': [], 'paid_orders': [], 'revenue': []}
+        if count > MAX_BUCKETS:
+            raise ValueError(f"Range spans more than {MAX_BUCKETS} {bucket} buckets")
+
+        self._ensure_loaded()
+        with self._lock:
+            mask = self._mask(first * width - offset, (first + count) * width - offset)
+            index = (self._created[:self._size][mask] + offset) // width - first
+            paid = self._paid()[mask]
+            orders = np.bincount(index, minlength=count)
+            paid_orders = np.bincount(index, weights=paid, minlength=count)
+            revenue = np.bincount(index, weights=np.where(paid, self._total[:self._size][mask], 0.0), minlength=count)
+
+        return {
+            'bucket': bucket,
+            'labels': [_from_local_seconds((first + i) * width - offset).isoformat() for i in range(count)],
+            'orders': orders.tolist(),
+            'paid_orders': paid_orders.astype(int).tolist(),
+            'revenue': np.round(revenue, 2).tolist()
+        }
+
+    def breakdown(self, by, date_from=None, date_to=None):
+        """
+        Order count and paid revenue per status, payment status, payment method or staff ID.
+
+        Returns:
+            list of {'key', 'orders', 'revenue'}, largest first
+        """
+        if by not in BREAKDOWNS:
+            raise ValueError(f"by must be one of {', '.join(BREAKDOWNS)}")
+
+        self._ensure_loaded()
+        with self._lock:
+            mask = self._window(date_from, date_to)
+            values = (self._staff if by == 'staff_id' else getattr(self, f'_{by}'))[:self._size][mask]
+            revenue = np.where(self._paid()[mask], self._total[:self._size][mask], 0.0)
+            keys, inverse = np.unique(values, return_inverse=True)
+            orders = np.bincount(inverse, minlength=len(keys))
+            totals = np.bincount(inverse, weights=revenue, minlength=len(keys))
+            labels = None if by == 'staff_id' else list(self._labels[by])
+
+        result = [{
+            'key': (int(key) or None) if labels is None else labels[key],
+            'orders': int(orders[i]),
+            'revenue': round(float(totals[i]), 2)
+        } for i, key in enumerate(keys)]
+        result.sort(key=lambda entry: entry['orders'], reverse=True)
+        return result
+
+    def percentiles(self, field='total_amount', quantiles=(50, 90, 99), date_from=None, date_to=None, paid_only=True):
+        """Percentiles of an order amount column, e.g. {'p50': ..., 'p90': ...}; None when there are no orders"""
+        if field not in PERCENTILE_FIELDS:
+            raise ValueError(f"field must be one of {', '.join(PERCENTILE_FIELDS)}")
+        column = {'total_amount': '_total', 'product_total': '_products', 'delivery_fee': '_delivery'}[field]
+
+        self._ensure_loaded()
+        with self._lock:
+            mask = self._window(date_from, date_to)
+            if paid_only:
+                mask &= self._paid()
+            values = getattr(self, column)[:self._size][mask]
+
+        if not len(values):
+            return {f'p{q}': None for q in quantiles}
+        return {f'p{q}': round(float(v), 2) for q, v in zip(quantiles, np.percentile(values, quantiles))}
+
+    def _window(self, date_from, date_to):
+        start = _local_seconds(date_from) if date_from else np.iinfo(np.int64).min
+        end = _local_seconds(date_to) + 1 if date_to else np.iinfo(np.int64).max
+        return self._mask(start, end)
@@ -0,0 +1,70 @@
+import threading
+import logging
+from collections import deque
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, Order, OrderIdSequence, get_nairobi_time
+from utils import format_order_id
+
+logger = logging.getLogger(__name__)
+
+
+class OrderIdService:
+    """
+    Allocates order IDs from a per-day counter in the database.
+
+    Each process reserves a block of sequence numbers with one upsert and hands
+    them out from memory, so IDs are unique across workers without checking the
+    orders table per order. Suffixes are a keyed permutation of the sequence
+    (see format_order_id), so the secret must be the same on every worker.
+    """
+
+    def __init__(self, secret, block_size=50):
+        self.secret = secret
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._day = None
+        self._pending = deque()
+
+    def _reserve_block(self, day):
+        """
+        Reserve the next block of the day's sequence in its own transaction, so a
+        rolled-back order cannot return numbers another worker may already hold.
+
+        IDs already on an order (random IDs issued before sequences were used, or
+        under a previous secret) are dropped from the block, with one query per block.
+
+        Returns:
+            list of free order IDs, in sequence order
+        """
+        table = OrderIdSequence.__table__
+        insert = postgresql_insert if db.engine.dialect.name == 'postgresql' else sqlite_insert
+
+        stmt = insert(table).values(day=day, next_value=self.block_size)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.day],
+            set_={'next_value': table.c.next_value + self.block_size}
+        ).returning(table.c.next_value)
+
+        with db.engine.begin() as conn:
+            end = conn.execute(stmt).scalar_one()
+            order_ids = [format_order_id(day, sequence, self.secret) for sequence in range(end - self.block_size, end)]
+            taken = set(conn.execute(select(Order.order_id).where(Order.order_id.in_(order_ids))).scalars())
+
+        if taken:
+            logger.warning(f"Skipped {len(taken)} order IDs already in use for {day}")
+        logger.debug(f"Reserved order sequence block {end - self.block_size}-{end - 1} for {day}")
+        return [order_id for order_id in order_ids if order_id not in taken]
+
+    def next_order_id(self):
+        """Return a new unique order ID in the {YYYY}{monthCode}{DD}{suffix} format"""
+        day = get_nairobi_time().date()
+
+        with self._lock:
+            if day != self._day:
+                self._pending.clear()
+                self._day = day
+            while not self._pending:
+                self._pending.extend(self._reserve_block(day))
+            return self._pending.popleft()
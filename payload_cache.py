@@ -0,0 +1,118 @@
+import copy
+import json
+import gzip
+import time
+import hashlib
+import threading
+import logging
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+# Built on the request that finds the cache stale, so the levels favour speed:
+# a few ms for a ~100 KB catalog, within a few percent of the maximum ratio
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class CachedPayload:
+    """
+    A serialized JSON response body, its strong ETag and pre-compressed variants.
+    Each encoding gets its own ETag, since the bytes differ.
+    """
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.encoded = {}
+
+        compressed = {'gzip': gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)}
+        if brotli is not None:
+            compressed['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+        for encoding, data in compressed.items():
+            if len(data) < len(body):
+                self.encoded[encoding] = data
+
+    def with_version(self, version):
+        """The same bytes and ETags under another version, without compressing again"""
+        payload = copy.copy(self)
+        payload.version = version
+        return payload
+
+    def variant(self, accept_encodings):
+        """
+        Pick the smallest representation the client accepts.
+
+        Args:
+            accept_encodings: werkzeug Accept object from request.accept_encodings
+
+        Returns:
+            (body: bytes, etag: str, content_encoding: str or None)
+        """
+        best = None
+        for encoding, data in self.encoded.items():
+            if accept_encodings[encoding] > 0 and (best is None or len(data) < len(self.encoded[best])):
+                best = encoding
+        if best is None:
+            return self.body, self.etag, None
+        return self.encoded[best], f"{self.etag}-{best}", best
+
+
+class PayloadCache:
+    """
+    Holds one JSON response, serialized and compressed once per version.
+
+    Writers call invalidate() to bump the version; the next get() rebuilds the
+    body from its loader, recompressing only if the bytes actually changed.
+    A max_age bounds staleness when several workers each hold a copy. The ETag
+    is a hash of the body, so every worker hands out the same ETag for the
+    same content.
+
+    Cached payloads are never modified once built, since requests may still be
+    sending one while it is replaced.
+
+    The lock only guards the cached reference: loading and compressing run
+    outside it, so readers of a fresh payload never wait behind a rebuild.
+    """
+
+    def __init__(self, name, max_age=60):
+        self.name = name
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._version = 0
+        self._payload = None
+        self._loaded_at = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+
+    def get(self, loader):
+        """Current payload, calling loader() for the data if the cached copy is stale"""
+        with self._lock:
+            payload = self._payload
+            if payload and payload.version == self._version and time.monotonic() - self._loaded_at < self.max_age:
+                return payload
+            version = self._version
+
+        body = json.dumps(loader(), separators=(',', ':')).encode()
+        if payload and payload.body == body:
+            rebuilt = payload.with_version(version)
+        else:
+            rebuilt = CachedPayload(version, body)
+
+        with self._lock:
+            # A concurrent rebuild of a newer version wins; this one is still correct for its caller
+            current = self._payload
+            if current is None or current.version <= version:
+                self._payload = rebuilt
+                self._loaded_at = time.monotonic()
+
+        logger.debug(f"{self.name} payload rebuilt: version {version}, {len(body)} bytes")
+        return rebuilt
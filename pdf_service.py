@@ -49,10 +49,11 @@ class PDFService:
         doc.build(story)
         return filepath
     
-    def generate_business_report(self, data):
+    def generate_business_report(self, data, filename=None):
         """Generate comprehensive business report PDF"""
-        timestamp = get_nairobi_time().strftime('%Y%m%d_%H%M%S')
-        filename = f"business_report_{timestamp}.pdf"
+        if not filename:
+            timestamp = get_nairobi_time().strftime('%Y%m%d_%H%M%S')
+            filename = f"business_report_{timestamp}.pdf"
         filepath = os.path.join(self.storage_bucket, filename)
         
         doc = SimpleDocTemplate(filepath, pagesize=A4)
@@ -0,0 +1,141 @@
+import time
+import threading
+import logging
+from models import Product, SystemSettings
+
+logger = logging.getLogger(__name__)
+
+
+class PricingService:
+    """
+    Computes authoritative checkout quotes from an in-memory price table.
+
+    The table (active products plus the fee settings) is loaded with two queries
+    and reused until invalidate() bumps the version after a product or settings
+    write. A max_age bounds staleness when several workers each hold a copy.
+    """
+
+    def __init__(self, combo_resolver, max_age=300):
+        self.combo_resolver = combo_resolver
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._version = 0
+        self._loaded_version = -1
+        self._loaded_at = 0
+        self._products = {}
+        self._settings = {}
+
+    def invalidate(self):
+        """Mark the cached price table stale; the next quote reloads it"""
+        with self._lock:
+            self._version += 1
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._loaded_version == self._version and time.monotonic() - self._loaded_at < self.max_age:
+                return
+            version = self._version
+
+        products = {}
+        for p in Product.query.filter_by(is_active=True).all():
+            products[p.id] = {
+                'id': p.id,
+                'name': p.name,
+                'category': p.category,
+                'price': p.price_now,
+                'is_available': p.is_available,
+                'is_combo': p.is_combo
+            }
+
+        settings = SystemSettings.query.first()
+        fee_settings = {
+            'min_delivery_fee': settings.min_delivery_fee or 0.0,
+            'delivery_per_km_rate': settings.delivery_per_km_rate or 0.0,
+            'convenience_fee': settings.convenience_fee or 0.0,
+            'transaction_fee_percentage': settings.transaction_fee_percentage or 0.0,
+            'allow_pay_on_delivery': settings.allow_pay_on_delivery
+        }
+
+        with self._lock:
+            self._products = products
+            self._settings = fee_settings
+            self._loaded_version = version
+            self._loaded_at = time.monotonic()
+
+        logger.debug(f"Price table loaded: {len(products)} products, version {version}")
+
+    def get_settings(self):
+        self._ensure_loaded()
+        return self._settings
+
+    def _is_available(self, product):
+        if product['is_combo']:
+            return self.combo_resolver.is_available(product['id'])
+        return product['is_available']
+
+    def quote(self, items, delivery_fee=None):
+        """
+        Price a cart.
+
+        Args:
+            items: list of {'product_id': id, 'quantity': n}
+            delivery_fee: fee computed by the caller (e.g. from distance); defaults to the minimum fee
+
+        Returns:
+            (success: bool, quote: dict, message: str)
+        """
+        self._ensure_loaded()
+        products = self._products
+        settings = self._settings
+
+        if not items:
+            return False, {}, "Cart is empty"
+
+        quantities = {}
+        for item in items:
+            try:
+                product_id = int(item['product_id'])
+                quantity = int(item.get('quantity', 1))
+            except (KeyError, TypeError, ValueError):
+                return False, {}, "Each item needs a product_id and quantity"
+            if quantity <= 0:
+                return False, {}, f"Invalid quantity for product {product_id}"
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+        lines = []
+        product_total = 0.0
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if not product:
+                return False, {}, f"Product {product_id} is not on the menu"
+            if not self._is_available(product):
+                return False, {}, f"{product['name']} is currently unavailable"
+
+            line_total = round(product['price'] * quantity, 2)
+            product_total += line_total
+            lines.append({
+                'product_id': product_id,
+                'name': product['name'],
+                'category': product['category'],
+                'price': product['price'],
+                'quantity': quantity,
+                'line_total': line_total
+            })
+
+        product_total = round(product_total, 2)
+        if delivery_fee is None:
+            delivery_fee = settings['min_delivery_fee']
+        delivery_fee = round(delivery_fee, 2)
+        convenience_fee = round(settings['convenience_fee'], 2)
+        transaction_fee = round(
+            (product_total + delivery_fee + convenience_fee) * settings['transaction_fee_percentage'] / 100, 2
+        )
+
+        return True, {
+            'items': lines,
+            'product_total': product_total,
+            'delivery_fee': delivery_fee,
+            'convenience_fee': convenience_fee,
+            'transaction_fee': transaction_fee,
+            'total_amount': round(product_total + delivery_fee + convenience_fee + transaction_fee, 2)
+        }, "Quote computed"
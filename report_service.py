@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from report_worker import render_business_report
+
+logger = logging.getLogger(__name__)
+
+
+class ReportService:
+    """
+    Renders business report PDFs in a separate process and caches them on disk.
+
+    A report's ID is a hash of the data it is built from, so asking again for a
+    period whose figures have not changed returns the cached file, and any new
+    order or capital entry in the period produces a new report. A failed render
+    is reported as 'failed' for failed_ttl seconds, then forgotten.
+    """
+
+    def __init__(self, storage_dir, max_workers=1, max_reports=50, failed_ttl=600):
+        self.storage_dir = os.path.abspath(storage_dir)
+        self.max_workers = max_workers
+        self.max_reports = max_reports
+        self.failed_ttl = failed_ttl
+        self._lock = threading.Lock()
+        self._executor = None
+        self._jobs = {}
+        self._failed = {}
+        os.makedirs(self.storage_dir, exist_ok=True)
+
+    def _pool(self):
+        # Spawned rather than forked, so workers do not inherit the eventlet-patched server process.
+        # Spawning re-imports the main script as __mp_main__, which app.py checks before any startup work.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    @staticmethod
+    def report_id(data):
+        payload = json.dumps(data, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+    def path(self, report_id):
+        return os.path.join(self.storage_dir, f"business_report_{report_id}.pdf")
+
+    def request(self, data):
+        """
+        Return a cached report for this data or start rendering it.
+
+        Returns:
+            (report_id: str, status: 'ready' | 'pending')
+        """
+        report_id = self.report_id(data)
+        if os.path.exists(self.path(report_id)):
+            return report_id, 'ready'
+
+        with self._lock:
+            self._collect()
+            if report_id not in self._jobs:
+                # Asking again retries a failed report
+                self._failed.pop(report_id, None)
+                self._prune()
+                self._jobs[report_id] = self._pool().submit(
+                    render_business_report, self.storage_dir, data, os.path.basename(self.path(report_id))
+                )
+                logger.info(f"Queued business report {report_id} for {data.get('period')}")
+
+        return report_id, 'pending'
+
+    def status(self, report_id):
+        """'ready', 'pending', 'failed' or None for an unknown report"""
+        if os.path.exists(self.path(report_id)):
+            return 'ready'
+
+        with self._lock:
+            self._collect()
+            if report_id in self._jobs:
+                return 'pending'
+            if report_id in self._failed:
+                return 'failed'
+
+        # The job may have finished between the file check and collecting it
+        return 'ready' if os.path.exists(self.path(report_id)) else None
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _collect(self):
+        """Drop finished job handles, remembering failures until failed_ttl passes; call with the lock held"""
+        now = time.monotonic()
+        for report_id, job in list(self._jobs.items()):
+            if not job.done():
+                continue
+            del self._jobs[report_id]
+            if job.exception() is not None:
+                logger.error(f"Business report {report_id} failed: {job.exception()}")
+                self._failed[report_id] = now + self.failed_ttl
+                self._remove(f"{self.path(report_id)}.part")
+
+        for report_id in [k for k, expires_at in self._failed.items() if expires_at <= now]:
+            del self._failed[report_id]
+
+    def _prune(self):
+        """Remove partial files no running job is writing and the oldest cached reports beyond max_reports"""
+        writing = {f"{os.path.basename(self.path(report_id))}.part" for report_id in self._jobs}
+        names = os.listdir(self.storage_dir)
+        for name in names:
+            if name.endswith('.part') and name not in writing:
+                self._remove(os.path.join(self.storage_dir, name))
+
+        reports = sorted(
+            (os.path.join(self.storage_dir, name) for name in names if name.endswith('.pdf')),
+            key=os.path.getmtime
+        )
+        for stale in reports[:max(len(reports) - self.max_reports + 1, 0)]:
+            self._remove(stale)
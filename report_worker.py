@@ -0,0 +1,22 @@
+import os
+from pdf_service import PDFService
+
+
+def render_business_report(storage_bucket, data, filename):
+    """
+    Process-pool entry point: build a business report and move it into place
+    only once complete, so a half-written file is never served.
+
+    Kept apart from app.py so a worker imports only the PDF code it needs.
+    """
+    service = PDFService(storage_bucket)
+    partial = os.path.join(storage_bucket, f"{filename}.part")
+    try:
+        service.generate_business_report(data, os.path.basename(partial))
+        filepath = os.path.join(storage_bucket, filename)
+        os.replace(partial, filepath)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return filepath
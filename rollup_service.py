@@ -0,0 +1,152 @@
+import logging
+from datetime import date
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, Order, ArchivedOrder, CapitalLedger, DailySalesRollup, DailyCapitalRollup
+
+logger = logging.getLogger(__name__)
+
+
+def _as_date(value):
+    """Normalise a DATE() result, which SQLite returns as a string"""
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+
+class RollupService:
+    """
+    Keeps the daily sales and capital rollup tables in step with completed
+    payments and capital ledger entries.
+
+    Increments run on the caller's session, so they commit or roll back together
+    with the change that caused them.
+    """
+
+    def _increment(self, model, keys, values):
+        table = model.__table__
+        insert = postgresql_insert if db.engine.dialect.name == 'postgresql' else sqlite_insert
+
+        stmt = insert(table).values(**keys, **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c[k] for k in keys],
+            set_={k: table.c[k] + stmt.excluded[k] for k in values}
+        )
+        db.session.execute(stmt)
+
+    def record_payment(self, order, sign=1, staff_id=None):
+        """
+        Add a newly completed order to its day's totals (sign=-1 takes it back out).
+
+        Rows are keyed by the order's current staff and payment method, the same
+        values rebuild() reads, so `staff_id` is only passed to address the bucket
+        of a rider the order no longer has.
+        """
+        self._increment(DailySalesRollup, {
+            'day': order.created_at.date(),
+            'staff_id': (order.staff_id if staff_id is None else staff_id) or 0,
+            'payment_method': order.payment_method or 'Unknown'
+        }, {
+            'order_count': sign,
+            'product_sales': sign * (order.product_total or 0.0),
+            'delivery_fees': sign * (order.delivery_fee or 0.0),
+            'total_revenue': sign * (order.total_amount or 0.0)
+        })
+
+    def move_staff(self, order, previous_staff_id):
+        """Move a completed order's totals to its new rider after a claim or unclaim"""
+        if order.payment_status != 'Payment Complete' or (previous_staff_id or 0) == (order.staff_id or 0):
+            return
+        self.record_payment(order, sign=-1, staff_id=previous_staff_id or 0)
+        self.record_payment(order)
+
+    def record_capital(self, entry, amount_delta, count_delta=0):
+        """Apply a change in a capital entry's amount to its day's total"""
+        self._increment(DailyCapitalRollup, {
+            'day': entry.created_at.date()
+        }, {
+            'entry_count': count_delta,
+            'amount': amount_delta
+        })
+
+    def totals(self, day_from=None, day_to=None):
+        """
+        Sum the rollups, optionally between two dates inclusive.
+
+        Returns:
+            dict with product_sales, delivery_fees, total_revenue, total_orders, total_capital
+        """
+        sales = db.session.query(
+            func.coalesce(func.sum(DailySalesRollup.product_sales), 0),
+            func.coalesce(func.sum(DailySalesRollup.delivery_fees), 0),
+            func.coalesce(func.sum(DailySalesRollup.total_revenue), 0),
+            func.coalesce(func.sum(DailySalesRollup.order_count), 0)
+        )
+        capital = db.session.query(func.coalesce(func.sum(DailyCapitalRollup.amount), 0))
+
+        if day_from:
+            sales = sales.filter(DailySalesRollup.day >= day_from)
+            capital = capital.filter(DailyCapitalRollup.day >= day_from)
+        if day_to:
+            sales = sales.filter(DailySalesRollup.day <= day_to)
+            capital = capital.filter(DailyCapitalRollup.day <= day_to)
+
+        product_sales, delivery_fees, total_revenue, total_orders = sales.one()
+        return {
+            'product_sales': float(product_sales),
+            'delivery_fees': float(delivery_fees),
+            'total_revenue': float(total_revenue),
+            'total_orders': int(total_orders),
+            'total_capital': float(capital.scalar())
+        }
+
+    def rebuild(self):
+        """
+        Recompute every rollup from the orders, archived orders and capital ledger.
+
+        Returns:
+            (sales_rows: int, capital_rows: int)
+        """
+        sales = {}
+        for model in (Order, ArchivedOrder):
+            day = func.date(model.created_at)
+            staff_id = func.coalesce(model.staff_id, 0)
+            method = func.coalesce(model.payment_method, 'Unknown')
+            rows = db.session.query(
+                day, staff_id, method,
+                func.count(model.id),
+                func.coalesce(func.sum(model.product_total), 0),
+                func.coalesce(func.sum(model.delivery_fee), 0),
+                func.coalesce(func.sum(model.total_amount), 0)
+            ).filter(model.payment_status == 'Payment Complete').group_by(day, staff_id, method)
+
+            for row_day, row_staff, row_method, count, products, delivery, revenue in rows:
+                key = (_as_date(row_day), row_staff, row_method)
+                totals = sales.setdefault(key, [0, 0.0, 0.0, 0.0])
+                totals[0] += count
+                totals[1] += products
+                totals[2] += delivery
+                totals[3] += revenue
+
+        day = func.date(CapitalLedger.created_at)
+        capital = db.session.query(
+            day, func.count(CapitalLedger.id), func.coalesce(func.sum(CapitalLedger.amount), 0)
+        ).group_by(day).all()
+
+        try:
+            DailySalesRollup.query.delete()
+            DailyCapitalRollup.query.delete()
+            db.session.add_all(DailySalesRollup(
+                day=row_day, staff_id=row_staff, payment_method=row_method,
+                order_count=count, product_sales=products,
+                delivery_fees=delivery, total_revenue=revenue
+            ) for (row_day, row_staff, row_method), (count, products, delivery, revenue) in sales.items())
+            db.session.add_all(DailyCapitalRollup(
+                day=_as_date(row_day), entry_count=count, amount=amount
+            ) for row_day, count, amount in capital)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        logger.info(f"Rebuilt rollups: {len(sales)} sales rows, {len(capital)} capital rows")
+        return len(sales), len(capital)
@@ -0,0 +1,146 @@
+import logging
+from sqlalchemy import func
+from models import db, Order, ArchivedOrder, OrderItem, Product
+
+logger = logging.getLogger(__name__)
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class SalesService:
+    """
+    Maintains the normalized order_items table and answers product sales
+    questions from it with indexed GROUP BY queries instead of reading every
+    order's items JSON.
+    """
+
+    def __init__(self, backfill_batch_size=500):
+        self.backfill_batch_size = backfill_batch_size
+
+    def build_items(self, order, categories=None):
+        """
+        OrderItem rows for an order's items JSON. Checkout lines carry their category;
+        older lines fall back to `categories` ({product_id: category}).
+        """
+        rows = []
+        for item in order.items or []:
+            product_id = _to_int(item.get('product_id') or item.get('id'))
+            quantity = _to_int(item.get('quantity')) or 0
+            unit_price = float(item.get('price') or 0.0)
+            category = item.get('category')
+            if category is None and categories:
+                category = categories.get(product_id)
+
+            rows.append(OrderItem(
+                order_pk=order.id,
+                order_id=order.order_id,
+                product_id=product_id,
+                product_name=item.get('name') or 'Unknown',
+                category=category,
+                unit_price=unit_price,
+                quantity=quantity,
+                line_total=float(item.get('line_total') or unit_price * quantity),
+                is_paid=order.payment_status == 'Payment Complete',
+                created_at=order.created_at
+            ))
+        return rows
+
+    def set_paid(self, order_pk, paid):
+        """Keep the denormalized paid flag in step with the order; runs on the caller's session"""
+        OrderItem.query.filter(OrderItem.order_pk == order_pk).update(
+            {OrderItem.is_paid: paid}, synchronize_session=False
+        )
+
+    def backfill(self):
+        """
+        Write order_items for every active or archived order that has none yet.
+
+        Returns:
+            Number of orders backfilled
+        """
+        categories = dict(db.session.query(Product.id, Product.category).all())
+        done = {pk for (pk,) in db.session.query(OrderItem.order_pk).distinct()}
+        filled = 0
+
+        for model in (Order, ArchivedOrder):
+            pending = []
+            for order in model.query.order_by(model.id).yield_per(self.backfill_batch_size):
+                if order.id in done:
+                    continue
+                pending.extend(self.build_items(order, categories))
+                filled += 1
+                if len(pending) >= self.backfill_batch_size:
+                    db.session.bulk_save_objects(pending)
+                    pending = []
+            if pending:
+                db.session.bulk_save_objects(pending)
+            db.session.commit()
+
+        logger.info(f"Backfilled order items for {filled} orders")
+        return filled
+
+    def _paid_items(self, query, date_from=None, date_to=None, category=None):
+        query = query.filter(OrderItem.is_paid == True)
+        if date_from:
+            query = query.filter(OrderItem.created_at >= date_from)
+        if date_to:
+            query = query.filter(OrderItem.created_at <= date_to)
+        if category:
+            query = query.filter(OrderItem.category == category)
+        return query
+
+    def product_sales(self, date_from=None, date_to=None, category=None, limit=None):
+        """
+        Units sold and revenue per product for paid orders, best sellers by revenue first.
+
+        Returns:
+            list of {'product_id', 'name', 'category', 'units_sold', 'revenue'}
+        """
+        units = func.sum(OrderItem.quantity)
+        revenue = func.sum(OrderItem.line_total)
+        query = self._paid_items(db.session.query(
+            OrderItem.product_id,
+            func.max(OrderItem.product_name),
+            func.max(OrderItem.category),
+            units,
+            revenue
+        ), date_from, date_to, category).group_by(OrderItem.product_id).order_by(revenue.desc(), units.desc())
+
+        if limit:
+            query = query.limit(limit)
+
+        return [{
+            'product_id': product_id,
+            'name': name,
+            'category': row_category,
+            'units_sold': int(row_units or 0),
+            'revenue': round(float(row_revenue or 0.0), 2)
+        } for product_id, name, row_category, row_units, row_revenue in query]
+
+    def category_sales(self, date_from=None, date_to=None):
+        """
+        Units sold and revenue per category for paid orders.
+
+        Returns:
+            list of {'category', 'units_sold', 'revenue'}
+        """
+        units = func.sum(OrderItem.quantity)
+        revenue = func.sum(OrderItem.line_total)
+        query = self._paid_items(
+            db.session.query(OrderItem.category, units, revenue), date_from, date_to
+        ).group_by(OrderItem.category).order_by(revenue.desc())
+
+        return [{
+            'category': row_category or 'Uncategorized',
+            'units_sold': int(row_units or 0),
+            'revenue': round(float(row_revenue or 0.0), 2)
+        } for row_category, row_units, row_revenue in query]
+
+    def top_products(self, date_from=None, date_to=None, limit=10):
+        """Best sellers in the shape PDFService.generate_business_report expects for data['top_products']"""
+        return self.product_sales(date_from, date_to, limit=limit)
@@ -0,0 +1,209 @@
+import re
+import time
+import heapq
+import bisect
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# A term in the name outranks the same term in the category, which outranks the description
+FIELD_WEIGHTS = (('name', 3.0), ('category', 2.0), ('description', 1.0))
+PREFIX_WEIGHT = 0.8
+FUZZY_WEIGHT = 0.6
+FUZZY_MIN_SIMILARITY = 0.35
+MAX_PREFIX_TERMS = 50
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def trigrams(term):
+    padded = f"${term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ProductSearchIndex:
+    """
+    In-memory inverted index over product name, category and description.
+
+    Terms map to {product_id: weight} postings. A sorted term list answers prefix
+    queries with bisect, and a trigram index finds near-miss spellings when a
+    query word has no exact or prefix match. Products are added, replaced and
+    removed one at a time as they change, and the whole index is rebuilt after
+    max_age to pick up writes made by other workers.
+    """
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._reset()
+
+    def _reset(self):
+        self._docs = {}
+        self._doc_terms = {}
+        self._postings = {}
+        self._terms = []
+        self._trigrams = {}
+
+    def _add_term(self, term):
+        bisect.insort(self._terms, term)
+        for gram in trigrams(term):
+            self._trigrams.setdefault(gram, set()).add(term)
+
+    def _drop_term(self, term):
+        index = bisect.bisect_left(self._terms, term)
+        if index < len(self._terms) and self._terms[index] == term:
+            del self._terms[index]
+        for gram in trigrams(term):
+            terms = self._trigrams.get(gram)
+            if terms:
+                terms.discard(term)
+                if not terms:
+                    del self._trigrams[gram]
+
+    def rebuild(self, products):
+        """Replace the index with `products` (serialized product dicts)"""
+        with self._lock:
+            self._reset()
+            for product in products:
+                self.upsert(product)
+            self._loaded_at = time.monotonic()
+        logger.info(f"Search index built: {len(self._docs)} products, {len(self._terms)} terms")
+
+    def ensure_loaded(self, loader):
+        """Build the index from loader() on first use or once it is older than max_age"""
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age:
+            self.rebuild(loader())
+
+    def upsert(self, product):
+        """Index a new product or re-index a changed one"""
+        with self._lock:
+            self.remove(product['id'])
+
+            weights = {}
+            for field, weight in FIELD_WEIGHTS:
+                for term in set(tokenize(product.get(field))):
+                    weights[term] = weights.get(term, 0.0) + weight
+
+            for term, weight in weights.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    self._add_term(term)
+                postings[product['id']] = weight
+
+            self._docs[product['id']] = product
+            self._doc_terms[product['id']] = set(weights)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._docs.pop(product_id, None)
+            for term in self._doc_terms.pop(product_id, ()):
+                postings = self._postings[term]
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[term]
+                    self._drop_term(term)
+
+    def _prefix_terms(self, token):
+        start = bisect.bisect_left(self._terms, token)
+        matches = []
+        for term in self._terms[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(token):
+                break
+            matches.append(term)
+        return matches
+
+    def _fuzzy_terms(self, token):
+        grams = trigrams(token)
+        shared = {}
+        for gram in grams:
+            for term in self._trigrams.get(gram, ()):
+                shared[term] = shared.get(term, 0) + 1
+
+        matches = []
+        for term, count in shared.items():
+            similarity = count / (len(grams) + len(trigrams(term)) - count)
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                matches.append((term, similarity))
+        return matches
+
+    def _match_token(self, token):
+        """{product_id: score} for one query word: exact and prefix matches, or fuzzy ones if there are none"""
+        matched = [(term, PREFIX_WEIGHT if term != token else 1.0) for term in self._prefix_terms(token)]
+        if not matched and len(token) >= 3:
+            matched = [(term, FUZZY_WEIGHT * similarity) for term, similarity in self._fuzzy_terms(token)]
+
+        scores = {}
+        for term, factor in matched:
+            for product_id, weight in self._postings[term].items():
+                score = weight * factor
+                if score > scores.get(product_id, 0.0):
+                    scores[product_id] = score
+        return scores
+
+    def search(self, query='', category=None, min_price=None, max_price=None, page=1, per_page=20):
+        """
+        Products matching every word of `query` (all products when it is empty),
+        best match first.
+
+        Returns:
+            dict with products, total, page, per_page and facets {'categories': [{'category', 'count'}]};
+            category counts ignore the category filter so every facet stays selectable
+        """
+        with self._lock:
+            tokens = tokenize(query)
+            if tokens:
+                scores = None
+                for token in tokens:
+                    token_scores = self._match_token(token)
+                    if scores is None:
+                        scores = token_scores
+                    else:
+                        scores = {pid: score + token_scores[pid] for pid, score in scores.items() if pid in token_scores}
+                    if not scores:
+                        break
+                scores = scores or {}
+            else:
+                scores = {pid: 0.0 for pid in self._docs}
+
+            candidates = []
+            for product_id, score in scores.items():
+                product = self._docs[product_id]
+                price = product.get('price_now') or 0
+                if (min_price is not None and price < min_price) or (max_price is not None and price > max_price):
+                    continue
+                candidates.append((product, score))
+
+        facets = {}
+        for product, _ in candidates:
+            facets[product['category']] = facets.get(product['category'], 0) + 1
+
+        if category:
+            candidates = [(p, s) for p, s in candidates if p['category'] == category]
+
+        if tokens:
+            order = lambda entry: (-entry[1], entry[0]['name'].lower())
+        else:
+            order = lambda entry: entry[0]['id']
+
+        # Only the entries up to the requested page need ordering
+        start = (page - 1) * per_page
+        ranked = heapq.nsmallest(start + per_page, candidates, key=order)
+        return {
+            'products': [product for product, _ in ranked[start:]],
+            'total': len(candidates),
+            'page': page,
+            'per_page': per_page,
+            'facets': {
+                'categories': [
+                    {'category': name, 'count': count}
+                    for name, count in sorted(facets.items(), key=lambda item: (-item[1], item[0]))
+                ]
+            }
+        }
@@ -0,0 +1,150 @@
+import time
+import threading
+import logging
+from sqlalchemy import func, case, and_
+from models import db, Order, ArchivedOrder, Staff, get_nairobi_time
+
+logger = logging.getLogger(__name__)
+
+CASH_METHODS = ('Cash', 'Pay on Delivery')
+MPESA_METHODS = ('Pay Now',)
+
+
+class StaffStatsService:
+    """
+    Per-staff delivery and revenue figures from GROUP BY queries over the active
+    and archived orders, cached for a few seconds per period so dashboards
+    polling the endpoint share one set of queries. invalidate() bumps a version
+    so a computation that started before an order write is not cached.
+    """
+
+    def __init__(self, ttl=30, max_entries=64):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._version = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._cache.clear()
+
+    def _duration_seconds(self, model):
+        if db.engine.dialect.name == 'postgresql':
+            return func.extract('epoch', model.delivered_at - model.created_at)
+        return (func.julianday(model.delivered_at) - func.julianday(model.created_at)) * 86400
+
+    def _between(self, column, date_from, date_to):
+        conditions = [column.isnot(None)]
+        if date_from:
+            conditions.append(column >= date_from)
+        if date_to:
+            conditions.append(column <= date_to)
+        return and_(*conditions)
+
+    def _aggregate(self, model, date_from, date_to, today_start):
+        created_in = self._between(model.created_at, date_from, date_to)
+        delivered_in = self._between(model.delivered_at, date_from, date_to)
+        duration = self._duration_seconds(model)
+
+        def count_if(condition):
+            return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+        query = db.session.query(
+            model.staff_id,
+            count_if(created_in),
+            count_if(delivered_in),
+            count_if(model.delivered_at >= today_start),
+            count_if(and_(model.status != 'Delivered', model.delivered_at.is_(None))),
+            func.coalesce(func.sum(case(
+                (and_(created_in, model.payment_status == 'Payment Complete'), model.total_amount), else_=0
+            )), 0),
+            count_if(and_(created_in, model.payment_method.in_(CASH_METHODS))),
+            count_if(and_(created_in, model.payment_method.in_(MPESA_METHODS))),
+            func.coalesce(func.sum(case((delivered_in, duration), else_=0)), 0),
+            func.max(case((delivered_in, duration), else_=None))
+        ).filter(model.staff_id.isnot(None))
+
+        if date_from:
+            # Orders neither created nor delivered in the period only matter for the "active" count
+            query = query.filter((model.created_at >= date_from) | (model.delivered_at >= date_from) | model.delivered_at.is_(None))
+
+        return query.group_by(model.staff_id).all()
+
+    def _compute(self, date_from, date_to):
+        today_start = get_nairobi_time().replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        stats = {}
+
+        for model in (Order, ArchivedOrder):
+            for (staff_id, orders, deliveries, delivered_today, active, revenue,
+                 cash, mpesa, duration_total, duration_max) in self._aggregate(model, date_from, date_to, today_start):
+                entry = stats.setdefault(staff_id, {
+                    'staff_id': staff_id, 'orders': 0, 'deliveries': 0, 'delivered_today': 0, 'active': 0,
+                    'revenue': 0.0, 'cash_payments': 0, 'mpesa_payments': 0,
+                    '_duration_total': 0.0, 'max_delivery_minutes': None
+                })
+                entry['orders'] += int(orders)
+                entry['deliveries'] += int(deliveries)
+                entry['delivered_today'] += int(delivered_today)
+                entry['active'] += int(active)
+                entry['revenue'] += float(revenue)
+                entry['cash_payments'] += int(cash)
+                entry['mpesa_payments'] += int(mpesa)
+                entry['_duration_total'] += float(duration_total)
+                if duration_max is not None:
+                    minutes = float(duration_max) / 60
+                    entry['max_delivery_minutes'] = max(entry['max_delivery_minutes'] or 0.0, minutes)
+
+        names = dict(db.session.query(Staff.id, func.coalesce(Staff.full_name, Staff.email)).filter(Staff.id.in_(stats)).all()) if stats else {}
+
+        result = []
+        for staff_id, entry in stats.items():
+            duration_total = entry.pop('_duration_total')
+            entry['name'] = names.get(staff_id, f'Staff #{staff_id}')
+            entry['revenue'] = round(entry['revenue'], 2)
+            entry['avg_delivery_minutes'] = round(duration_total / 60 / entry['deliveries'], 1) if entry['deliveries'] else None
+            if entry['max_delivery_minutes'] is not None:
+                entry['max_delivery_minutes'] = round(entry['max_delivery_minutes'], 1)
+            result.append(entry)
+
+        result.sort(key=lambda e: (e['deliveries'], e['revenue']), reverse=True)
+        return result
+
+    def performance(self, date_from=None, date_to=None):
+        """
+        Per-staff stats for a period (all time when both bounds are None).
+
+        Returns:
+            list of {'staff_id', 'name', 'orders', 'deliveries', 'delivered_today', 'active',
+                     'revenue', 'cash_payments', 'mpesa_payments', 'avg_delivery_minutes',
+                     'max_delivery_minutes'}, most deliveries first
+        """
+        key = (date_from, date_to)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] > now:
+                return cached[1]
+            version = self._version
+
+        result = self._compute(date_from, date_to)
+
+        with self._lock:
+            if version != self._version:
+                return result
+            if len(self._cache) >= self.max_entries:
+                self._cache.clear()
+            self._cache[key] = (now + self.ttl, result)
+        return result
+
+    def for_staff(self, staff_id, date_from=None, date_to=None):
+        """One staff member's stats for a period, zeroed when they have no orders"""
+        for entry in self.performance(date_from, date_to):
+            if entry['staff_id'] == staff_id:
+                return entry
+        return {
+            'staff_id': staff_id, 'orders': 0, 'deliveries': 0, 'delivered_today': 0, 'active': 0,
+            'revenue': 0.0, 'cash_payments': 0, 'mpesa_payments': 0,
+            'avg_delivery_minutes': None, 'max_delivery_minutes': None
+        }
@@ -11,7 +11,12 @@ let charts = {
     orderStatus: null
 };
 let ordersData = [];
+let ordersCursor = null;
+let ordersNextCursor = null;
+let ordersEtag = null;
 let analyticsData = null;
+let chartData = null;
+let socket = null;
 
 function toggleAdminMenu() {
     const dropdown = document.getElementById('admin-nav-dropdown');
@@ -282,12 +287,27 @@ async function loadDashboard() {
         loadBackupHistory()
     ]);
 
+    connectSocket();
+
     setInterval(async () => {
         await loadAnalytics();
-        await loadOrders();
+        await loadOrderChanges();
     }, 10000);
 }
 
+function connectSocket() {
+    if (socket || typeof io === 'undefined') return;
+
+    socket = io({ auth: { token: authToken } });
+    ['new_order', 'order_update', 'payment_update'].forEach(event => {
+        socket.on(event, data => {
+            if (!data.order) return;
+            ordersData = mergeOrders(ordersData, [data.order]);
+            renderOrdersTable();
+        });
+    });
+}
+
 async function loadAnalytics() {
     try {
         const response = await fetch(`${API_BASE}/api/analytics/dashboard`, {
@@ -297,12 +317,6 @@ async function loadAnalytics() {
         const data = await response.json();
         analyticsData = data;
 
-        const confirmedOrders = ordersData.filter(o => o.payment_status === 'Payment Complete');
-        const productSales = confirmedOrders.reduce((sum, o) => sum + parseFloat(o.product_total), 0);
-        const deliveryFees = confirmedOrders.reduce((sum, o) => sum + parseFloat(o.delivery_fee), 0);
-        const totalRevenue = confirmedOrders.reduce((sum, o) => sum + parseFloat(o.total_amount), 0);
-        const totalProfit = totalRevenue - data.total_capital;
-
         document.getElementById('totals-table').innerHTML = `
             <table>
                 <thead>
@@ -316,58 +330,147 @@ async function loadAnalytics() {
                 </thead>
                 <tbody>
                     <tr>
-                        <td>${productSales.toFixed(2)}</td>
-                        <td>${deliveryFees.toFixed(2)}</td>
-                        <td>${totalRevenue.toFixed(2)}</td>
+                        <td>${data.product_sales.toFixed(2)}</td>
+                        <td>${data.delivery_fees.toFixed(2)}</td>
+                        <td>${data.total_revenue.toFixed(2)}</td>
                         <td>${data.total_capital.toFixed(2)}</td>
-                        <td>${totalProfit.toFixed(2)}</td>
+                        <td>${data.total_profit.toFixed(2)}</td>
                     </tr>
                 </tbody>
             </table>
         `;
 
-        updateCharts();
+        await loadChartData();
     } catch (error) {
         console.error('Error loading analytics:', error);
         showFlash('Failed to load analytics data', 'error');
     }
 }
 
-async function loadOrders() {
+async function loadChartData() {
     try {
-        const response = await fetch(`${API_BASE}/api/orders`, {
+        const response = await fetch(`${API_BASE}/api/analytics/charts?bucket=day`, {
             headers: { 'Authorization': `Bearer ${authToken}` }
         });
 
-        const orders = await response.json();
-        ordersData = orders;
-        const tbody = document.querySelector('#orders-table tbody');
-
-        tbody.innerHTML = orders.map(o => {
-            const productNames = o.items.map(item => item.name).join(', ');
-            return `
-            <tr onclick="viewOrderDetails(${o.id})" style="cursor: pointer;">
-                <td>${o.order_id}</td>
-                <td>${o.customer_name}</td>
-                <td>${productNames}</td>
-                <td>${o.product_total}</td>
-                <td>${o.delivery_fee}</td>
-                <td>${o.total_amount}</td>
-                <td>${o.payment_method}</td>
-                <td>${o.staff_name || 'Unassigned'}</td>
-                <td><span class="status-badge status-${o.payment_status.toLowerCase().replace(/ /g, '-')}">${o.payment_status}</span></td>
-                <td>${new Date(o.created_at).toLocaleString()}</td>
-            </tr>
-        `;
-        }).join('');
+        const data = await response.json();
+        if (!data.success) return;
 
+        chartData = data;
         updateCharts();
+    } catch (error) {
+        console.error('Error loading chart data:', error);
+    }
+}
+
+async function loadOrders() {
+    try {
+        const response = await fetch(`${API_BASE}/api/orders?limit=200`, {
+            headers: { 'Authorization': `Bearer ${authToken}` }
+        });
+
+        const data = await response.json();
+        ordersData = data.orders || [];
+        ordersCursor = data.changes_cursor;
+        ordersEtag = null;
+        setOrdersNextCursor(data.next_cursor);
+
+        renderOrdersTable();
     } catch (error) {
         console.error('Error loading orders:', error);
         showFlash('Failed to load orders', 'error');
     }
 }
 
+// Older pages are appended by keyset cursor; the change feed keeps the loaded rows current
+async function loadMoreOrders() {
+    if (!ordersNextCursor) return;
+
+    try {
+        const response = await fetch(`${API_BASE}/api/orders?limit=200&cursor=${encodeURIComponent(ordersNextCursor)}`, {
+            headers: { 'Authorization': `Bearer ${authToken}` }
+        });
+
+        const data = await response.json();
+        if (!data.success) {
+            showFlash(data.message || 'Failed to load more orders', 'error');
+            return;
+        }
+
+        ordersData = mergeOrders(ordersData, data.orders);
+        setOrdersNextCursor(data.next_cursor);
+        renderOrdersTable();
+    } catch (error) {
+        console.error('Error loading more orders:', error);
+        showFlash('Failed to load more orders', 'error');
+    }
+}
+
+function setOrdersNextCursor(cursor) {
+    ordersNextCursor = cursor || null;
+    const button = document.getElementById('orders-load-more');
+    if (button) {
+        button.style.display = ordersNextCursor ? 'inline-block' : 'none';
+    }
+}
+
+async function loadOrderChanges() {
+    if (!ordersCursor) {
+        return loadOrders();
+    }
+
+    try {
+        const headers = { 'Authorization': `Bearer ${authToken}` };
+        if (ordersEtag) headers['If-None-Match'] = ordersEtag;
+
+        const response = await fetch(`${API_BASE}/api/orders/changes?since=${encodeURIComponent(ordersCursor)}`, { headers });
+        if (response.status === 304) return;
+
+        const data = await response.json();
+        ordersEtag = response.headers.get('ETag');
+        ordersCursor = data.cursor;
+
+        if (data.orders.length) {
+            ordersData = mergeOrders(ordersData, data.orders);
+            renderOrdersTable();
+        }
+
+        if (data.has_more) {
+            await loadOrderChanges();
+        }
+    } catch (error) {
+        console.error('Error loading order changes:', error);
+    }
+}
+
+function mergeOrders(current, changed) {
+    const byId = new Map(current.map(o => [o.id, o]));
+    changed.forEach(o => byId.set(o.id, o));
+    return Array.from(byId.values()).sort((a, b) => new Date(b.created_at) - new Date(a.created_at) || b.id - a.id);
+}
+
+function renderOrdersTable() {
+    const tbody = document.querySelector('#orders-table tbody');
+
+    tbody.innerHTML = ordersData.map(o => {
+        const productNames = o.items.map(item => item.name).join(', ');
+        return `
+        <tr onclick="viewOrderDetails(${o.id})" style="cursor: pointer;">
+            <td>${o.order_id}</td>
+            <td>${o.customer_name}</td>
+            <td>${productNames}</td>
+            <td>${o.product_total}</td>
+            <td>${o.delivery_fee}</td>
+            <td>${o.total_amount}</td>
+            <td>${o.payment_method}</td>
+            <td>${o.staff_name || 'Unassigned'}</td>
+            <td><span class="status-badge status-${o.payment_status.toLowerCase().replace(/ /g, '-')}">${o.payment_status}</span></td>
+            <td>${new Date(o.created_at).toLocaleString()}</td>
+        </tr>
+    `;
+    }).join('');
+}
+
 function viewOrderDetails(orderId) {
     const order = ordersData.find(o => o.id === orderId);
     if (!order) return;
@@ -404,7 +507,7 @@ function viewOrderDetails(orderId) {
 }
 
 function updateCharts() {
-    if (!ordersData.length || !analyticsData) return;
+    if (!chartData || !analyticsData) return;
 
     updateSalesChart();
     updateRevenueChart();
@@ -416,29 +519,11 @@ function updateSalesChart() {
     const ctx = document.getElementById('salesChart');
     if (!ctx) return;
 
-    const now = new Date();
-    const ordersByDay = {};
-    
-    for (let i = 29; i >= 0; i--) {
-        const date = new Date(now);
-        date.setDate(date.getDate() - i);
-        const dayKey = date.toISOString().split('T')[0];
-        ordersByDay[dayKey] = 0;
-    }
-
-    ordersData.forEach(order => {
-        const orderDate = new Date(order.created_at);
-        const dayKey = orderDate.toISOString().split('T')[0];
-        if (ordersByDay.hasOwnProperty(dayKey)) {
-            ordersByDay[dayKey]++;
-        }
-    });
-
-    const labels = Object.keys(ordersByDay).map(dateStr => {
+    const labels = chartData.series.labels.map(dateStr => {
         const date = new Date(dateStr);
         return date.toLocaleDateString('en-US', { month: 'short', day: 'numeric' });
     });
-    const data = Object.values(ordersByDay);
+    const data = chartData.series.orders;
 
     if (charts.sales) {
         charts.sales.destroy();
@@ -546,14 +631,8 @@ function updatePaymentMethodsChart() {
     const ctx = document.getElementById('paymentMethodsChart');
     if (!ctx) return;
 
-    const paymentMethods = {};
-    ordersData.forEach(order => {
-        const method = order.payment_method || 'Unknown';
-        paymentMethods[method] = (paymentMethods[method] || 0) + 1;
-    });
-
-    const labels = Object.keys(paymentMethods);
-    const data = Object.values(paymentMethods);
+    const labels = chartData.payment_methods.map(entry => entry.key);
+    const data = chartData.payment_methods.map(entry => entry.orders);
 
     if (charts.paymentMethods) {
         charts.paymentMethods.destroy();
@@ -593,14 +672,8 @@ function updateOrderStatusChart() {
     const ctx = document.getElementById('orderStatusChart');
     if (!ctx) return;
 
-    const statuses = {};
-    ordersData.forEach(order => {
-        const status = order.payment_status || 'Unknown';
-        statuses[status] = (statuses[status] || 0) + 1;
-    });
-
-    const labels = Object.keys(statuses);
-    const data = Object.values(statuses);
+    const labels = chartData.payment_statuses.map(entry => entry.key);
+    const data = chartData.payment_statuses.map(entry => entry.orders);
 
     if (charts.orderStatus) {
         charts.orderStatus.destroy();
@@ -772,6 +845,45 @@ async function deleteProduct(productId) {
     }
 }
 
+async function importProducts(input) {
+    const file = input.files[0];
+    if (!file) return;
+
+    const upload = async (skipInvalid) => {
+        const formData = new FormData();
+        formData.append('file', file);
+        const response = await fetch(`${API_BASE}/api/admin/products/import${skipInvalid ? '?skip_invalid=1' : ''}`, {
+            method: 'POST',
+            headers: { 'Authorization': `Bearer ${authToken}` },
+            body: formData
+        });
+        return response.json();
+    };
+
+    try {
+        showFlash('Importing products...', 'success');
+        let data = await upload(false);
+
+        if (!data.success && data.error_count) {
+            const details = data.errors.slice(0, 5).map(e => `Row ${e.row}: ${e.errors.join(', ')}`).join('\n');
+            if (confirm(`${data.error_count} rows have errors:\n${details}\n\nImport the valid rows and skip these?`)) {
+                data = await upload(true);
+            }
+        }
+
+        if (data.success) {
+            showFlash(`Imported products: ${data.created} created, ${data.updated} updated, ${data.skipped} skipped`, 'success');
+            loadProducts();
+        } else if (!data.error_count) {
+            showFlash('Import failed: ' + (data.message || 'Unknown error'), 'error');
+        }
+    } catch (error) {
+        showFlash('Error: ' + error.message, 'error');
+    } finally {
+        input.value = '';
+    }
+}
+
 async function loadCapital() {
     try {
         const response = await fetch(`${API_BASE}/api/capital`, {
@@ -1204,6 +1316,66 @@ async function createBackup() {
     }
 }
 
+async function generateBusinessReport() {
+    const button = document.getElementById('generate-report-btn');
+    const dateFrom = document.getElementById('report-date-from').value;
+    const dateTo = document.getElementById('report-date-to').value;
+
+    button.disabled = true;
+    try {
+        showFlash('Preparing business report...', 'info');
+        const response = await fetch(`${API_BASE}/api/reports/business`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${authToken}`
+            },
+            body: JSON.stringify({ date_from: dateFrom || null, date_to: dateTo || null })
+        });
+
+        const data = await response.json();
+        if (!data.success) {
+            showFlash('Error: ' + (data.message || 'Failed to generate report'), 'error');
+            return;
+        }
+
+        await downloadBusinessReport(data.url, data.report_id);
+    } catch (error) {
+        showFlash('Error: ' + error.message, 'error');
+    } finally {
+        button.disabled = false;
+    }
+}
+
+async function downloadBusinessReport(url, reportId) {
+    // The PDF renders in the background; poll until it is ready
+    for (let attempt = 0; attempt < 60; attempt++) {
+        const response = await fetch(`${API_BASE}${url}`, {
+            headers: { 'Authorization': `Bearer ${authToken}` }
+        });
+
+        if (response.status === 200) {
+            const blob = await response.blob();
+            const a = document.createElement('a');
+            a.href = window.URL.createObjectURL(blob);
+            a.download = `business_report_${reportId}.pdf`;
+            a.click();
+            showFlash('Business report ready!', 'success');
+            return;
+        }
+
+        if (response.status !== 202) {
+            const data = await response.json();
+            showFlash('Error: ' + (data.message || 'Failed to generate report'), 'error');
+            return;
+        }
+
+        await new Promise(resolve => setTimeout(resolve, 2000));
+    }
+
+    showFlash('Report is taking longer than expected, please try again shortly', 'error');
+}
+
 async function saveBackupSettings() {
     const interval = document.getElementById('backup-interval').value;
 
@@ -1265,9 +1437,10 @@ async function exportOrders(format) {
             a.click();
             showFlash(`Orders exported successfully!`, 'success');
         } else {
-            showFlash('Export functionality not yet implemented on backend', 'error');
+            const data = await response.json();
+            showFlash('Error: ' + (data.message || 'Failed to export orders'), 'error');
         }
     } catch (error) {
-        showFlash('Export functionality not yet implemented on backend', 'error');
+        showFlash('Error: ' + error.message, 'error');
     }
 }
\ No newline at end of file
@@ -9,6 +9,12 @@ let minPrice = 0;
 let maxPrice = 10000;
 let currentCategory = 'all';
 let notificationCheckInterval = null;
+let socket = null;
+let deliveryCoords = null;
+let orderHistoryCursor = null;
+let searchDebounceTimer = null;
+let searchRequestSeq = 0;
+let cartSyncTimer = null;
 
 async function checkNotifications() {
     if (!authToken || !currentUser) return;
@@ -33,6 +39,36 @@ async function checkNotifications() {
     }
 }
 
+function connectSocket() {
+    if (socket || typeof io === 'undefined') return;
+    
+    socket = io({ auth: authToken ? { token: authToken } : {} });
+    
+    socket.on('product_update', data => {
+        if (data.action === 'bulk') {
+            loadProducts();
+            return;
+        }
+        products = products.filter(p => p.id !== data.product_id);
+        if (data.product) {
+            products.push(data.product);
+        }
+        renderCategories();
+        applyAllFilters();
+    });
+    
+    // Only this customer's sockets are in the room, so a payment event means a fresh notification
+    socket.on('payment_update', () => checkNotifications());
+    
+    socket.on('stk_push', data => {
+        if (data.success) {
+            showFlashMessage(`Check your phone to complete the M-Pesa payment for order ${data.order_id}`);
+        } else {
+            showFlashMessage(`Could not send M-Pesa prompt for order ${data.order_id}: ${data.message}`, 'error');
+        }
+    });
+}
+
 async function markNotificationRead(notifId) {
     try {
         await fetch(`${API_BASE}/api/customer/notifications/${notifId}/read`, {
@@ -54,11 +90,12 @@ async function initializeApp() {
     
     if (authToken) {
         await loadUserProfile();
-        mergeLocalCartToServer();
+        await mergeLocalCartToServer();
         checkNotifications();
         notificationCheckInterval = setInterval(checkNotifications, 10000);
     }
     
+    connectSocket();
     updateCartDisplay();
     setupEventListeners();
     startCartExpiryTimer();
@@ -92,13 +129,9 @@ function setupEventListeners() {
     
     const searchInput = document.getElementById('search-input');
     if (searchInput) {
-        searchInput.addEventListener('input', (e) => {
-            const searchTerm = e.target.value.toLowerCase();
-            const filtered = products.filter(p => 
-                p.name.toLowerCase().includes(searchTerm) || 
-                (p.description && p.description.toLowerCase().includes(searchTerm))
-            );
-            renderProducts(applyFilters(filtered));
+        searchInput.addEventListener('input', () => {
+            clearTimeout(searchDebounceTimer);
+            searchDebounceTimer = setTimeout(applyAllFilters, 200);
         });
     }
 }
@@ -433,18 +466,42 @@ function togglePriceFilter() {
 }
 
 function applyAllFilters() {
-    const searchTerm = document.getElementById('search-input')?.value.toLowerCase() || '';
-    
-    let filtered = products;
+    const searchTerm = document.getElementById('search-input')?.value.trim() || '';
     
     if (searchTerm) {
-        filtered = filtered.filter(p => 
-            p.name.toLowerCase().includes(searchTerm) || 
-            (p.description && p.description.toLowerCase().includes(searchTerm))
-        );
+        searchProducts(searchTerm);
+        return;
     }
     
-    renderProducts(applyFilters(filtered));
+    searchRequestSeq++;
+    renderProducts(applyFilters(products));
+}
+
+async function searchProducts(searchTerm) {
+    const seq = ++searchRequestSeq;
+    const params = new URLSearchParams({
+        q: searchTerm,
+        min_price: document.getElementById('min-price-slider')?.value || minPrice,
+        max_price: document.getElementById('max-price-slider')?.value || maxPrice,
+        per_page: 100
+    });
+    if (currentCategory !== 'all') {
+        params.set('category', currentCategory);
+    }
+    
+    try {
+        const response = await fetch(`${API_BASE}/api/products/search?${params}`);
+        const data = await response.json();
+        
+        // A slower response to an earlier keystroke must not overwrite newer results
+        if (seq !== searchRequestSeq) return;
+        
+        if (data.success) {
+            renderProducts(data.products);
+        }
+    } catch (error) {
+        console.error('Error searching products:', error);
+    }
 }
 
 function applyFilters(productList) {
@@ -484,6 +541,17 @@ function filterByCategory(category) {
     applyAllFilters();
 }
 
+function productImageHtml(product, variant, className, placeholder) {
+    const sizes = product.image_variants && product.image_variants[variant];
+    const onerror = `this.onerror=null; this.parentElement.tagName === 'PICTURE' && this.parentElement.querySelector('source')?.remove(); this.src='${placeholder}'`;
+    
+    if (!sizes) {
+        return `<img src="${product.image_url}" alt="${product.name}" class="${className}" loading="lazy" onerror="${onerror}">`;
+    }
+    
+    return `<picture><source srcset="${sizes.webp}" type="image/webp"><img src="${sizes.jpeg}" alt="${product.name}" class="${className}" loading="lazy" onerror="${onerror}"></picture>`;
+}
+
 function renderProducts(productList) {
     const grid = document.getElementById('products-grid');
     
@@ -495,7 +563,7 @@ function renderProducts(productList) {
         const quantity = cart[product.id] || 0;
         html += `
             <div class="product-card">
-                <img src="${product.image_url}" alt="${product.name}" class="product-image" onerror="this.src='data:image/svg+xml,%3Csvg xmlns=%27http://www.w3.org/2000/svg%27 width=%27200%27 height=%27200%27%3E%3Crect fill=%27%23ddd%27 width=%27200%27 height=%27200%27/%3E%3Ctext x=%2750%25%27 y=%2750%25%27 text-anchor=%27middle%27%3ENo Image%3C/text%3E%3C/svg%3E'">
+                ${productImageHtml(product, 'card', 'product-image', "data:image/svg+xml,%3Csvg xmlns=%27http://www.w3.org/2000/svg%27 width=%27200%27 height=%27200%27%3E%3Crect fill=%27%23ddd%27 width=%27200%27 height=%27200%27/%3E%3Ctext x=%2750%25%27 y=%2750%25%27 text-anchor=%27middle%27%3ENo Image%3C/text%3E%3C/svg%3E")}
                 <div class="product-info">
                     <div class="product-name">${product.name}</div>
                     <div class="product-description">${product.description || ''}</div>
@@ -535,6 +603,7 @@ function updateCart(productId, delta) {
     localStorage.setItem('cart_timestamp', Date.now());
     
     updateCartDisplay();
+    scheduleCartSync();
 }
 
 function updateCartDisplay() {
@@ -606,7 +675,7 @@ function renderCart() {
             itemsHTML += `
                 <div class="cart-item">
                     <div class="cart-item-details">
-                        <img src="${product.image_url}" alt="${product.name}" class="cart-item-image" onerror="this.src='data:image/svg+xml,%3Csvg xmlns=%27http://www.w3.org/2000/svg%27 width=%2760%27 height=%2760%27%3E%3Crect fill=%27%23ddd%27 width=%2760%27 height=%2760%27/%3E%3C/svg%3E'">
+                        ${productImageHtml(product, 'thumbnail', 'cart-item-image', "data:image/svg+xml,%3Csvg xmlns=%27http://www.w3.org/2000/svg%27 width=%2760%27 height=%2760%27%3E%3Crect fill=%27%23ddd%27 width=%2760%27 height=%2760%27/%3E%3C/svg%3E")}
                         <div style="flex: 1;">
                             <div style="font-weight: bold; margin-bottom: 5px;">${product.name}</div>
                             <div style="font-size: 12px; color: #888;">${product.description || ''}</div>
@@ -624,15 +693,96 @@ function renderCart() {
     
     cartItems.innerHTML = itemsHTML || '<p>Your cart is empty</p>';
     cartSummary.innerHTML = `<h3>Total: KES ${total.toFixed(2)}</h3>`;
+    
+    if (itemsHTML) {
+        loadCartQuote();
+    }
+}
+
+function cartQuoteItems() {
+    return Object.keys(cart).map(productId => ({
+        product_id: parseInt(productId),
+        quantity: cart[productId]
+    }));
+}
+
+// Quoted with the chosen delivery location, so the total shown is the total the order is charged
+async function loadCartQuote() {
+    const summaries = ['cart-summary', 'checkout-summary'].map(id => document.getElementById(id)).filter(Boolean);
+    
+    try {
+        const response = await fetch(`${API_BASE}/api/pricing/quote`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                items: cartQuoteItems(),
+                delivery_latitude: deliveryCoords ? deliveryCoords.latitude : null,
+                delivery_longitude: deliveryCoords ? deliveryCoords.longitude : null
+            })
+        });
+        
+        const data = await response.json();
+        if (!data.success || summaries.length === 0) return;
+        
+        const quote = data.quote;
+        const summaryHTML = `
+            <div style="font-size: 14px; color: #888;">
+                <div>Products: KES ${quote.product_total.toFixed(2)}</div>
+                <div>Delivery: KES ${quote.delivery_fee.toFixed(2)}</div>
+                ${quote.convenience_fee ? `<div>Convenience fee: KES ${quote.convenience_fee.toFixed(2)}</div>` : ''}
+                ${quote.transaction_fee ? `<div>Transaction fee: KES ${quote.transaction_fee.toFixed(2)}</div>` : ''}
+            </div>
+            <h3>Total: KES ${quote.total_amount.toFixed(2)}</h3>
+        `;
+        summaries.forEach(summary => {
+            summary.innerHTML = summaryHTML;
+        });
+    } catch (error) {
+        console.error('Error loading cart quote:', error);
+    }
+}
+
+async function reserveCheckoutStock() {
+    try {
+        const response = await fetch(`${API_BASE}/api/checkout/reservations`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${authToken}`
+            },
+            body: JSON.stringify({ items: cartQuoteItems() })
+        });
+        const data = await response.json();
+        if (!data.success) {
+            showFlashMessage(data.message, 'error');
+        }
+        return data.success;
+    } catch (error) {
+        // The order itself is still checked against stock, so a failed hold need not block checkout
+        console.error('Error reserving stock:', error);
+        return true;
+    }
+}
+
+function releaseCheckoutStock() {
+    if (!authToken) return;
+    fetch(`${API_BASE}/api/checkout/reservations`, {
+        method: 'DELETE',
+        headers: { 'Authorization': `Bearer ${authToken}` }
+    }).catch(error => console.error('Error releasing stock:', error));
 }
 
-function showCheckout() {
+async function showCheckout() {
     if (!authToken) {
         showFlashMessage('Please login to checkout', 'error');
         showPage('account');
         return;
     }
     
+    if (!(await reserveCheckoutStock())) {
+        return;
+    }
+    
     renderCart();
     
     const checkoutNameField = document.getElementById('checkout-name');
@@ -668,19 +818,7 @@ async function handleCheckout(e) {
         return;
     }
     
-    const items = Object.keys(cart).map(productId => {
-        const product = products.find(p => p.id == productId);
-        return {
-            product_id: productId,
-            name: product.name,
-            price: product.price_now,
-            quantity: cart[productId]
-        };
-    });
-    
-    const productTotal = items.reduce((sum, item) => sum + (item.price * item.quantity), 0);
-    const deliveryFee = settings.min_delivery_fee || 0;
-    const totalAmount = productTotal + deliveryFee;
+    const items = cartQuoteItems();
     
     try {
         const response = await fetch(`${API_BASE}/api/orders`, {
@@ -695,11 +833,10 @@ async function handleCheckout(e) {
                 customer_phone: phone,
                 customer_email: currentUser.email,
                 delivery_address: address,
+                delivery_latitude: deliveryCoords ? deliveryCoords.latitude : null,
+                delivery_longitude: deliveryCoords ? deliveryCoords.longitude : null,
                 location_method: locationMethod,
                 items: items,
-                product_total: productTotal,
-                delivery_fee: deliveryFee,
-                total_amount: totalAmount,
                 payment_method: paymentMethod
             })
         });
@@ -711,7 +848,8 @@ async function handleCheckout(e) {
             localStorage.removeItem('cart');
             localStorage.removeItem('cart_timestamp');
             updateCartDisplay();
-            showFlashMessage(`Order placed successfully! Order ID: ${data.order_id}`);
+            scheduleCartSync();
+            showFlashMessage(`Order placed successfully! Order ID: ${data.order_id} - Total: KES ${data.total_amount.toFixed(2)}`);
             showPage('menu');
         } else {
             showFlashMessage('Order failed: ' + data.message, 'error');
@@ -740,6 +878,7 @@ async function handleLogin(e) {
             authToken = data.token;
             localStorage.setItem('customer_token', authToken);
             await loadUserProfile();
+            await mergeLocalCartToServer();
             updateAccountView();
             showFlashMessage('Login successful!');
             showPage('menu');
@@ -834,6 +973,7 @@ function showOTPVerification(email, username, password, phone, termsAccepted) {
                 authToken = data.token;
                 localStorage.setItem('customer_token', authToken);
                 await loadUserProfile();
+                await mergeLocalCartToServer();
                 updateAccountView();
                 showFlashMessage('Registration successful!');
                 showPage('menu');
@@ -1044,11 +1184,15 @@ async function showOrders() {
             }
             
             ordersHTML += `
+                <h3 style="color: #FF8C42; margin: 20px 0 15px;">Order History</h3>
+                <div id="order-history"></div>
+                <button class="btn-secondary" id="order-history-more" onclick="loadOrderHistory(false)" style="margin-top: 10px; display: none;">Load More</button>
                 <button class="btn-secondary" onclick="renderUserProfile()" style="margin-top: 15px;">Back to Profile</button>
                 </div>
             `;
             
             accountInfo.innerHTML = ordersHTML;
+            loadOrderHistory(true);
         } else {
             showFlashMessage('Failed to load orders', 'error');
         }
@@ -1057,6 +1201,85 @@ async function showOrders() {
     }
 }
 
+async function loadOrderHistory(reset) {
+    const historyDiv = document.getElementById('order-history');
+    const moreBtn = document.getElementById('order-history-more');
+    if (!historyDiv) return;
+    
+    if (reset) {
+        orderHistoryCursor = null;
+        historyDiv.innerHTML = '';
+    }
+    
+    try {
+        const cursorParam = orderHistoryCursor ? `&cursor=${encodeURIComponent(orderHistoryCursor)}` : '';
+        const response = await fetch(`${API_BASE}/api/customer/orders/history?limit=20${cursorParam}`, {
+            headers: { 'Authorization': `Bearer ${authToken}` }
+        });
+        
+        const data = await response.json();
+        if (!data.success) return;
+        
+        if (reset && data.orders.length === 0) {
+            historyDiv.innerHTML = '<p style="color: #888;">No past orders</p>';
+        }
+        
+        historyDiv.insertAdjacentHTML('beforeend', data.orders.map(order => `
+            <div class="order-card" onclick="toggleOrderHistoryDetail('${order.order_id}')" style="cursor: pointer;">
+                <div style="display: flex; justify-content: space-between;">
+                    <div>
+                        <div style="font-weight: bold; color: #FF8C42;">Order #${order.order_id}</div>
+                        <div style="font-size: 12px; color: #888;">${new Date(order.created_at).toLocaleString()}</div>
+                    </div>
+                    <div style="text-align: right;">
+                        <div style="font-weight: bold;">KES ${order.total_amount.toFixed(2)}</div>
+                        <div class="order-status ${getStatusClass(order.payment_status, order.status)}">${getStatusText(order.payment_status, order.status)}</div>
+                    </div>
+                </div>
+                <div id="history-detail-${order.order_id}" style="display: none; margin-top: 10px;"></div>
+            </div>
+        `).join(''));
+        
+        orderHistoryCursor = data.next_cursor;
+        if (moreBtn) {
+            moreBtn.style.display = orderHistoryCursor ? 'block' : 'none';
+        }
+    } catch (error) {
+        console.error('Error loading order history:', error);
+    }
+}
+
+async function toggleOrderHistoryDetail(orderId) {
+    const detailDiv = document.getElementById(`history-detail-${orderId}`);
+    if (!detailDiv) return;
+    
+    if (detailDiv.style.display === 'block') {
+        detailDiv.style.display = 'none';
+        return;
+    }
+    
+    if (!detailDiv.innerHTML) {
+        try {
+            const response = await fetch(`${API_BASE}/api/customer/orders/${orderId}`, {
+                headers: { 'Authorization': `Bearer ${authToken}` }
+            });
+            const data = await response.json();
+            if (!data.success) return;
+            
+            detailDiv.innerHTML = data.order.items.map(item => `
+                <div style="font-size: 13px; margin-left: 10px;">
+                    ${item.name} x ${item.quantity} - KES ${(item.price * item.quantity).toFixed(2)}
+                </div>
+            `).join('');
+        } catch (error) {
+            console.error('Error loading order detail:', error);
+            return;
+        }
+    }
+    
+    detailDiv.style.display = 'block';
+}
+
 function getStatusClass(paymentStatus, deliveryStatus) {
     if (deliveryStatus === 'Delivered') return 'status-delivered';
     if (paymentStatus === 'Payment Failed') return 'status-payment-failed';
@@ -1077,10 +1300,23 @@ function showNotifications() {
 
 function getLocation() {
     if (navigator.geolocation) {
-        navigator.geolocation.getCurrentPosition(position => {
+        navigator.geolocation.getCurrentPosition(async position => {
             const address = `Lat: ${position.coords.latitude}, Lng: ${position.coords.longitude}`;
             document.getElementById('delivery-address').value = address;
-            showFlashMessage('Location captured successfully!');
+            deliveryCoords = { latitude: position.coords.latitude, longitude: position.coords.longitude };
+            
+            try {
+                const response = await fetch(`${API_BASE}/api/delivery/quote`, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify(deliveryCoords)
+                });
+                const data = await response.json();
+                showFlashMessage(`Location captured! Delivery fee: KES ${data.delivery_fee.toFixed(2)}`);
+            } catch (error) {
+                showFlashMessage('Location captured successfully!');
+            }
+            loadCartQuote();
         }, error => {
             showFlashMessage('Unable to get location: ' + error.message, 'error');
         });
@@ -1090,6 +1326,10 @@ function getLocation() {
 }
 
 function showPage(pageName) {
+    if (currentPage === 'checkout' && pageName !== 'checkout') {
+        releaseCheckoutStock();
+    }
+    
     document.querySelectorAll('.page').forEach(page => page.classList.remove('active'));
     const targetPage = document.getElementById(`${pageName}-page`);
     
@@ -1286,22 +1526,53 @@ async function initiateCustomerPayment(orderId, defaultPhone) {
     }
 }
 
-async function mergeLocalCartToServer() {
-    if (Object.keys(cart).length === 0) return;
+async function syncCart(mode) {
+    if (!authToken) return null;
+    
+    const response = await fetch(`${API_BASE}/api/customer/cart/sync`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Authorization': `Bearer ${authToken}`
+        },
+        body: JSON.stringify({ items: cart, mode })
+    });
     
-    for (const [productId, quantity] of Object.entries(cart)) {
-        try {
-            await fetch(`${API_BASE}/api/customer/cart`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'Authorization': `Bearer ${authToken}`
-                },
-                body: JSON.stringify({ product_id: productId, quantity })
-            });
-        } catch (error) {
-            console.error('Error syncing cart:', error);
+    const data = await response.json();
+    return data.success ? data : null;
+}
+
+// Saved carts follow the browser cart; edits within a second go up as one request
+function scheduleCartSync() {
+    if (!authToken) return;
+    
+    clearTimeout(cartSyncTimer);
+    cartSyncTimer = setTimeout(() => {
+        syncCart('replace').catch(error => console.error('Error syncing cart:', error));
+    }, 1000);
+}
+
+async function mergeLocalCartToServer() {
+    try {
+        const data = await syncCart('merge');
+        if (!data) return;
+        
+        cart = {};
+        data.items.forEach(item => {
+            cart[item.product_id] = item.quantity;
+        });
+        
+        if (Object.keys(cart).length > 0) {
+            localStorage.setItem('cart', JSON.stringify(cart));
+            if (!localStorage.getItem('cart_timestamp')) {
+                localStorage.setItem('cart_timestamp', Date.now());
+            }
+        } else {
+            localStorage.removeItem('cart');
         }
+        updateCartDisplay();
+    } catch (error) {
+        console.error('Error syncing cart:', error);
     }
 }
 
@@ -1316,6 +1587,7 @@ function startCartExpiryTimer() {
             localStorage.removeItem('cart');
             localStorage.removeItem('cart_timestamp');
             updateCartDisplay();
+            scheduleCartSync();
             showFlashMessage('Your cart has expired', 'error');
         }
     }
@@ -1,7 +1,11 @@
 const API_BASE = '';
 let authToken = localStorage.getItem('staff_token');
 let currentOrders = [];
+let ordersCursor = null;
+let ordersNextCursor = null;
+let ordersEtag = null;
 let currentStaff = null;
+let socket = null;
 
 document.addEventListener('DOMContentLoaded', () => {
     initializeStaffPortal();
@@ -497,7 +501,8 @@ async function loadDashboard() {
     await loadOrders();
     await loadStats();
     renderDashboardHeader();
-    setInterval(() => loadOrders(true), 15000);
+    connectSocket();
+    setInterval(() => loadOrderChanges(), 15000);
 }
 
 function renderDashboardHeader() {
@@ -519,12 +524,16 @@ function renderDashboardHeader() {
 
 async function loadOrders(silent = false) {
     try {
-        const response = await fetch(`${API_BASE}/api/orders`, {
+        const response = await fetch(`${API_BASE}/api/orders?is_archived=false&limit=200`, {
             headers: { 'Authorization': `Bearer ${authToken}` }
         });
         
         if (response.ok) {
-            currentOrders = await response.json();
+            const data = await response.json();
+            currentOrders = data.orders || [];
+            ordersCursor = data.changes_cursor;
+            ordersEtag = null;
+            setOrdersNextCursor(data.next_cursor);
             renderOrders();
         } else {
             if (!silent) {
@@ -539,6 +548,91 @@ async function loadOrders(silent = false) {
     }
 }
 
+// Older pages are appended by keyset cursor; the change feed keeps the loaded rows current
+async function loadMoreOrders() {
+    if (!ordersNextCursor) return;
+    
+    try {
+        const response = await fetch(`${API_BASE}/api/orders?is_archived=false&limit=200&cursor=${encodeURIComponent(ordersNextCursor)}`, {
+            headers: { 'Authorization': `Bearer ${authToken}` }
+        });
+        
+        if (!response.ok) {
+            showFlashMessage('Failed to load more orders', 'error');
+            return;
+        }
+        
+        const data = await response.json();
+        setOrdersNextCursor(data.next_cursor);
+        applyOrderChanges(data.orders);
+    } catch (error) {
+        console.error('Error loading more orders:', error);
+        showFlashMessage('Error loading orders: ' + error.message, 'error');
+    }
+}
+
+function setOrdersNextCursor(cursor) {
+    ordersNextCursor = cursor || null;
+    const button = document.getElementById('orders-load-more');
+    if (button) {
+        button.style.display = ordersNextCursor ? 'block' : 'none';
+    }
+}
+
+async function loadOrderChanges() {
+    if (!ordersCursor) {
+        return loadOrders(true);
+    }
+    
+    try {
+        const headers = { 'Authorization': `Bearer ${authToken}` };
+        if (ordersEtag) headers['If-None-Match'] = ordersEtag;
+        
+        const response = await fetch(`${API_BASE}/api/orders/changes?since=${encodeURIComponent(ordersCursor)}`, { headers });
+        if (response.status === 304 || !response.ok) return;
+        
+        const data = await response.json();
+        ordersEtag = response.headers.get('ETag');
+        ordersCursor = data.cursor;
+        
+        if (data.orders.length) {
+            applyOrderChanges(data.orders);
+        }
+        
+        if (data.has_more) {
+            await loadOrderChanges();
+        }
+    } catch (error) {
+        console.error('Error loading order changes:', error);
+    }
+}
+
+function applyOrderChanges(changed) {
+    const byId = new Map(currentOrders.map(o => [o.id, o]));
+    changed.forEach(o => {
+        if (o.is_archived) {
+            byId.delete(o.id);
+        } else {
+            byId.set(o.id, o);
+        }
+    });
+    currentOrders = Array.from(byId.values()).sort((a, b) => new Date(b.created_at) - new Date(a.created_at) || b.id - a.id);
+    renderOrders();
+}
+
+function connectSocket() {
+    if (socket || typeof io === 'undefined') return;
+    
+    socket = io({ auth: { token: authToken } });
+    ['new_order', 'order_update', 'payment_update'].forEach(event => {
+        socket.on(event, data => {
+            if (data.order) {
+                applyOrderChanges([data.order]);
+            }
+        });
+    });
+}
+
 function renderOrders() {
     const availableDiv = document.getElementById('available-orders');
     const myOrdersDiv = document.getElementById('my-orders');
@@ -884,39 +978,38 @@ async function loadStats() {
     const statsDiv = document.getElementById('staff-stats');
     if (!statsDiv) return;
     
-    const today = new Date().toDateString();
-    
-    const myOrders = currentOrders.filter(o => o.staff_id);
-    const todayDeliveries = myOrders.filter(o => {
-        return o.status === 'Delivered' && 
-               o.delivered_at && 
-               new Date(o.delivered_at).toDateString() === today;
-    }).length;
-    
-    const completedOrders = myOrders.filter(o => o.is_archived).length;
-    const pendingOrders = myOrders.filter(o => !o.is_archived).length;
-    const cashPayments = myOrders.filter(o => o.payment_method === 'Cash').length;
-    const mpesaPayments = myOrders.filter(o => o.payment_method === 'Pay Now').length;
+    let stats;
+    try {
+        const response = await fetch(`${API_BASE}/api/staff/performance`, {
+            headers: { 'Authorization': `Bearer ${authToken}` }
+        });
+        const data = await response.json();
+        if (!data.success) return;
+        stats = data.me;
+    } catch (error) {
+        console.error('Error loading stats:', error);
+        return;
+    }
     
     statsDiv.innerHTML = `
         <div class="stat-card">
-            <div class="stat-value">${todayDeliveries}</div>
+            <div class="stat-value">${stats.delivered_today}</div>
             <div class="stat-label">Today's Deliveries</div>
         </div>
         <div class="stat-card">
-            <div class="stat-value">${completedOrders}</div>
+            <div class="stat-value">${stats.deliveries}</div>
             <div class="stat-label">Completed Orders</div>
         </div>
         <div class="stat-card">
-            <div class="stat-value">${pendingOrders}</div>
+            <div class="stat-value">${stats.active}</div>
             <div class="stat-label">Active Orders</div>
         </div>
         <div class="stat-card">
-            <div class="stat-value">${cashPayments}</div>
+            <div class="stat-value">${stats.cash_payments}</div>
             <div class="stat-label">Cash Payments</div>
         </div>
         <div class="stat-card">
-            <div class="stat-value">${mpesaPayments}</div>
+            <div class="stat-value">${stats.mpesa_payments}</div>
             <div class="stat-label">M-Pesa Payments</div>
         </div>
     `;
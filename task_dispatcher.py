@@ -0,0 +1,33 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from models import db
+
+logger = logging.getLogger(__name__)
+
+
+class TaskDispatcher:
+    """
+    Runs slow side effects (payment provider calls, emails, notifications) off the
+    request path on a bounded worker pool. Each task gets its own app context and
+    database session.
+    """
+
+    def __init__(self, app, max_workers=4):
+        self.app = app
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='task-dispatcher')
+        logger.info(f"TaskDispatcher initialized with {max_workers} workers")
+
+    def submit(self, func, *args, **kwargs):
+        """Queue func(*args, **kwargs); at most max_workers tasks run at once"""
+        return self.executor.submit(self._run, func, args, kwargs)
+
+    def _run(self, func, args, kwargs):
+        with self.app.app_context():
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                logger.exception(f"Background task {func.__name__} failed: {str(e)}")
+                db.session.rollback()
+            finally:
+                db.session.remove()
@@ -0,0 +1,80 @@
+import os
+import sys
+import atexit
+import shutil
+import logging
+import tempfile
+import importlib
+from flask import Flask
+from models import db
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_app_module = None
+
+
+def create_test_app(path):
+    """A bare Flask app bound to a fresh SQLite database at `path`, without app.py's startup work"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def load_app():
+    """
+    Import app.py once per test run against a throwaway SQLite database.
+    It runs from a scratch directory so its log file and storage folders stay out of the repo.
+    """
+    global _app_module
+    if _app_module is not None:
+        return _app_module
+
+    work_dir = tempfile.mkdtemp()
+    original_dir = os.getcwd()
+    os.chdir(work_dir)
+    sys.path.insert(0, REPO_DIR)
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'db.sqlite')}"
+    _app_module = importlib.import_module('app')
+    logging.getLogger().setLevel(logging.WARNING)
+
+    def cleanup():
+        _app_module.scheduler.shutdown(wait=False)
+        with _app_module.app.app_context():
+            _app_module.db.engine.dispose()
+        os.chdir(original_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    atexit.register(cleanup)
+    return _app_module
+
+
+def create_staff(appmod, approved=True, active=True):
+    """An active rider row and a token for it"""
+    from models import Staff
+    with appmod.app.app_context():
+        count = Staff.query.count()
+        staff = Staff(
+            email=f'rider{count}@example.com', password_hash='x', phone='254700000000',
+            full_name=f'Rider {count}', is_approved=approved, is_active=active
+        )
+        appmod.db.session.add(staff)
+        appmod.db.session.commit()
+        return staff.id, appmod.create_token(staff.id, 'staff')
+
+
+def create_product(appmod, price=100.0):
+    """An available menu item the pricing table will quote; returns its id"""
+    from models import Product
+    with appmod.app.app_context():
+        product = Product(
+            image_url='https://example.com/item.jpg', name='Test Item', price_now=price,
+            category='Mains', is_available=True, is_active=True
+        )
+        appmod.db.session.add(product)
+        appmod.db.session.commit()
+        appmod.pricing_service.invalidate()
+        return product.id
@@ -0,0 +1,62 @@
+import unittest
+from unittest import mock
+from support import load_app, create_product
+
+appmod = None
+
+
+def setUpModule():
+    global appmod
+    appmod = load_app()
+
+
+class CheckoutRulesTest(unittest.TestCase):
+    def setUp(self):
+        self.client = appmod.app.test_client()
+        self.product_id = create_product(appmod)
+        for target, name in ((appmod.socketio, 'emit'), (appmod.task_dispatcher, 'submit')):
+            patcher = mock.patch.object(target, name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.allow_pay_on_delivery, True)
+
+    def allow_pay_on_delivery(self, allowed):
+        from models import SystemSettings
+        with appmod.app.app_context():
+            SystemSettings.query.first().allow_pay_on_delivery = allowed
+            appmod.db.session.commit()
+        appmod.pricing_service.invalidate()
+
+    def place_order(self, payment_method):
+        return self.client.post('/api/orders', json={
+            'customer_name': 'Guest',
+            'customer_phone': '254700000000',
+            'items': [{'product_id': self.product_id, 'quantity': 1}],
+            'payment_method': payment_method,
+            'delivery_address': 'Somewhere'
+        })
+
+    def test_pay_on_delivery_follows_the_setting(self):
+        self.allow_pay_on_delivery(False)
+        self.assertEqual(self.place_order('Pay on Delivery').status_code, 400)
+        self.assertEqual(self.place_order('Pay Now').status_code, 200)
+
+        self.allow_pay_on_delivery(True)
+        self.assertEqual(self.place_order('Pay on Delivery').status_code, 200)
+
+    def test_unknown_payment_methods_are_rejected(self):
+        for payment_method in ('Cash', '', None):
+            self.assertEqual(self.place_order(payment_method).status_code, 400)
+
+    def test_quote_batch_is_capped(self):
+        cart = {'items': [{'product_id': self.product_id, 'quantity': 1}]}
+        response = self.client.post('/api/pricing/quote/batch', json={'carts': [cart] * appmod.PRICING_QUOTE_BATCH_MAX})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all(quote['success'] for quote in response.get_json()['quotes']))
+
+        for carts in ([cart] * (appmod.PRICING_QUOTE_BATCH_MAX + 1), {'items': []}, [None]):
+            self.assertEqual(self.client.post('/api/pricing/quote/batch', json={'carts': carts}).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
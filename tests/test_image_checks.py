@@ -0,0 +1,131 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from models import db, Product, ImageCheck
+from image_service import ImageValidator
+from support import create_test_app, load_app
+
+GOOD = 'https://img.example.com/good.jpg'
+BAD = 'https://img.example.com/missing.jpg'
+
+
+def fake_check(url):
+    return (True, "Valid image") if url == GOOD else (False, "URL returned status code 404")
+
+
+class ImageSweepTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.db_path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(handle)
+        self.app = create_test_app(self.db_path)
+        self.checked = []
+        self.validator = ImageValidator(check=self.record_check, max_workers=2)
+        with self.app.app_context():
+            self.products = {}
+            for name, url in (('Good', GOOD), ('Bad', BAD), ('Also bad', BAD)):
+                product = Product(image_url=url, name=name, price_now=100.0, category='Mains')
+                db.session.add(product)
+                db.session.flush()
+                self.products[name] = product.id
+            db.session.commit()
+
+    def tearDown(self):
+        self.validator._executor.shutdown(wait=True)
+        with self.app.app_context():
+            db.engine.dispose()
+        os.remove(self.db_path)
+
+    def record_check(self, url):
+        self.checked.append(url)
+        return fake_check(url)
+
+    def test_sweep_records_broken_images_once(self):
+        with self.app.app_context():
+            self.assertEqual(self.validator.sweep(), {'checked': 3, 'broken': 2, 'newly_broken': 2})
+            # Products sharing a URL share one request
+            self.assertEqual(sorted(self.checked), [GOOD, BAD])
+
+            self.assertEqual(self.validator.sweep(), {'checked': 3, 'broken': 2, 'newly_broken': 0})
+            self.assertEqual(len(self.checked), 4)
+
+            broken = {check.product_id for check in ImageCheck.query.filter_by(is_broken=True)}
+            self.assertEqual(broken, {self.products['Bad'], self.products['Also bad']})
+
+    def test_fixed_and_deactivated_products_leave_the_broken_list(self):
+        with self.app.app_context():
+            self.validator.sweep()
+            db.session.get(Product, self.products['Bad']).image_url = GOOD
+            db.session.get(Product, self.products['Also bad']).is_active = False
+            db.session.commit()
+
+            self.assertEqual(self.validator.sweep(), {'checked': 2, 'broken': 0, 'newly_broken': 0})
+            self.assertEqual(ImageCheck.query.count(), 2)
+            self.assertEqual(ImageCheck.query.filter_by(is_broken=True).count(), 0)
+
+    def test_sweep_of_some_products_leaves_the_others_alone(self):
+        with self.app.app_context():
+            self.validator.sweep()
+            self.assertEqual(self.validator.sweep([self.products['Good']], refresh=False), {'checked': 1, 'broken': 0, 'newly_broken': 0})
+            # Cached result reused, and the other products' checks kept
+            self.assertEqual(len(self.checked), 2)
+            self.assertEqual(ImageCheck.query.count(), 3)
+
+
+class ProductSaveImageCheckTest(unittest.TestCase):
+    """Saving a product must not wait on the image URL's HEAD request"""
+
+    def setUp(self):
+        self.appmod = load_app()
+        self.client = self.appmod.app.test_client()
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.appmod.image_validator.invalidate()
+        self.background = []
+        submit = self.appmod.task_dispatcher.submit
+
+        def slow_check(url):
+            self.release.wait(timeout=30)
+            return fake_check(url)
+
+        def track(*args, **kwargs):
+            future = submit(*args, **kwargs)
+            self.background.append(future)
+            return future
+
+        for patcher in (
+            mock.patch.object(self.appmod.image_validator, 'check', slow_check),
+            mock.patch.object(self.appmod.task_dispatcher, 'submit', track),
+            mock.patch.object(self.appmod.socketio, 'emit'),
+            mock.patch.object(self.appmod.image_variants, 'warm'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def create(self, image_url):
+        return self.client.post('/api/products', json={
+            'image_url': image_url, 'name': 'New', 'price_now': 100.0, 'category': 'Mains'
+        })
+
+    def test_unchecked_url_is_saved_at_once_and_checked_in_the_background(self):
+        response = self.create(BAD)
+        self.assertEqual(response.status_code, 200)
+        product_id = response.get_json()['id']
+
+        # The check is still blocked, so the response did not wait for it
+        self.assertEqual(len(self.background), 1)
+        self.assertFalse(self.background[0].done())
+
+        self.release.set()
+        self.background[0].result(timeout=30)
+        with self.appmod.app.app_context():
+            self.assertTrue(self.appmod.db.session.get(ImageCheck, product_id).is_broken)
+
+        # Now known to be bad, the URL is refused without another request
+        self.assertEqual(self.create(BAD).status_code, 400)
+        self.assertEqual(len(self.background), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from PIL import Image
+from image_service import ImageVariantService, VARIANT_SIZES, VARIANT_FORMATS
+from support import load_app, create_product
+
+SOURCE_URL = 'https://img.example.com/dish.png'
+
+
+def png_bytes(size=(1600, 1200)):
+    output = io.BytesIO()
+    Image.new('RGBA', size, (200, 80, 20, 255)).save(output, 'PNG')
+    return output.getvalue()
+
+
+class ImageVariantServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.storage_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.storage_dir, ignore_errors=True)
+        self.service = ImageVariantService(self.storage_dir)
+        self.addCleanup(self.shutdown)
+        self.fetches = []
+
+    def shutdown(self):
+        self.service._executor.shutdown(wait=True)
+        if self.service._render_executor is not None:
+            self.service._render_executor.shutdown(wait=True)
+
+    def fetch(self, image_url):
+        self.fetches.append(image_url)
+        return png_bytes()
+
+    def test_variants_are_rendered_in_a_worker_process(self):
+        with mock.patch.object(self.service, '_fetch', self.fetch):
+            content_hash = self.service.warm(SOURCE_URL).result(timeout=60)
+
+        for variant, size in VARIANT_SIZES.items():
+            for fmt in VARIANT_FORMATS:
+                name = self.service.cached_variant(SOURCE_URL, variant, fmt)
+                self.assertIsNotNone(name)
+                self.assertIn(content_hash, name)
+                with Image.open(os.path.join(self.storage_dir, name)) as image:
+                    self.assertEqual(max(image.size), size)
+
+    def test_warm_does_not_fetch_again_once_every_variant_exists(self):
+        with mock.patch.object(self.service, '_fetch', self.fetch):
+            content_hash = self.service.warm(SOURCE_URL).result(timeout=60)
+            again = self.service.warm(SOURCE_URL)
+            self.assertTrue(again.done())
+            self.assertEqual(again.result(), content_hash)
+            self.assertEqual(self.fetches, [SOURCE_URL])
+
+            # A lost variant makes the next warm regenerate
+            os.remove(os.path.join(self.storage_dir, self.service.cached_variant(SOURCE_URL, 'card', 'webp')))
+            self.service.warm(SOURCE_URL).result(timeout=60)
+            self.assertEqual(self.fetches, [SOURCE_URL, SOURCE_URL])
+            self.assertIsNotNone(self.service.cached_variant(SOURCE_URL, 'card', 'webp'))
+
+
+class ProductImageRouteTest(unittest.TestCase):
+    def setUp(self):
+        self.appmod = load_app()
+        self.client = self.appmod.app.test_client()
+        self.product_id = create_product(self.appmod)
+        for patcher in (
+            mock.patch.object(self.appmod.socketio, 'emit'),
+            mock.patch.object(self.appmod.task_dispatcher, 'submit'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        warm = mock.patch.object(self.appmod.image_variants, 'warm')
+        self.warm = warm.start()
+        self.addCleanup(warm.stop)
+
+    def test_cold_cache_redirects_to_the_original_without_waiting(self):
+        response = self.client.get(f'/api/images/{self.product_id}/card.webp')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.headers['Location'], 'https://example.com/item.jpg')
+        self.warm.assert_called_once_with('https://example.com/item.jpg')
+
+    def test_only_a_new_image_url_is_warmed(self):
+        path = f'/api/products/{self.product_id}'
+        self.client.put(path, json={'name': 'Renamed', 'image_url': 'https://example.com/item.jpg'})
+        self.warm.assert_not_called()
+
+        self.client.put(path, json={'image_url': 'https://example.com/new.jpg'})
+        self.warm.assert_called_once_with('https://example.com/new.jpg')
+
+
+if __name__ == '__main__':
+    unittest.main()
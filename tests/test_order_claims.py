@@ -0,0 +1,94 @@
+import threading
+import unittest
+from unittest import mock
+from support import load_app
+
+appmod = None
+
+
+def setUpModule():
+    global appmod
+    appmod = load_app()
+
+
+class OrderClaimConcurrencyTest(unittest.TestCase):
+    RIDERS = 20
+
+    def setUp(self):
+        from models import Order
+        self.Order = Order
+        emit = mock.patch.object(appmod.socketio, 'emit')
+        emit.start()
+        self.addCleanup(emit.stop)
+        with appmod.app.app_context():
+            Order.query.delete()
+            appmod.db.session.commit()
+
+    def create_orders(self, count):
+        with appmod.app.app_context():
+            orders = [self.Order(
+                order_id=appmod.order_id_service.next_order_id(),
+                customer_name='Test',
+                customer_phone='254700000000',
+                items=[],
+                product_total=100.0,
+                delivery_fee=0.0,
+                total_amount=100.0,
+                payment_method='Cash',
+                delivery_address='Somewhere'
+            ) for _ in range(count)]
+            appmod.db.session.add_all(orders)
+            appmod.db.session.commit()
+            return [order.id for order in orders]
+
+    def race(self, path, riders):
+        """POST `path` from every rider at the same moment; returns {rider_id: response}"""
+        responses = {}
+        start = threading.Barrier(len(riders))
+
+        def claim(rider_id):
+            client = appmod.app.test_client()
+            token = appmod.create_token(rider_id, 'staff')
+            start.wait()
+            response = client.post(path, headers={'Authorization': f'Bearer {token}'})
+            responses[rider_id] = (response.status_code, response.get_json())
+
+        threads = [threading.Thread(target=claim, args=(rider_id,)) for rider_id in riders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def test_exactly_one_rider_wins_the_same_order(self):
+        order_id, = self.create_orders(1)
+
+        responses = self.race(f'/api/orders/{order_id}/claim', range(1, self.RIDERS + 1))
+
+        winners = [rider_id for rider_id, (status, _) in responses.items() if status == 200]
+        self.assertEqual(len(winners), 1)
+        self.assertTrue(all(status == 400 for rider_id, (status, _) in responses.items() if rider_id not in winners))
+        with appmod.app.app_context():
+            order = appmod.db.session.get(self.Order, order_id)
+            self.assertEqual(order.staff_id, winners[0])
+            self.assertEqual(order.status, 'Out for Delivery')
+
+    def test_claim_next_never_hands_out_an_order_twice(self):
+        order_ids = self.create_orders(8)
+
+        responses = self.race('/api/orders/claim-next', range(1, self.RIDERS + 1))
+
+        won = {body['order']['id']: rider_id for rider_id, (status, body) in responses.items() if status == 200}
+        self.assertEqual(len(won), sum(1 for status, _ in responses.values() if status == 200))
+        self.assertTrue(all(status in (404, 409) for status, _ in responses.values() if status != 200))
+        with appmod.app.app_context():
+            owners = dict(appmod.db.session.query(self.Order.id, self.Order.staff_id).filter(
+                self.Order.id.in_(order_ids), self.Order.staff_id.isnot(None)
+            ).all())
+        # Every claimed order was reported to exactly the rider that holds it
+        self.assertEqual(owners, won)
+        self.assertGreater(len(won), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from unittest import mock
+from support import load_app, create_staff, create_product
+
+appmod = None
+
+
+def setUpModule():
+    global appmod
+    appmod = load_app()
+
+
+class OrderSubscriptionTest(unittest.TestCase):
+    """Order rooms carry the customer's contact details, so joining one needs proof of access"""
+
+    def setUp(self):
+        from models import Order
+        with appmod.app.app_context():
+            orders = [Order(
+                order_id=appmod.order_id_service.next_order_id(),
+                customer_id=customer_id,
+                customer_name='Test',
+                customer_phone='254700000000',
+                items=[],
+                product_total=100.0,
+                delivery_fee=0.0,
+                total_amount=100.0,
+                payment_method='Cash',
+                delivery_address='Somewhere'
+            ) for customer_id in (None, 7)]
+            appmod.db.session.add_all(orders)
+            appmod.db.session.commit()
+            self.guest_order, self.customer_order = (order.order_id for order in orders)
+
+    def subscribe(self, order_id, **data):
+        client = appmod.socketio.test_client(appmod.app)
+        self.addCleanup(client.disconnect)
+        return client.emit('subscribe_order', {'order_id': order_id, **data}, callback=True)
+
+    def test_guest_order_needs_its_order_token(self):
+        self.assertFalse(self.subscribe(self.guest_order)['success'])
+        self.assertFalse(self.subscribe(self.guest_order, order_token='0' * 32)['success'])
+        self.assertFalse(self.subscribe(self.guest_order, order_token=appmod.order_access_token(self.customer_order))['success'])
+        self.assertFalse(self.subscribe(self.guest_order, token=appmod.create_token(7, 'customer'))['success'])
+
+        order_token = appmod.order_access_token(self.guest_order)
+        self.assertTrue(self.subscribe(self.guest_order, order_token=order_token)['success'])
+
+    def test_customer_order_is_limited_to_its_customer_and_approved_staff(self):
+        _, pending_rider = create_staff(appmod, approved=False)
+        _, inactive_rider = create_staff(appmod, active=False)
+        _, rider = create_staff(appmod)
+
+        for token in (appmod.create_token(8, 'customer'), pending_rider, inactive_rider, 'not-a-token'):
+            self.assertFalse(self.subscribe(self.customer_order, token=token)['success'])
+        for token in (appmod.create_token(7, 'customer'), rider, appmod.create_token(1, 'admin')):
+            self.assertTrue(self.subscribe(self.customer_order, token=token)['success'])
+
+    def test_checkout_returns_the_order_token(self):
+        product_id = create_product(appmod)
+        with mock.patch.object(appmod.socketio, 'emit'), mock.patch.object(appmod.task_dispatcher, 'submit'):
+            response = appmod.app.test_client().post('/api/orders', json={
+                'customer_name': 'Guest',
+                'customer_phone': '254700000000',
+                'items': [{'product_id': product_id, 'quantity': 1}],
+                'payment_method': 'Pay Now',
+                'delivery_address': 'Somewhere'
+            })
+        body = response.get_json()
+        self.assertEqual(response.status_code, 200, body)
+        self.assertEqual(body['order_token'], appmod.order_access_token(body['order_id']))
+
+    def test_connect_ignores_a_query_string_token(self):
+        client = appmod.socketio.test_client(appmod.app, query_string=f"token={appmod.create_token(1, 'admin')}")
+        self.addCleanup(client.disconnect)
+        connected = [event for event in client.get_received() if event['name'] == 'connected']
+        self.assertEqual(connected[0]['args'][0]['rooms'], [])
+
+        client = appmod.socketio.test_client(appmod.app, auth={'token': appmod.create_token(1, 'admin')})
+        self.addCleanup(client.disconnect)
+        connected = [event for event in client.get_received() if event['name'] == 'connected']
+        self.assertEqual(connected[0]['args'][0]['rooms'], ['admin'])
+
+
+if __name__ == '__main__':
+    unittest.main()
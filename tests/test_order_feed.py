@@ -0,0 +1,47 @@
+import unittest
+from datetime import datetime
+from utils import encode_cursor
+from support import load_app, create_staff
+
+appmod = None
+
+
+def setUpModule():
+    global appmod
+    appmod = load_app()
+
+
+class OrderFeedAccessTest(unittest.TestCase):
+    """The order listing and change feed carry customer contact details"""
+
+    def setUp(self):
+        self.client = appmod.app.test_client()
+        response = self.client.get('/api/orders', headers=self.auth(appmod.create_token(1, 'admin')))
+        self.cursor = response.get_json()['changes_cursor'] or encode_cursor(datetime(2025, 1, 1), 0)
+
+    @staticmethod
+    def auth(token):
+        return {'Authorization': f'Bearer {token}'}
+
+    def test_anonymous_requests_are_rejected(self):
+        self.assertEqual(self.client.get(f'/api/orders/changes?since={self.cursor}').status_code, 401)
+        self.assertEqual(self.client.get('/api/orders/changes').status_code, 401)
+        self.assertEqual(self.client.get('/api/orders').status_code, 401)
+
+    def test_customers_and_unapproved_riders_are_rejected(self):
+        _, pending_rider = create_staff(appmod, approved=False)
+        for token in (appmod.create_token(1, 'customer'), pending_rider):
+            self.assertEqual(self.client.get(f'/api/orders/changes?since={self.cursor}', headers=self.auth(token)).status_code, 401)
+            self.assertEqual(self.client.get('/api/orders', headers=self.auth(token)).status_code, 401)
+
+    def test_admins_and_approved_riders_can_read(self):
+        _, rider = create_staff(appmod)
+        for token in (appmod.create_token(1, 'admin'), rider):
+            response = self.client.get(f'/api/orders/changes?since={self.cursor}', headers=self.auth(token))
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.get_json()['success'])
+            self.assertEqual(self.client.get('/api/orders', headers=self.auth(token)).status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import sys
+import time
+import threading
+import unittest
+from datetime import date
+from unittest import mock
+from utils import format_order_id
+from support import load_app, create_product
+
+DAY = date(2025, 10, 12)
+KEY = 'order-id-test-key'
+
+appmod = None
+
+
+def setUpModule():
+    global appmod
+    appmod = load_app()
+
+
+class FormatOrderIdTest(unittest.TestCase):
+    def test_format(self):
+        order_id = format_order_id(DAY, 0, KEY)
+        self.assertTrue(order_id.startswith('2025OC12'))
+        self.assertEqual(len(order_id), 12)
+        self.assertTrue(order_id[8:].isalpha() and order_id[8:].islower())
+
+    def test_suffixes_are_unique_within_and_across_lengths(self):
+        space = 26 ** 4
+        four = [format_order_id(DAY, sequence, KEY) for sequence in range(20000)]
+        five = [format_order_id(DAY, sequence, KEY) for sequence in range(space, space + 20000)]
+        self.assertEqual(len(set(four)), len(four))
+        self.assertEqual(len(set(five)), len(five))
+        self.assertTrue(all(len(order_id) == 13 for order_id in five))
+
+    def test_suffixes_depend_on_the_key_and_the_day(self):
+        ids = [format_order_id(DAY, sequence, KEY) for sequence in range(100)]
+        other_key = [format_order_id(DAY, sequence, 'another-key') for sequence in range(100)]
+        next_day = [format_order_id(date(2025, 10, 13), sequence, KEY)[8:] for sequence in range(100)]
+        self.assertLess(len(set(ids) & set(other_key)), 5)
+        self.assertLess(len(set(order_id[8:] for order_id in ids) & set(next_day)), 5)
+
+
+class OrderIdAllocationTest(unittest.TestCase):
+    def setUp(self):
+        from models import Order
+        self.Order = Order
+        with appmod.app.app_context():
+            Order.query.delete()
+            appmod.db.session.commit()
+
+    def test_ids_already_on_orders_are_skipped(self):
+        from order_id_service import OrderIdService
+        from models import OrderIdSequence
+        today = appmod.get_nairobi_time().date()
+        with appmod.app.app_context():
+            sequence = appmod.db.session.get(OrderIdSequence, today)
+            start = sequence.next_value if sequence else 0
+            # A random ID issued before the deploy that happens to equal the next one in the sequence
+            legacy_id = format_order_id(today, start, 'legacy')
+            appmod.db.session.add(self.Order(
+                order_id=legacy_id, customer_name='Legacy', customer_phone='254700000000', items=[],
+                product_total=0.0, delivery_fee=0.0, total_amount=0.0, payment_method='Cash',
+                delivery_address='Somewhere'
+            ))
+            appmod.db.session.commit()
+
+            service = OrderIdService('legacy', block_size=5)
+            issued = [service.next_order_id() for _ in range(5)]
+
+        self.assertNotIn(legacy_id, issued)
+        self.assertEqual(len(set(issued)), 5)
+
+
+class CheckoutBurstBenchmark(unittest.TestCase):
+    """Orders placed through POST /api/orders from many clients at once"""
+
+    CLIENTS = 16
+    ORDERS_PER_CLIENT = 25
+
+    def setUp(self):
+        from models import Order
+        self.Order = Order
+
+    def test_burst_of_checkouts_gets_unique_ids(self):
+        product_id = create_product(appmod)
+        responses = []
+        responses_lock = threading.Lock()
+        start = threading.Barrier(self.CLIENTS + 1)
+
+        def checkout(n):
+            client = appmod.app.test_client()
+            start.wait()
+            for i in range(self.ORDERS_PER_CLIENT):
+                response = client.post('/api/orders', json={
+                    'customer_name': f'Burst {n}',
+                    'customer_phone': '254700000000',
+                    'items': [{'product_id': product_id, 'quantity': 1}],
+                    'payment_method': 'Pay Now',
+                    'delivery_address': 'Somewhere'
+                })
+                with responses_lock:
+                    responses.append((response.status_code, response.get_json()))
+
+        with mock.patch.object(appmod.socketio, 'emit'), mock.patch.object(appmod.task_dispatcher, 'submit'):
+            threads = [threading.Thread(target=checkout, args=(n,)) for n in range(self.CLIENTS)]
+            for thread in threads:
+                thread.start()
+            start.wait()
+            started = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+        total = self.CLIENTS * self.ORDERS_PER_CLIENT
+        print(f"\n{total} checkouts from {self.CLIENTS} clients in {elapsed:.2f}s "
+              f"({total / elapsed:.0f} orders/s)", file=sys.stderr)
+
+        self.assertEqual([status for status, _ in responses], [200] * total)
+        order_ids = [body['order_id'] for _, body in responses]
+        self.assertEqual(len(set(order_ids)), total)
+        with appmod.app.app_context():
+            self.assertEqual(self.Order.query.filter(self.Order.order_id.in_(order_ids)).count(), total)
+
+
+if __name__ == '__main__':
+    unittest.main()
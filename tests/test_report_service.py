@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor, wait
+from unittest import mock
+import report_service
+import report_worker
+from report_service import ReportService
+
+
+def write_partial_and_fail(storage_bucket, data, filename):
+    """A render that dies after starting its output, like a worker hitting a bad font or a full disk"""
+    with open(os.path.join(storage_bucket, f"{filename}.part"), 'w') as f:
+        f.write('half a pdf')
+    raise RuntimeError('render failed')
+
+
+class ReportJobTest(unittest.TestCase):
+    def setUp(self):
+        self.storage_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.storage_dir, ignore_errors=True)
+        self.service = ReportService(self.storage_dir, failed_ttl=60)
+        self.service._executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(self.service._executor.shutdown)
+        self.now = 1000.0
+        clock = mock.patch.object(report_service.time, 'monotonic', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def run_jobs(self):
+        wait(list(self.service._jobs.values()), timeout=10)
+
+    def test_failed_report_is_reported_until_its_ttl_and_leaves_no_partial_file(self):
+        with mock.patch.object(report_service, 'render_business_report', write_partial_and_fail):
+            report_id, status = self.service.request({'period': 'bad'})
+            self.run_jobs()
+            self.assertEqual(status, 'pending')
+
+            # Another report being queued prunes the job table; the failure must survive it
+            self.service.request({'period': 'other'})
+            self.run_jobs()
+
+        self.assertEqual(self.service.status(report_id), 'failed')
+        self.assertEqual([name for name in os.listdir(self.storage_dir) if name.endswith('.part')], [])
+
+        self.now += 61
+        self.assertIsNone(self.service.status(report_id))
+
+    def test_requesting_a_failed_report_again_retries_it(self):
+        with mock.patch.object(report_service, 'render_business_report', write_partial_and_fail):
+            report_id, _ = self.service.request({'period': 'flaky'})
+            self.run_jobs()
+        self.assertEqual(self.service.status(report_id), 'failed')
+
+        def render(storage_bucket, data, filename):
+            open(os.path.join(storage_bucket, filename), 'w').close()
+
+        with mock.patch.object(report_service, 'render_business_report', render):
+            self.assertEqual(self.service.request({'period': 'flaky'}), (report_id, 'pending'))
+            self.run_jobs()
+        self.assertEqual(self.service.status(report_id), 'ready')
+
+    def test_prune_removes_orphaned_partial_files(self):
+        orphan = os.path.join(self.storage_dir, 'business_report_deadbeef.pdf.part')
+        open(orphan, 'w').close()
+
+        with mock.patch.object(report_service, 'render_business_report', lambda *args: None):
+            self.service.request({'period': 'any'})
+            self.run_jobs()
+
+        self.assertFalse(os.path.exists(orphan))
+
+    def test_worker_removes_its_partial_file_when_rendering_fails(self):
+        def fail(service, data, filename):
+            with open(os.path.join(service.storage_bucket, filename), 'w') as f:
+                f.write('half a pdf')
+            raise RuntimeError('render failed')
+
+        with mock.patch.object(report_worker.PDFService, 'generate_business_report', fail):
+            with self.assertRaises(RuntimeError):
+                report_worker.render_business_report(self.storage_dir, {}, 'business_report_x.pdf')
+        self.assertEqual(os.listdir(self.storage_dir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
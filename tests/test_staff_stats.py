@@ -0,0 +1,63 @@
+import unittest
+from unittest import mock
+from support import load_app, create_staff
+
+appmod = None
+
+
+def setUpModule():
+    global appmod
+    appmod = load_app()
+
+
+class StaffStatsInvalidationTest(unittest.TestCase):
+    def setUp(self):
+        from models import Order
+        emit = mock.patch.object(appmod.socketio, 'emit')
+        emit.start()
+        self.addCleanup(emit.stop)
+        self.staff_id, _ = create_staff(appmod)
+        with appmod.app.app_context():
+            order = Order(
+                order_id=appmod.order_id_service.next_order_id(), staff_id=self.staff_id,
+                customer_name='Test', customer_phone='254700000000', items=[],
+                product_total=100.0, delivery_fee=0.0, total_amount=100.0,
+                payment_method='Pay Now', payment_status='Pending Payment', delivery_address='Somewhere'
+            )
+            appmod.db.session.add(order)
+            appmod.db.session.commit()
+            self.order_pk = order.id
+
+    def revenue(self):
+        with appmod.app.app_context():
+            return appmod.staff_stats_service.for_staff(self.staff_id)['revenue']
+
+    def test_payment_update_refreshes_cached_revenue(self):
+        from models import Order
+        self.assertEqual(self.revenue(), 0.0)
+
+        with appmod.app.app_context():
+            order = appmod.db.session.get(Order, self.order_pk)
+            appmod.set_payment_status(order, 'Payment Complete')
+            appmod.db.session.commit()
+            appmod.emit_order_event('payment_update', order, order.payment_status)
+
+        self.assertEqual(self.revenue(), 100.0)
+
+    def test_stats_computed_across_an_invalidation_are_not_cached(self):
+        service = appmod.staff_stats_service
+        compute = service._compute
+        service.invalidate()
+
+        def compute_during_a_write(*args):
+            result = compute(*args)
+            service.invalidate()
+            return result
+
+        with appmod.app.app_context(), mock.patch.object(service, '_compute', side_effect=compute_during_a_write):
+            service.performance()
+        self.assertEqual(service._cache, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
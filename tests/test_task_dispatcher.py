@@ -0,0 +1,140 @@
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import wait
+from unittest import mock
+from flask import current_app
+from models import db, Notification
+from task_dispatcher import TaskDispatcher
+from support import create_test_app, load_app, create_product
+
+
+class TaskDispatcherBurstTest(unittest.TestCase):
+    """A checkout burst: many slow side effects queued at once must not hold up the caller"""
+
+    WORKERS = 4
+    BURST = 200
+
+    def setUp(self):
+        handle, self.db_path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(handle)
+        self.app = create_test_app(self.db_path)
+        self.dispatcher = TaskDispatcher(self.app, max_workers=self.WORKERS)
+        self.release = threading.Event()
+        self.running = 0
+        self.peak = 0
+        self.counter_lock = threading.Lock()
+
+    def tearDown(self):
+        self.release.set()
+        self.dispatcher.executor.shutdown(wait=True)
+        with self.app.app_context():
+            db.engine.dispose()
+        os.remove(self.db_path)
+
+    def blocked_task(self, n):
+        """Holds its worker until the test releases it"""
+        with self.counter_lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            self.release.wait(timeout=30)
+            return n
+        finally:
+            with self.counter_lock:
+                self.running -= 1
+
+    def test_burst_does_not_block_the_caller(self):
+        # Every task blocks until released, so submit() returning for the whole burst shows it never waits on one
+        futures = [self.dispatcher.submit(self.blocked_task, n) for n in range(self.BURST)]
+        self.assertFalse(any(future.done() for future in futures))
+
+        self.release.set()
+        done, not_done = wait(futures, timeout=30)
+        self.assertEqual(len(not_done), 0)
+        self.assertEqual(sorted(future.result() for future in done), list(range(self.BURST)))
+        self.assertLessEqual(self.peak, self.WORKERS)
+
+    def test_tasks_get_an_app_context_and_their_own_session(self):
+        def add_notification(n):
+            assert current_app._get_current_object() is self.app
+            db.session.add(Notification(user_type='customer', user_id=n, title='Order Received', message=str(n)))
+            db.session.commit()
+
+        futures = [self.dispatcher.submit(add_notification, n) for n in range(50)]
+        wait(futures, timeout=30)
+
+        with self.app.app_context():
+            self.assertEqual(Notification.query.count(), 50)
+
+    def test_a_failing_task_is_logged_and_rolled_back(self):
+        def fail_after_write():
+            db.session.add(Notification(user_type='customer', user_id=1, title='Lost', message='x'))
+            db.session.flush()
+            raise RuntimeError('provider timed out')
+
+        with self.assertLogs('task_dispatcher', level='ERROR'):
+            failed = self.dispatcher.submit(fail_after_write)
+            self.assertIsNone(failed.result(timeout=10))
+
+        self.release.set()
+        self.assertEqual(self.dispatcher.submit(self.blocked_task, 7).result(timeout=10), 7)
+        with self.app.app_context():
+            self.assertEqual(Notification.query.count(), 0)
+
+
+class CheckoutSideEffectsTest(unittest.TestCase):
+    """POST /api/orders answers before the STK push and the order email have run"""
+
+    PROVIDER_CALLS = ('initiate_stk_push', 'send_order_notification')
+
+    def setUp(self):
+        self.appmod = load_app()
+        self.release = threading.Event()
+        self.finished = {name: threading.Event() for name in self.PROVIDER_CALLS}
+        self.threads = {}
+        for target, name, result in (
+            (self.appmod.payment_service, 'initiate_stk_push', (True, {'reference': 'R'}, 'sent')),
+            (self.appmod.email_service, 'send_order_notification', True),
+        ):
+            patcher = mock.patch.object(target, name, side_effect=self.provider_call(name, result))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        emit = mock.patch.object(self.appmod.socketio, 'emit')
+        emit.start()
+        self.addCleanup(emit.stop)
+        self.addCleanup(self.release.set)
+
+    def provider_call(self, name, result):
+        """A provider call that hangs until the test releases it"""
+        def call(*args):
+            self.threads[name] = threading.get_ident()
+            self.release.wait(timeout=30)
+            self.finished[name].set()
+            return result
+        return call
+
+    def test_checkout_returns_while_provider_calls_are_pending(self):
+        product_id = create_product(self.appmod)
+        response = self.appmod.app.test_client().post('/api/orders', json={
+            'customer_name': 'Guest',
+            'customer_phone': '254700000000',
+            'customer_email': 'guest@example.com',
+            'items': [{'product_id': product_id, 'quantity': 1}],
+            'payment_method': 'Pay Now',
+            'delivery_address': 'Somewhere'
+        })
+
+        # The providers cannot have answered yet, so the response did not wait for them
+        self.assertEqual(response.status_code, 200, response.get_json())
+        self.assertFalse(any(finished.is_set() for finished in self.finished.values()))
+
+        self.release.set()
+        for name in self.PROVIDER_CALLS:
+            self.assertTrue(self.finished[name].wait(timeout=30), name)
+            self.assertNotEqual(self.threads[name], threading.get_ident())
+
+
+if __name__ == '__main__':
+    unittest.main()
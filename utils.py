@@ -1,6 +1,9 @@
 import re
 import random
 import string
+import base64
+import hmac
+import hashlib
 from datetime import datetime
 import pytz
 import requests
@@ -35,26 +38,51 @@ def validate_kenyan_phone(phone):
     normalized = normalize_phone_number(phone)
     return normalized is not None
 
-def generate_order_id():
+MONTH_CODES = {
+    1: 'JA', 2: 'FB', 3: 'MR', 4: 'AP', 5: 'MY', 6: 'JN',
+    7: 'JL', 8: 'AU', 9: 'SE', 10: 'OC', 11: 'NV', 12: 'DC'
+}
+
+ORDER_SUFFIX_ROUNDS = 4
+
+def format_order_id(day, sequence, key):
     """
-    Generate order ID in format: {YYYY}{encodedMonthDayTime}{4randomLower}
+    Format order ID for the sequence-th order of the day: {YYYY}{monthCode}{DD}{suffix}
     Example: 2025OC12dbfw
+    The first 26^4 orders of a day get a 4-letter suffix, later ones 5 letters and so on.
+    Suffixes come from a Feistel permutation keyed with `key`, the day and the suffix length,
+    so they are unique per day but cannot be mapped back to a count without the key.
     """
-    now = datetime.now(pytz.timezone('Africa/Nairobi'))
-    year = now.strftime('%Y')
+    length = 4
+    space = 26 ** length
+    while sequence >= space:
+        sequence -= space
+        length += 1
+        space = 26 ** length
     
-    month_map = {
-        1: 'JA', 2: 'FB', 3: 'MR', 4: 'AP', 5: 'MY', 6: 'JN',
-        7: 'JL', 8: 'AU', 9: 'SE', 10: 'OC', 11: 'NV', 12: 'DC'
-    }
+    half_bits = ((space - 1).bit_length() + 1) // 2
+    mask = (1 << half_bits) - 1
+    round_key = hmac.new(key.encode(), f"{day.strftime('%Y%m%d')}:{length}".encode(), hashlib.sha256)
     
-    month_code = month_map[now.month]
-    day = now.strftime('%d')
+    # The Feistel network permutes a power-of-two range; walking the cycle until the value
+    # lands back inside the letter space keeps it a permutation of that space
+    value = sequence
+    while True:
+        left, right = value >> half_bits, value & mask
+        for round_number in range(ORDER_SUFFIX_ROUNDS):
+            mac = round_key.copy()
+            mac.update(f"{round_number}:{right}".encode())
+            left, right = right, left ^ (int.from_bytes(mac.digest()[:8], 'big') & mask)
+        value = (left << half_bits) | right
+        if value < space:
+            break
     
-    random_suffix = ''.join(random.choices(string.ascii_lowercase, k=4))
+    letters = []
+    for _ in range(length):
+        value, remainder = divmod(value, 26)
+        letters.append(string.ascii_lowercase[remainder])
     
-    order_id = f"{year}{month_code}{day}{random_suffix}"
-    return order_id
+    return f"{day.strftime('%Y')}{MONTH_CODES[day.month]}{day.strftime('%d')}{''.join(reversed(letters))}"
 
 def validate_image_url(url):
     """
@@ -108,11 +136,48 @@ def get_nairobi_time():
 def encode_month_day_time():
     """Encode current month/day/time for order ID"""
     now = get_nairobi_time()
-    month_map = {
-        1: 'JA', 2: 'FB', 3: 'MR', 4: 'AP', 5: 'MY', 6: 'JN',
-        7: 'JL', 8: 'AU', 9: 'SE', 10: 'OC', 11: 'NV', 12: 'DC'
-    }
-    return f"{month_map[now.month]}{now.strftime('%d')}"
+    return f"{MONTH_CODES[now.month]}{now.strftime('%d')}"
+
+def encode_cursor(created_at, row_id):
+    """
+    Encode a (created_at, id) keyset position as an opaque URL-safe cursor
+    Returns: cursor string
+    """
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor
+    Returns: (created_at: datetime, id: int) or None if invalid
+    """
+    if not cursor:
+        return None
+    
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeError):
+        return None
+
+def parse_date_param(value, end_of_day=False):
+    """
+    Parse a YYYY-MM-DD or ISO datetime query parameter
+    Date-only values are widened to the end of the day when end_of_day is set
+    Returns: datetime or None if missing/invalid
+    """
+    if not value:
+        return None
+    
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    
+    if end_of_day and len(value) == 10:
+        parsed = parsed.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return parsed
 
 def generate_otp():
     """Generate 6-digit OTP code"""